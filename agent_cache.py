@@ -0,0 +1,279 @@
+import asyncio
+import atexit
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from log_config import get_logger
+
+_logger = get_logger("agent_cache")
+
+
+def normalize_input(text):
+    """Case- and whitespace-insensitive form of a user message used in cache keys"""
+    return " ".join(str(text).lower().split())
+
+
+def history_fingerprint(formatted_history):
+    """Stable digest of the history an agent sees ([{"role", "content"}, ...])"""
+    digest = hashlib.sha256()
+    for message in formatted_history or ():
+        digest.update(message["role"].encode())
+        digest.update(b"\x00")
+        digest.update(normalize_input(message["content"]).encode())
+        digest.update(b"\x01")
+    return digest.hexdigest()
+
+
+def _prompt_hash(prompt):
+    return hashlib.sha256(prompt.encode()).hexdigest()
+
+
+# On-disk Backend
+class SQLiteCacheBackend:
+    """SQLite store for cache entries so hits survive restarts.
+
+    prune() removes expired rows and then the rows closest to expiry beyond max_rows, so the
+    file stays bounded.
+    """
+    def __init__(self, path="agent_cache.sqlite3", max_rows=100_000):
+        self.path = path
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        import sqlite3  # only needed when the SQLite backend is enabled
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS agent_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+
+    def get(self, key, now):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM agent_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                with self._conn:
+                    self._conn.execute("DELETE FROM agent_cache WHERE key = ?", (key,))
+                return None
+            return json.loads(value), expires_at
+
+    def set(self, key, value, expires_at):
+        self.set_many([(key, value, expires_at)])
+
+    def set_many(self, rows):
+        """Store [(key, value, expires_at), ...] in one transaction"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO agent_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                [(key, json.dumps(value), expires_at) for key, value, expires_at in rows],
+            )
+
+    def purge_expired(self, now):
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "DELETE FROM agent_cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+            ).rowcount
+
+    def prune(self, now):
+        """Purge expired rows, then cap the table at max_rows; returns the number of rows removed"""
+        removed = self.purge_expired(now)
+        if self.max_rows is None:
+            return removed
+        with self._lock, self._conn:
+            excess = self._conn.execute("SELECT COUNT(*) FROM agent_cache").fetchone()[0] - self.max_rows
+            if excess > 0:
+                # Rows that never expire go last
+                removed += self._conn.execute(
+                    "DELETE FROM agent_cache WHERE key IN ("
+                    "SELECT key FROM agent_cache ORDER BY expires_at IS NULL, expires_at LIMIT ?)",
+                    (excess,),
+                ).rowcount
+        return removed
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM agent_cache")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Agent Result Cache
+class AgentCache:
+    """In-memory LRU + TTL cache for agent results, optionally backed by SQLite.
+
+    Backend I/O stays off the event loop: aget() reads a miss in a worker thread, and set()
+    only queues the entry for a writer thread that stores pending entries in batches every
+    flush_interval seconds and prunes the backend every prune_interval seconds.
+    """
+    def __init__(self, max_entries=1024, ttl_seconds=3600, backend=None, clock=time.time,
+                 flush_interval=1.0, prune_interval=600.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.backend = backend
+        self.clock = clock
+        self.flush_interval = flush_interval
+        self.prune_interval = prune_interval
+        self.hits = 0
+        self.misses = 0
+        self.write_errors = 0
+        self._entries = OrderedDict()  # key -> (json text, expires_at), least recently used first
+        self._lock = threading.Lock()
+        self._pending = {}  # key -> (value, expires_at) waiting for the backend writer
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = None
+        if backend is not None:
+            self._thread = threading.Thread(target=self._run, name="agent-cache-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    @staticmethod
+    def make_key(agent, user_input, prompt, formatted_history=None):
+        """Key on agent name, normalized input, system prompt and the history the agent sees"""
+        parts = (agent, normalize_input(user_input), _prompt_hash(prompt), history_fingerprint(formatted_history))
+        return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+    def get(self, key):
+        """Return a fresh copy of the cached value, or None on a miss (blocking; see aget)"""
+        now = self.clock()
+        found, value = self._get_local(key, now)
+        if found:
+            return value
+        return self._from_backend(key, self._read_backend(key, now))
+
+    async def aget(self, key):
+        """get() for the event loop: a backend read runs in a worker thread"""
+        now = self.clock()
+        found, value = self._get_local(key, now)
+        if found:
+            return value
+        stored = await asyncio.to_thread(self._read_backend, key, now) if self.backend is not None else None
+        return self._from_backend(key, stored)
+
+    def set(self, key, value):
+        """Cache a JSON-serializable value; the backend copy is written behind"""
+        expires_at = self.clock() + self.ttl_seconds if self.ttl_seconds is not None else None
+        # Values are stored serialized so callers can freely mutate what they get back
+        text = json.dumps(value)
+        with self._lock:
+            self._store(key, text, expires_at)
+        if self.backend is not None:
+            with self._condition:
+                self._pending[key] = (json.loads(text), expires_at)
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "pending_writes": len(self._pending),
+            "write_errors": self.write_errors,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.backend is not None:
+            with self._condition:
+                self._pending.clear()
+            self.backend.clear()
+
+    def flush(self):
+        """Write pending entries to the backend now; returns how many were written"""
+        with self._condition:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+        try:
+            self.backend.set_many([(key, value, expires_at) for key, (value, expires_at) in batch.items()])
+        except Exception as e:
+            self.write_errors += 1
+            _logger.error("writing %d cache entries failed: %s", len(batch), e)
+            return 0
+        return len(batch)
+
+    def close(self):
+        """Flush pending entries, stop the writer thread and close the backend"""
+        if self._thread is None:
+            return
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self.flush()
+        self.backend.close()
+
+    def _get_local(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] is None or entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, json.loads(entry[0])
+                del self._entries[key]
+            if self.backend is None:
+                self.misses += 1
+                return True, None
+        return False, None
+
+    def _read_backend(self, key, now):
+        with self._condition:
+            pending = self._pending.get(key)
+        if pending is not None:
+            return pending if pending[1] is None or pending[1] > now else None
+        try:
+            return self.backend.get(key, now)
+        except Exception as e:
+            _logger.error("reading a cache entry failed: %s", e)
+            return None
+
+    def _from_backend(self, key, stored):
+        with self._lock:
+            if stored is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            value, expires_at = stored
+            text = json.dumps(value)
+            self._store(key, text, expires_at)
+            return json.loads(text)
+
+    def _run(self):
+        next_prune = time.monotonic()
+        while True:
+            with self._condition:
+                if not self._closed:
+                    self._condition.wait(self.flush_interval)
+                if self._closed:
+                    return
+            self.flush()
+            if self.prune_interval is not None and time.monotonic() >= next_prune:
+                next_prune = time.monotonic() + self.prune_interval
+                try:
+                    removed = self.backend.prune(self.clock())
+                except Exception as e:
+                    _logger.error("pruning the cache backend failed: %s", e)
+                else:
+                    if removed:
+                        _logger.info("pruned %d cache entries", removed)
+
+    def _store(self, key, text, expires_at):
+        self._entries[key] = (text, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -0,0 +1,309 @@
+import threading
+import weakref
+from collections.abc import Mapping
+
+from opentelemetry import metrics
+from opentelemetry.metrics import Observation
+
+METRICS_EXPORTERS = ("prometheus", "console", "none")
+
+# Histogram buckets (ms) sized for LLM calls: a local lexicon hit is ~1ms, a slow reply ~30s
+LATENCY_BUCKETS_MS = (5, 25, 50, 100, 250, 500, 1000, 2000, 4000, 8000, 15000, 30000, 60000)
+
+# Instruments are created on the API's proxy meter, so recording is a no-op until
+# init_metrics installs a provider and the SDK is only imported when metrics are on
+_meter = metrics.get_meter("yaarai")
+
+AGENT_DURATION = _meter.create_histogram(
+    "yaarai.agent.duration", unit="ms", description="Time one agent took, cache and lexicon hits included"
+)
+TURN_DURATION = _meter.create_histogram(
+    "yaarai.turn.duration", unit="ms", description="Time from receiving a message to the complete reply"
+)
+TIME_TO_FIRST_CHUNK = _meter.create_histogram(
+    "yaarai.turn.time_to_first_chunk", unit="ms", description="Time from receiving a message to the first streamed chunk"
+)
+LLM_TOKENS = _meter.create_counter(
+    "yaarai.llm.tokens", unit="{token}", description="Tokens billed by the LLM API, by agent and type (input/output)"
+)
+AGENT_FALLBACKS = _meter.create_counter(
+    "yaarai.agent.fallbacks", unit="{fallback}", description="Agent results replaced by a fallback, by reason"
+)
+AGENT_ERRORS = _meter.create_counter(
+    "yaarai.agent.errors", unit="{error}", description="Agent calls that failed"
+)
+BACKGROUND_JOBS = _meter.create_counter(
+    "yaarai.background.jobs", unit="{job}", description="Background queue jobs by queue and outcome (completed, failed, dropped)"
+)
+ESCALATIONS = _meter.create_counter(
+    "yaarai.turn.escalations", unit="{turn}", description="Turns answered by the risk pre-screen escalation"
+)
+
+# Session registries of live chatbots, read when the session gauges are collected
+_registries = weakref.WeakSet()
+_registries_lock = threading.Lock()
+
+
+def _observe_active_sessions(options):
+    with _registries_lock:
+        registries = list(_registries)
+    yield Observation(sum(len(registry) for registry in registries))
+
+
+def _observe_session_memory(options):
+    with _registries_lock:
+        registries = list(_registries)
+    yield Observation(sum(registry.memory_usage for registry in registries))
+
+
+_meter.create_observable_gauge(
+    "yaarai.sessions.active", callbacks=[_observe_active_sessions], unit="{session}",
+    description="Sessions held in memory"
+)
+_meter.create_observable_gauge(
+    "yaarai.sessions.memory", callbacks=[_observe_session_memory], unit="By",
+    description="Estimated bytes held by in-memory sessions"
+)
+
+
+def observe_sessions(registry):
+    """Include a SessionRegistry in the session gauges for as long as it is alive"""
+    with _registries_lock:
+        _registries.add(registry)
+
+
+# Agent caches of live chatbots, read when the cache instruments are collected
+_caches = weakref.WeakSet()
+
+
+def _cache_stats():
+    with _registries_lock:
+        caches = list(_caches)
+    return [cache.stats() for cache in caches]
+
+
+def _observe_cache_lookups(options):
+    stats = _cache_stats()
+    yield Observation(sum(cache["hits"] for cache in stats), {"result": "hit"})
+    yield Observation(sum(cache["misses"] for cache in stats), {"result": "miss"})
+
+
+def _observe_cache_entries(options):
+    yield Observation(sum(cache["entries"] for cache in _cache_stats()))
+
+
+_meter.create_observable_counter(
+    "yaarai.cache.lookups", callbacks=[_observe_cache_lookups], unit="{lookup}",
+    description="Agent result cache lookups by result (hit, miss)"
+)
+_meter.create_observable_gauge(
+    "yaarai.cache.entries", callbacks=[_observe_cache_entries], unit="{entry}",
+    description="Agent results held in the in-memory cache"
+)
+
+
+def observe_cache(cache):
+    """Include an AgentCache in the cache metrics for as long as it is alive"""
+    with _registries_lock:
+        _caches.add(cache)
+
+
+# Recording
+def agent_outcome(result):
+    """(outcome, fallback reason) of an agent result: ("ok", None), ("fallback", reason) or ("error", None)"""
+    if result is None:
+        return "error", None
+    if not isinstance(result, Mapping):
+        return "ok", None
+    if "error" in result:
+        return "error", None
+    # Typed results note whether the reply was structured and which fields failed validation
+    if getattr(result, "structured", True) is False:
+        return "fallback", "unstructured_reply"
+    if getattr(result, "problems", None):
+        return "fallback", "invalid_fields"
+    return "ok", None
+
+
+def record_agent_run(agent, seconds, outcome="ok", fallback_reason=None, source=None):
+    """Record one agent run: its latency, and an error or fallback if it had one"""
+    attributes = {"agent": agent, "outcome": outcome}
+    if source is not None:
+        attributes["source"] = source
+    AGENT_DURATION.record(seconds * 1000, attributes)
+    if outcome == "error":
+        AGENT_ERRORS.add(1, {"agent": agent})
+    elif fallback_reason is not None:
+        AGENT_FALLBACKS.add(1, {"agent": agent, "reason": fallback_reason})
+
+
+def record_agent_result(agent, seconds, result, source=None):
+    """record_agent_run with the outcome read from the agent's result"""
+    outcome, fallback_reason = agent_outcome(result)
+    record_agent_run(agent, seconds, outcome, fallback_reason, source)
+
+
+def record_llm_usage(agent, usage):
+    """Count the input and output tokens of one LLM call (usage as returned by the API, may be None)"""
+    if usage is None:
+        return
+    for token_type, field in (("input", "prompt_tokens"), ("output", "completion_tokens")):
+        value = getattr(usage, field, None)
+        if value:
+            LLM_TOKENS.add(value, {"agent": agent, "type": token_type})
+
+
+def record_turn(seconds, mode, stream=False, outcome="ok", time_to_first_chunk=None):
+    """Record the latency of one conversation turn"""
+    attributes = {"mode": mode, "stream": stream, "outcome": outcome}
+    TURN_DURATION.record(seconds * 1000, attributes)
+    if time_to_first_chunk is not None:
+        TIME_TO_FIRST_CHUNK.record(time_to_first_chunk * 1000, attributes)
+
+
+def record_escalation():
+    ESCALATIONS.add(1)
+
+
+def record_background_job(queue, outcome):
+    BACKGROUND_JOBS.add(1, {"queue": queue, "outcome": outcome})
+
+
+# Prometheus Text Format
+_UNIT_SUFFIXES = {"ms": "_milliseconds", "By": "_bytes", "s": "_seconds"}
+
+
+def _metric_name(metric, counter=False):
+    name = metric.name.replace(".", "_").replace("-", "_")
+    name += _UNIT_SUFFIXES.get(metric.unit, "")
+    return name + "_total" if counter else name
+
+
+def _label_value(value):
+    if isinstance(value, bool):
+        value = "true" if value else "false"
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(attributes, extra=()):
+    items = [*sorted((attributes or {}).items()), *extra]
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_label_value(value)}"' for key, value in items) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_prometheus(metrics_data):
+    """Render SDK MetricsData (cumulative) in the Prometheus text exposition format"""
+    from opentelemetry.sdk.metrics.export import Histogram, Sum
+    lines = []
+    if metrics_data is None:
+        return ""
+    for resource_metrics in metrics_data.resource_metrics:
+        for scope_metrics in resource_metrics.scope_metrics:
+            for metric in scope_metrics.metrics:
+                data = metric.data
+                if isinstance(data, Histogram):
+                    name = _metric_name(metric)
+                    lines.append(f"# HELP {name} {metric.description}")
+                    lines.append(f"# TYPE {name} histogram")
+                    for point in data.data_points:
+                        cumulative = 0
+                        bounds = [*point.explicit_bounds, float("inf")]
+                        for bound, count in zip(bounds, point.bucket_counts):
+                            cumulative += count
+                            labels = _labels(point.attributes, [("le", _number(float(bound)))])
+                            lines.append(f"{name}_bucket{labels} {cumulative}")
+                        labels = _labels(point.attributes)
+                        lines.append(f"{name}_sum{labels} {_number(point.sum)}")
+                        lines.append(f"{name}_count{labels} {point.count}")
+                    continue
+                counter = isinstance(data, Sum) and data.is_monotonic
+                name = _metric_name(metric, counter)
+                lines.append(f"# HELP {name} {metric.description}")
+                lines.append(f"# TYPE {name} {'counter' if counter else 'gauge'}")
+                for point in data.data_points:
+                    lines.append(f"{name}{_labels(point.attributes)} {_number(point.value)}")
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+# Exporters
+class PrometheusTextExporter:
+    """Pull exporter that keeps metrics in memory and renders them in the Prometheus text format.
+
+    Works offline: call render() (e.g. at the end of a benchmark), or serve() to expose them
+    on http://host:port/metrics for a local Prometheus to scrape.
+    """
+    def __init__(self):
+        from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+        self.reader = InMemoryMetricReader()
+        self.server = None
+
+    def render(self):
+        return format_prometheus(self.reader.get_metrics_data())
+
+    def serve(self, port=9464, host="127.0.0.1"):
+        """Serve /metrics from a daemon thread; returns the HTTP server"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        exporter = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+        return self.server
+
+    def shutdown(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+def init_metrics(exporter="prometheus", port=None, host="127.0.0.1", export_interval_millis=10000):
+    """Install a meter provider for the yaarai instruments.
+
+    exporter="prometheus" keeps metrics in memory; with a port they are also served on
+    /metrics. exporter="console" prints them every export_interval_millis. exporter="none"
+    records nothing. Returns the PrometheusTextExporter, or None for the other exporters.
+    """
+    if exporter not in METRICS_EXPORTERS:
+        raise ValueError(f"Unknown metrics exporter '{exporter}', expected one of {', '.join(METRICS_EXPORTERS)}")
+    if exporter == "none":
+        metrics.set_meter_provider(metrics.NoOpMeterProvider())
+        return None
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.view import ExplicitBucketHistogramAggregation, View
+    views = [
+        View(instrument_name=name, aggregation=ExplicitBucketHistogramAggregation(LATENCY_BUCKETS_MS))
+        for name in ("yaarai.agent.duration", "yaarai.turn.duration", "yaarai.turn.time_to_first_chunk")
+    ]
+    prometheus = None
+    if exporter == "console":
+        from opentelemetry.sdk.metrics.export import ConsoleMetricExporter, PeriodicExportingMetricReader
+        reader = PeriodicExportingMetricReader(ConsoleMetricExporter(), export_interval_millis=export_interval_millis)
+    else:
+        prometheus = PrometheusTextExporter()
+        reader = prometheus.reader
+        if port is not None:
+            prometheus.serve(port, host)
+    metrics.set_meter_provider(MeterProvider(metric_readers=[reader], views=views))
+    return prometheus
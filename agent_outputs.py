@@ -0,0 +1,407 @@
+import json
+import re
+from collections.abc import Mapping
+
+# Start positions tried when looking for a JSON object inside surrounding prose
+MAX_SCAN_STARTS = 32
+
+_DECODER = json.JSONDecoder()
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+_KEY_SEPARATORS = re.compile(r"[^a-z0-9]+")
+_LEADING_NUMBER = re.compile(r"\s*(-?\d+(?:\.\d+)?)")
+_LABELED_LINE = re.compile(r"^[ \t]*[-*•]?[ \t]*([A-Za-z][A-Za-z /_-]{0,48}?)[ \t]*:[ \t]*(.+?)[ \t]*$", re.MULTILINE)
+
+
+def extract_json_object(text):
+    """The JSON object in a model reply, or None if there is none.
+
+    The whole reply is tried first (the JSON-mode case), then fenced code blocks, then each
+    "{" in turn, so prose or markdown around the object is ignored.
+    """
+    if not text:
+        return None
+    stripped = text.strip()
+    if stripped.startswith("{"):
+        try:
+            value = json.loads(stripped)
+        except ValueError:
+            pass
+        else:
+            return value if isinstance(value, dict) else None
+    for block in _FENCE.findall(text):
+        try:
+            value = json.loads(block)
+        except ValueError:
+            continue
+        if isinstance(value, dict):
+            return value
+    start = text.find("{")
+    for _ in range(MAX_SCAN_STARTS):
+        if start == -1:
+            break
+        try:
+            value, _ = _DECODER.raw_decode(text, start)
+        except ValueError:
+            pass
+        else:
+            if isinstance(value, dict):
+                return value
+        start = text.find("{", start + 1)
+    return None
+
+
+def json_mode_params(system_prompt):
+    """response_format for a request whose prompt asks for JSON.
+
+    JSON mode is rejected by the API unless the messages mention JSON, so prompts that
+    don't (e.g. one asking for labeled lines) are sent without it.
+    """
+    if system_prompt and "json" in system_prompt.lower():
+        return {"response_format": {"type": "json_object"}}
+    return {}
+
+
+def normalize_key(key):
+    """Map a model's key spelling ("Main Intent", "main-intent") to its field name, main_intent"""
+    return _KEY_SEPARATORS.sub("_", str(key).strip().lower()).strip("_")
+
+
+# Field Coercion
+# Each coercer returns the validated value or raises TypeError/ValueError
+
+def _text(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (bool, int, float)):
+        return str(value)
+    raise TypeError(f"expected text, got {type(value).__name__}")
+
+
+def _text_list(value):
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(",") if item.strip()]
+    if isinstance(value, (list, tuple)):
+        return [_text(item) for item in value if item is not None]
+    raise TypeError(f"expected a list, got {type(value).__name__}")
+
+
+def _fraction(value):
+    if isinstance(value, bool):
+        raise TypeError("expected a number, got bool")
+    return min(1.0, max(0.0, float(value)))
+
+
+def _integer(low, high):
+    def coerce(value):
+        if isinstance(value, bool):
+            raise TypeError("expected a number, got bool")
+        if isinstance(value, str):
+            # "3/5" and "3 (Moderate)" keep their leading number
+            match = _LEADING_NUMBER.match(value)
+            if match is None:
+                raise ValueError(f"expected a number, got {value!r}")
+            value = match.group(1)
+        return min(high, max(low, int(round(float(value)))))
+    return coerce
+
+
+def _choice(*options):
+    canonical = {option.lower(): option for option in options}
+
+    def coerce(value):
+        option = canonical.get(_text(value).strip().lower())
+        if option is None:
+            raise ValueError(f"expected one of {', '.join(options)}, got {value!r}")
+        return option
+    return coerce
+
+
+def _yes_no(value):
+    if isinstance(value, bool):
+        return "Yes" if value else "No"
+    answer = _text(value).strip().lower()
+    if answer in ("yes", "y", "true", "sarcastic", "detected"):
+        return "Yes"
+    if answer in ("no", "n", "false", "none", "not detected"):
+        return "No"
+    raise ValueError(f"expected Yes/No, got {value!r}")
+
+
+def _any(value):
+    return value
+
+
+def _nested(output_class):
+    def coerce(value):
+        if isinstance(value, output_class):
+            return value
+        if not isinstance(value, Mapping):
+            raise TypeError(f"expected an object, got {type(value).__name__}")
+        return output_class.from_dict(value)
+    return coerce
+
+
+# Typed Agent Outputs
+class AgentOutput(Mapping):
+    """Base of the typed agent results.
+
+    Known fields live in __slots__ and are validated on assignment; a value that doesn't
+    validate is dropped and noted in problems. Unknown keys are kept in extra. Results
+    read like the dicts agents used to return: result["emotion"], result.get(...), "key" in
+    result, with unset (None) fields treated as missing. to_dict() gives the JSON form.
+    """
+    __slots__ = ("extra", "problems", "structured")
+    FIELDS = {}
+    ALIASES = {}
+    # Field that holds the raw reply when it isn't structured
+    TEXT_FIELD = None
+
+    def __init__(self, **values):
+        self.extra = {}
+        self.problems = []
+        # True when the fields came from structured output rather than the raw-text fallback
+        self.structured = False
+        for name in self.FIELDS:
+            setattr(self, name, None)
+        for key, value in values.items():
+            self[key] = value
+
+    @classmethod
+    def from_dict(cls, data):
+        result = cls()
+        for key, value in data.items():
+            result[key] = value
+        result.structured = True
+        return result
+
+    @classmethod
+    def from_text(cls, text):
+        """Result for a reply with no JSON object in it"""
+        result = cls()
+        if cls.TEXT_FIELD is not None:
+            result[cls.TEXT_FIELD] = text
+        return result
+
+    @classmethod
+    def parse(cls, text):
+        """Validated result from a model reply: its JSON object if it has one, else from_text"""
+        data = extract_json_object(text)
+        if data is None:
+            return cls.from_text(text)
+        return cls.from_dict(data)
+
+    @classmethod
+    def coerce(cls, value):
+        """value as this type: results pass through, dicts are validated, anything else is empty"""
+        if isinstance(value, cls):
+            return value
+        if isinstance(value, Mapping):
+            return cls.from_dict(value)
+        return cls()
+
+    def _field_name(self, key):
+        if key in self.FIELDS:
+            return key
+        normalized = normalize_key(key)
+        normalized = self.ALIASES.get(normalized, normalized)
+        return normalized if normalized in self.FIELDS else None
+
+    def __setitem__(self, key, value):
+        name = self._field_name(key)
+        if name is None:
+            self.extra[key] = value
+            return
+        if value is not None:
+            try:
+                value = self.FIELDS[name](value)
+            except (TypeError, ValueError, AttributeError) as e:
+                self.problems.append(f"{name}: {e}")
+                return
+        setattr(self, name, value)
+
+    def __getitem__(self, key):
+        value = getattr(self, key) if key in self.FIELDS else self.extra.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        for name in self.FIELDS:
+            if getattr(self, name) is not None:
+                yield name
+        yield from self.extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def to_dict(self):
+        return {key: value.to_dict() if isinstance(value, AgentOutput) else value for key, value in self.items()}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class ProcessedInput(AgentOutput):
+    """Output of the user input processing agent"""
+    FIELDS = {
+        "processed_text": _text,
+        "main_intent": _text,
+        "main_topic": _text,
+        "keywords": _text_list,
+        "timestamp": _text,
+        "raw_input": _text,
+        "error": _text,
+    }
+    ALIASES = {
+        "keywords_for_context_understanding": "keywords",
+        "intent": "main_intent",
+        "topic": "main_topic",
+    }
+    TEXT_FIELD = "processed_text"
+    __slots__ = tuple(FIELDS)
+
+    @classmethod
+    def from_text(cls, text):
+        # The input prompt asks for "Processed Text: ..." style lines rather than JSON
+        result = cls()
+        for label, value in _LABELED_LINE.findall(text or ""):
+            if result._field_name(label) is not None:
+                result[label] = value
+        if "processed_text" in result:
+            result.structured = True
+        else:
+            result.processed_text = text
+        return result
+
+
+class EmotionResult(AgentOutput):
+    """Output of the emotion detection agent (or the local lexicon classifier)"""
+    FIELDS = {
+        "emotion": _text,
+        "intensity_level": _choice("Mild", "Moderate", "Severe"),
+        "intensity_score": _integer(1, 5),
+        "confidence_score_emotion": _fraction,
+        "sarcasm_detected": _yes_no,
+        "confidence_score_sarcasm": _fraction,
+        "identified_keywords": _text_list,
+        "context_notes": _text,
+        "fallback_action_taken": _text,
+        "source": _text,
+        "detected_emotion": _text,
+        "error": _text,
+    }
+    ALIASES = {"keywords": "identified_keywords", "sarcasm": "sarcasm_detected", "intensity": "intensity_level"}
+    TEXT_FIELD = "detected_emotion"
+    __slots__ = tuple(FIELDS)
+
+
+class ResponseGuidance(AgentOutput):
+    FIELDS = {
+        "focus_areas": _text_list,
+        "approach_suggestion": _text,
+        "avoid_topics": _text_list,
+    }
+    __slots__ = tuple(FIELDS)
+
+
+class CulturalContext(AgentOutput):
+    FIELDS = {"cultural_elements_detected": _any}
+    __slots__ = tuple(FIELDS)
+
+
+class ContextAnalysis(AgentOutput):
+    """Output of the context management agent"""
+    FIELDS = {
+        "context_summary": _text,
+        "response_guidance": _nested(ResponseGuidance),
+        "cultural_context": _nested(CulturalContext),
+        "error": _text,
+    }
+    ALIASES = {"summary": "context_summary", "guidance": "response_guidance"}
+    TEXT_FIELD = "context_summary"
+    __slots__ = tuple(FIELDS)
+
+
+class FeedbackAnalysis(AgentOutput):
+    """Output of the feedback loop agent; its reply format is free-form, so most keys land in extra"""
+    FIELDS = {"feedback": _text, "error": _text}
+    TEXT_FIELD = "feedback"
+    __slots__ = tuple(FIELDS)
+
+
+class FusedAnalysis(AgentOutput):
+    """Output of the fused analysis agent: the three analysis results in one object"""
+    FIELDS = {
+        "processed_input": _nested(ProcessedInput),
+        "emotion": _nested(EmotionResult),
+        "context": _nested(ContextAnalysis),
+        "error": _text,
+    }
+    __slots__ = tuple(FIELDS)
+
+
+# Incremental Parsing
+class IncrementalJSONParser:
+    """Parses a JSON object as it streams in, reporting each top-level field once its value is complete.
+
+    Text before the opening "{" (prose, a ```json fence) is skipped. feed() returns the
+    (key, value) pairs completed by the new text; fields holds everything parsed so far.
+    """
+    def __init__(self):
+        self.fields = {}
+        self.done = False
+        self._text = ""
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._member_start = None
+
+    def feed(self, chunk):
+        completed = []
+        if self.done or not chunk:
+            return completed
+        self._text += chunk
+        text = self._text
+        for index in range(self._position, len(text)):
+            char = text[index]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if self._member_start is None:
+                # Still looking for the object's opening brace
+                if char == "{":
+                    self._depth = 1
+                    self._member_start = index + 1
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._complete_member(text[self._member_start:index], completed)
+                    self.done = True
+                    break
+            elif char == "," and self._depth == 1:
+                self._complete_member(text[self._member_start:index], completed)
+                self._member_start = index + 1
+        self._position = len(text)
+        return completed
+
+    def _complete_member(self, member, completed):
+        if not member.strip():
+            return
+        try:
+            parsed = json.loads("{" + member + "}")
+        except ValueError:
+            return
+        for key, value in parsed.items():
+            self.fields[key] = value
+            completed.append((key, value))
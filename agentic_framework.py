@@ -1,66 +1,429 @@
+import asyncio
+import atexit
+import contextvars
+import inspect
 import json
+import sys
+import threading
+import time
+from collections.abc import Mapping
+from concurrent.futures import Future
 from datetime import datetime
 import uuid
-# Add these imports at the top of your file
+# Only the OpenTelemetry API is needed at import time; the SDK and exporter load in init_telemetry
 from opentelemetry import trace
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
-import openai
-
-# Initialize the OpenAI client
-client = openai.OpenAI(
-    api_key="your_key"
+from agent_cache import AgentCache
+from agent_metrics import (
+    observe_cache, observe_sessions, record_agent_result, record_agent_run, record_escalation, record_llm_usage,
+    record_turn
 )
+from agent_outputs import (
+    AgentOutput, ContextAnalysis, EmotionResult, FeedbackAnalysis, FusedAnalysis, IncrementalJSONParser,
+    ProcessedInput, extract_json_object, json_mode_params
+)
+from background_queue import BackgroundQueue, close_all as close_background_queues
+from emotion_lexicon import DEFAULT_CONFIDENCE_THRESHOLD, LexiconEmotionClassifier
+from llm_gateway import LLMGateway, create_http_client
+from log_config import get_agent_logger, get_logger
+from memory_structures import BoundedOrderedSet, MessageRecord, RingBuffer
+from prompt_builder import DEFAULT_TOKEN_BUDGETS, TurnPromptContext, default_token_counter
+from prompt_templates import agent_template, compile_prompt_templates
+from resilience import TurnBudgetExceeded, call_with_resilience, turn_budget, turn_deadline
+from risk_screen import ESCALATION_RESPONSE, default_risk_screen
+from session_store import SessionRegistry
+from span_enrichment import record_agent_output, record_llm_call, record_text
+
+# Per-agent loggers; DEBUG output is skipped without formatting unless enabled (see log_config)
+_input_logger = get_agent_logger("user_input_processing")
+_emotion_logger = get_agent_logger("emotion_detection")
+_context_logger = get_agent_logger("context_analysis")
+_response_logger = get_agent_logger("response_generation")
+_feedback_logger = get_agent_logger("feedback_processing")
+_fused_logger = get_agent_logger("fused_analysis")
+_summary_logger = get_agent_logger("conversation_summary")
+_chatbot_logger = get_logger("chatbot")
+
+# OpenAI clients. They are created on first use, so importing this module doesn't load the
+# openai package; assigning agentic_framework.async_client (e.g. a fake client) replaces it.
+def _create_client():
+    import openai
+    return openai.OpenAI(
+        api_key="your_key"
+    )
+
+def _create_async_client():
+    import openai
+    # Retries are handled per agent by resilience.call_with_resilience, so the SDK's own are disabled.
+    # The pooled HTTP client reuses keep-alive connections across agents and sessions.
+    return openai.AsyncOpenAI(
+        api_key="your_key",
+        max_retries=0,
+        http_client=create_http_client()
+    )
+
+_CLIENT_FACTORIES = {"client": _create_client, "async_client": _create_async_client}
+_client_lock = threading.Lock()
+
+def _get_client(name):
+    client = globals().get(name)
+    if client is None:
+        with _client_lock:
+            client = globals().get(name)
+            if client is None:
+                client = globals()[name] = _CLIENT_FACTORIES[name]()
+    return client
+
+def __getattr__(name):
+    # agentic_framework.client / .async_client are created on first access (PEP 562)
+    if name in _CLIENT_FACTORIES:
+        return _get_client(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def warm_up():
+    """Create the async OpenAI client now instead of on the first chat turn.
+
+    Meant for a background thread once a worker is ready, so the first user doesn't wait
+    for openai to be imported.
+    """
+    _get_client("async_client")
+
+# Shared event loop for the sync API. The sync wrappers submit coroutines here instead of
+# calling asyncio.run per call, so the async client's connection pool stays on one loop.
+_event_loop = None
+_event_loop_thread = None
+_event_loop_lock = threading.Lock()
+
+def _get_event_loop():
+    global _event_loop, _event_loop_thread
+    with _event_loop_lock:
+        if _event_loop is None:
+            _event_loop = asyncio.new_event_loop()
+            _event_loop_thread = threading.Thread(target=_event_loop.run_forever, name="agent-event-loop", daemon=True)
+            _event_loop_thread.start()
+    return _event_loop
+
+# Longest interpreter exit waits for background work on the shared loop to wind down
+SHUTDOWN_TIMEOUT = 5.0
+
+def _shutdown_event_loop():
+    # Close background queues and cancel whatever else is pending before stopping the loop, so
+    # no task is left pending (and reported as destroyed) when the interpreter exits
+    loop = _event_loop
+    if loop is None or not loop.is_running():
+        return
+
+    async def shutdown():
+        await close_background_queues()
+        # Calls still queued for admission (e.g. from a turn still in progress) give up now
+        _llm_gateway.cancel_waiting()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def start():
+        # The loop stops only once shutdown has finished
+        loop.create_task(shutdown()).add_done_callback(lambda task: loop.stop())
+
+    loop.call_soon_threadsafe(start)
+    _event_loop_thread.join(SHUTDOWN_TIMEOUT)
+
+atexit.register(_shutdown_event_loop)
+
+def run_sync(coro):
+    """Run a coroutine on the shared agent event loop and block until it finishes"""
+    loop = _get_event_loop()
+    try:
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+    if running_loop is loop:
+        coro.close()
+        raise RuntimeError("run_sync() cannot be called from the agent event loop; await the coroutine instead")
+    # Carry the caller's context (e.g. the active trace span) into the task
+    ctx = contextvars.copy_context()
+    result = Future()
+
+    def on_done(task):
+        if task.cancelled():
+            result.cancel()
+        elif task.exception() is not None:
+            result.set_exception(task.exception())
+        else:
+            result.set_result(task.result())
+
+    def start():
+        if result.set_running_or_notify_cancel():
+            loop.create_task(coro, context=ctx).add_done_callback(on_done)
+        else:
+            coro.close()
+
+    loop.call_soon_threadsafe(start)
+    return result.result()
+
+# Optional CallRecorder: records every agent call, or replays recorded calls instead of calling the API
+_call_recorder = None
+
+# Every agent call is admitted through the process-wide gateway (rate limits, priority lanes)
+_llm_gateway = LLMGateway()
+
+def set_llm_gateway(gateway):
+    """Replace the process-wide LLMGateway, e.g. to match the account's rate limits"""
+    global _llm_gateway
+    _llm_gateway = gateway
+
+def set_call_recorder(recorder):
+    """Record agent LLM calls to, or replay them from, a CallRecorder (None turns it off)"""
+    global _call_recorder
+    _call_recorder = recorder
+
+async def _acreate_completion(agent, **params):
+    """Call the chat completions API for an agent with its deadline, retry and circuit-breaker policy,
+    recording model, token usage and latency on the current span"""
+    recorder = _call_recorder
+    started = time.perf_counter()
+    shared = False
+    if recorder is not None and recorder.replaying:
+        response = await recorder.replay(agent, params)
+    else:
+        response, shared = await call_with_resilience(agent, lambda timeout: _llm_gateway.call(
+            agent, params, lambda: _get_client("async_client").chat.completions.create(**params), timeout,
+            return_shared=True
+        ), timed=True)
+        if recorder is not None:
+            recorder.record_response(agent, params, response, time.perf_counter() - started)
+    # A coalesced follower got the leader's response: its tokens are counted once, by the leader
+    usage = None if shared else getattr(response, "usage", None)
+    span = trace.get_current_span()
+    record_llm_call(span, getattr(response, "model", None) or params.get("model"), time.perf_counter() - started, usage)
+    if shared and span.is_recording():
+        span.set_attribute("llm.coalesced", True)
+    record_llm_usage(agent, usage)
+    return response
+
+def _record_turn(session_id, user_input):
+    if _call_recorder is not None and not _call_recorder.replaying:
+        _call_recorder.record_turn(session_id, user_input)
+
+async def _aopen_completion_stream(agent, **params):
+    """Open a streaming chat completion for an agent; retries and the deadline cover opening the stream"""
+    recorder = _call_recorder
+    if recorder is not None and recorder.replaying:
+        return await recorder.replay(agent, params)
+    started = time.perf_counter()
+    stream = await call_with_resilience(agent, lambda timeout: _llm_gateway.call(
+        agent, params, lambda: _get_client("async_client").chat.completions.create(**params), timeout
+    ), timed=True)
+    if recorder is not None:
+        return recorder.record_stream(agent, params, stream, started)
+    return stream
 
 # Initialize OpenTelemetry
-def init_telemetry(endpoint="http://localhost:6006/v1/traces"):
-    """Initialize OpenTelemetry with Phoenix"""
-    trace_provider = TracerProvider()
-    trace_provider.add_span_processor(SimpleSpanProcessor(OTLPSpanExporter(endpoint)))
+TELEMETRY_MODES = ("batch", "simple", "none")
+
+def init_telemetry(endpoint="http://localhost:6006/v1/traces", mode="batch", sample_ratio=1.0,
+                   max_queue_size=2048, max_export_batch_size=512, schedule_delay_millis=1000,
+                   export_timeout_millis=5000):
+    """Initialize OpenTelemetry with Phoenix
+
+    mode="batch" (default) hands finished spans to a background thread through a bounded queue.
+    When the collector is slow or down, spans are dropped once the queue fills instead of
+    blocking a chat turn. mode="simple" exports each span synchronously as it ends and is meant
+    for local debugging only. mode="none" installs a no-op tracer for load tests.
+
+    sample_ratio is the fraction of conversation turns traced. Sampling is head-based, so agent
+    spans follow the decision made for their conversation_turn.
+    """
+    if mode not in TELEMETRY_MODES:
+        raise ValueError(f"Unknown telemetry mode '{mode}', expected one of {', '.join(TELEMETRY_MODES)}")
+    if mode == "none":
+        trace.set_tracer_provider(trace.NoOpTracerProvider())
+        return trace.get_tracer("emotional_support_chatbot")
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    sampler = ParentBased(TraceIdRatioBased(sample_ratio))
+    trace_provider = TracerProvider(sampler=sampler)
+    exporter = OTLPSpanExporter(endpoint, timeout=export_timeout_millis / 1000)
+    if mode == "simple":
+        trace_provider.add_span_processor(SimpleSpanProcessor(exporter))
+    else:
+        trace_provider.add_span_processor(BatchSpanProcessor(
+            exporter,
+            max_queue_size=max_queue_size,
+            max_export_batch_size=max_export_batch_size,
+            schedule_delay_millis=schedule_delay_millis,
+            export_timeout_millis=export_timeout_millis
+        ))
     trace.set_tracer_provider(trace_provider)
     return trace.get_tracer("emotional_support_chatbot")
 
 # Define a class to store conversation history
+# Evicted messages waiting for the background summarizer are capped so a lagging summarizer
+# can't grow a session without bound
+MAX_UNSUMMARIZED_EVICTIONS = 100
+# Bumped whenever ConversationMemory.to_dict() changes shape
+MEMORY_FORMAT_VERSION = 1
+
 class ConversationMemory:
-    def __init__(self, max_history=20):
-        self.messages = []
+    def __init__(self, max_history=20, session_id=None):
         self.max_history = max_history
-        self.session_id = str(uuid.uuid4())
+        # Fixed-capacity ring of MessageRecords: the oldest message is overwritten in place
+        self._messages = RingBuffer(max_history)
+        self.session_id = session_id or str(uuid.uuid4())
         self.session_start = datetime.now()
+        self.previous_response = None
+        self.feedback_history = []
+        # Rolling summary tier: messages older than the agents' recent window are folded into
+        # summary in the background. message_count is the total ever added, summarized_until the
+        # absolute index of the first message not yet in the summary.
+        self.summary = None
+        self.message_count = 0
+        self.summarized_until = 0
+        self.turns_since_summary = 0
+        self.unsummarized_evictions = []
         self.user_profile = {
-            "detected_emotions": [],
-            "recurring_topics": [],
+            "detected_emotions": RingBuffer(5),
+            "recurring_topics": BoundedOrderedSet(maxlen=10),
             "cultural_context": None,
             "communication_preferences": None
         }
-    
+
+    @property
+    def messages(self):
+        """Read-only, oldest-first view of the retained messages (supports len, iteration and indexing)"""
+        return self._messages
+
     def add_message(self, role, content, emotion_data=None):
         """Add a message to the conversation history"""
-        timestamp = datetime.now()
-        message = {
-            "role": role,
-            "content": content,
-            "timestamp": timestamp,
-            "emotion_data": emotion_data
-        }
-        self.messages.append(message)
-        # Trim history if it exceeds max length
-        if len(self.messages) > self.max_history:
-            self.messages = self.messages[-self.max_history:]
-    
+        if isinstance(emotion_data, AgentOutput):
+            emotion_data = emotion_data.to_dict()
+        evicted = self._messages.append(MessageRecord(role, content, emotion_data))
+        self.message_count += 1
+        # Keep an evicted message the summary hasn't covered yet so no context is lost
+        if evicted is not None:
+            evicted_index = self.message_count - len(self._messages) - 1
+            if evicted_index >= self.summarized_until:
+                self.unsummarized_evictions.append((evicted_index, evicted.role, evicted.content))
+                if len(self.unsummarized_evictions) > MAX_UNSUMMARIZED_EVICTIONS:
+                    del self.unsummarized_evictions[0]
+
     def get_recent_messages(self, count=5):
         """Get the most recent messages"""
-        return self.messages[-count:] if len(self.messages) >= count else self.messages
+        return self._messages.tail(count)
     
     def get_formatted_history(self, count=5):
         """Get formatted conversation history for API calls"""
         recent = self.get_recent_messages(count)
         return [{"role": msg["role"], "content": msg["content"]} for msg in recent]
     
+    def messages_to_summarize(self, keep_recent=5):
+        """Messages older than the last keep_recent that the summary doesn't cover yet.
+
+        Returns (formatted messages, absolute index the summary will cover up to).
+        """
+        until = self.message_count - keep_recent
+        pending = [
+            {"role": role, "content": content}
+            for index, role, content in self.unsummarized_evictions
+            if self.summarized_until <= index < until
+        ]
+        first_index = self.message_count - len(self._messages)
+        for offset, msg in enumerate(self._messages):
+            if self.summarized_until <= first_index + offset < until:
+                pending.append({"role": msg.role, "content": msg.content})
+        return pending, until
+
+    def apply_summary(self, summary, until):
+        """Replace the running summary with one covering every message before index until"""
+        self.summary = summary
+        self.summarized_until = until
+        self.unsummarized_evictions = [entry for entry in self.unsummarized_evictions if entry[0] >= until]
+
+    def estimated_size(self):
+        """Rough number of bytes held by this conversation, used for per-process memory caps"""
+        size = 1024  # object, profile dict and bookkeeping
+        size += 8 * self._messages.capacity  # ring slots
+        for message in self._messages:
+            size += 120 + sys.getsizeof(message.content)
+        for topic in self.user_profile["recurring_topics"]:
+            size += 64 + sys.getsizeof(topic)
+        size += 240 * len(self.user_profile["detected_emotions"])
+        size += 512 * len(self.feedback_history)
+        for _, _, content in self.unsummarized_evictions:
+            size += 120 + sys.getsizeof(content)
+        if self.previous_response:
+            size += sys.getsizeof(self.previous_response)
+        if self.summary:
+            size += sys.getsizeof(self.summary)
+        return size
+
+    def to_dict(self):
+        """JSON-ready snapshot of the conversation, used for session persistence"""
+        profile = self.user_profile
+        return {
+            "version": MEMORY_FORMAT_VERSION,
+            "session_id": self.session_id,
+            "session_start": self.session_start.isoformat(),
+            "max_history": self.max_history,
+            "messages": [[msg.role, msg.content, msg.created_at, msg.emotion_data] for msg in self._messages],
+            "previous_response": self.previous_response,
+            "feedback_history": list(self.feedback_history),
+            "summary": self.summary,
+            "message_count": self.message_count,
+            "summarized_until": self.summarized_until,
+            "turns_since_summary": self.turns_since_summary,
+            "unsummarized_evictions": [list(entry) for entry in self.unsummarized_evictions],
+            "user_profile": {
+                "detected_emotions": [
+                    {**emotion, "timestamp": emotion["timestamp"].isoformat()}
+                    for emotion in profile["detected_emotions"]
+                ],
+                "recurring_topics": list(profile["recurring_topics"]),
+                "cultural_context": profile["cultural_context"],
+                "communication_preferences": profile["communication_preferences"],
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a conversation from a to_dict() snapshot"""
+        if data.get("version") != MEMORY_FORMAT_VERSION:
+            raise ValueError(f"Unsupported conversation format version {data.get('version')!r}")
+        memory = cls(max_history=data["max_history"], session_id=data["session_id"])
+        memory.session_start = datetime.fromisoformat(data["session_start"])
+        for role, content, created_at, emotion_data in data["messages"]:
+            memory._messages.append(MessageRecord(role, content, emotion_data, created_at))
+        memory.previous_response = data["previous_response"]
+        memory.feedback_history = data["feedback_history"]
+        memory.summary = data["summary"]
+        memory.message_count = data["message_count"]
+        memory.summarized_until = data["summarized_until"]
+        memory.turns_since_summary = data["turns_since_summary"]
+        memory.unsummarized_evictions = [tuple(entry) for entry in data["unsummarized_evictions"]]
+        profile = data["user_profile"]
+        for emotion in profile["detected_emotions"]:
+            memory.user_profile["detected_emotions"].append(
+                {**emotion, "timestamp": datetime.fromisoformat(emotion["timestamp"])}
+            )
+        for topic in profile["recurring_topics"]:
+            memory.user_profile["recurring_topics"].add(topic)
+        memory.user_profile["cultural_context"] = profile["cultural_context"]
+        memory.user_profile["communication_preferences"] = profile["communication_preferences"]
+        return memory
+
+    def add_feedback(self, feedback_analysis):
+        """Attach a feedback analysis result to the session, keeping the last 5"""
+        if isinstance(feedback_analysis, AgentOutput):
+            feedback_analysis = feedback_analysis.to_dict()
+        self.feedback_history.append(feedback_analysis)
+        if len(self.feedback_history) > 5:
+            self.feedback_history = self.feedback_history[-5:]
+
     def update_user_profile(self, emotion_data=None, topic=None):
         """Update user profile with new information"""
-        if emotion_data and isinstance(emotion_data, dict):
+        if emotion_data and isinstance(emotion_data, Mapping):
             # Store last 5 emotions to track patterns
             if "emotion" in emotion_data:
                 self.user_profile["detected_emotions"].append({
@@ -68,279 +431,975 @@ class ConversationMemory:
                     "intensity": emotion_data.get("intensity_score"),
                     "timestamp": datetime.now()
                 })
-                if len(self.user_profile["detected_emotions"]) > 5:
-                    self.user_profile["detected_emotions"] = self.user_profile["detected_emotions"][-5:]
-        if topic and topic not in self.user_profile["recurring_topics"]:
-            self.user_profile["recurring_topics"].append(topic)
-            if len(self.user_profile["recurring_topics"]) > 10:
-                self.user_profile["recurring_topics"] = self.user_profile["recurring_topics"][-10:]
+        if topic:
+            # Topics are set members; an unhashable value from the model is kept as its text
+            self.user_profile["recurring_topics"].add(topic if isinstance(topic, str) else str(topic))
 
 # 1. User Input Processing Agent
-def process_user_input(user_input, conversation_memory, user_input_prompt):
+async def aprocess_user_input(user_input, conversation_memory, user_input_prompt, cache=None, prompt_context=None):
     """Process and sanitize user input"""
+    prompt_context = prompt_context or TurnPromptContext(conversation_memory)
+    # Input processing doesn't see history, so identical messages can share a cached result
+    cache_key = AgentCache.make_key("user_input_processing", user_input, user_input_prompt) if cache is not None else None
+    processed_input = await cache.aget(cache_key) if cache is not None else None
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": user_input_prompt},
-                {"role": "user", "content": f"User message: {user_input}"}
-            ],
-            temperature=0.3
-        )
-        result_text = response.choices[0].message.content
-        print("DEBUG: process_user_input raw response:", result_text)
-        try:
-            processed_input = json.loads(result_text)
-        except json.JSONDecodeError:
-            # Fall back to using raw text if JSON parsing fails
-            processed_input = {"processed_text": result_text}
+        if processed_input is None:
+            response = await _acreate_completion(
+                "user_input_processing",
+                model="gpt-3.5-turbo",
+                messages=agent_template("user_input_processing", user_input_prompt).messages(
+                    user_input=prompt_context.user_input("user_input_processing", user_input)
+                ),
+                temperature=0.3,
+                **json_mode_params(user_input_prompt)
+            )
+            result_text = response.choices[0].message.content
+            _input_logger.debug("raw response: %s", result_text)
+            # Unstructured replies fall back to the raw text as processed_text and aren't cached
+            processed_input = ProcessedInput.parse(result_text)
+            if cache is not None and processed_input.structured:
+                cache.set(cache_key, processed_input.to_dict())
+        else:
+            processed_input = ProcessedInput.from_dict(processed_input)
         # Add metadata
-        processed_input["timestamp"] = datetime.now().isoformat()
-        processed_input["raw_input"] = user_input
+        processed_input.timestamp = datetime.now().isoformat()
+        processed_input.raw_input = user_input
         # Update conversation memory with topic if provided
-        if "main_topic" in processed_input:
-            conversation_memory.update_user_profile(topic=processed_input["main_topic"])
+        if processed_input.main_topic:
+            conversation_memory.update_user_profile(topic=processed_input.main_topic)
         return processed_input
     except Exception as e:
-        print("ERROR in process_user_input:", e)
-        print(f"Full error details: {str(e)}")  # More detailed error
-        return {
-            "error": str(e),
-            "raw_input": user_input,
-            "timestamp": datetime.now().isoformat()
-        }
+        _input_logger.error("process_user_input failed: %s", e)
+        return ProcessedInput(error=str(e), raw_input=user_input, timestamp=datetime.now().isoformat())
+
+def process_user_input(user_input, conversation_memory, user_input_prompt, cache=None, prompt_context=None):
+    """Process and sanitize user input (blocking wrapper around aprocess_user_input)"""
+    return run_sync(aprocess_user_input(user_input, conversation_memory, user_input_prompt, cache, prompt_context))
 
 # 2. Emotion Detection Agent
-def detect_emotion(user_input, conversation_memory, emotion_detection_prompt):
-    """Detects the user's emotional state from the input text using OpenAI API."""
-    formatted_history = conversation_memory.get_formatted_history(5)
-    conv_history_str = "None"
-    if formatted_history:
-        conv_history_str = "\n".join([f"{msg['role']}: {msg['content']}" for msg in formatted_history])
+async def adetect_emotion(user_input, conversation_memory, emotion_detection_prompt, cache=None, prompt_context=None, classifier=None):
+    """Detects the user's emotional state from the input text using OpenAI API.
+
+    With a classifier (e.g. LexiconEmotionClassifier), messages whose keywords are unambiguous
+    are classified locally and the API call is skipped.
+    """
+    if classifier is not None:
+        result_dict = classifier.classify(user_input)
+        if result_dict is not None:
+            emotion_data = EmotionResult.from_dict(result_dict)
+            conversation_memory.update_user_profile(emotion_data=emotion_data)
+            return emotion_data
+    prompt_context = prompt_context or TurnPromptContext(conversation_memory)
+    formatted_history = prompt_context.formatted_history
+    conv_history_str = prompt_context.history_text("emotion_detection")
+    cache_key = AgentCache.make_key(
+        "emotion_detection", user_input, emotion_detection_prompt, formatted_history
+    ) if cache is not None else None
+    result_dict = await cache.aget(cache_key) if cache is not None else None
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": emotion_detection_prompt},
-                {"role": "user", "content": f"User message: {user_input}\n\nConversation history: {conv_history_str}"}
-            ],
-            temperature=0.7
-        )
-        result_text = response.choices[0].message.content
-        print("DEBUG: detect_emotion raw response:", result_text)
-        try:
-            result_dict = json.loads(result_text)
-        except json.JSONDecodeError:
-            result_dict = {"detected_emotion": result_text}
-        conversation_memory.update_user_profile(emotion_data=result_dict)
-        return result_dict
+        if result_dict is None:
+            response = await _acreate_completion(
+                "emotion_detection",
+                model="gpt-3.5-turbo",
+                messages=agent_template("emotion_detection", emotion_detection_prompt).messages(
+                    history=conv_history_str,
+                    user_input=prompt_context.user_input("emotion_detection", user_input)
+                ),
+                temperature=0.7,
+                **json_mode_params(emotion_detection_prompt)
+            )
+            result_text = response.choices[0].message.content
+            _emotion_logger.debug("raw response: %s", result_text)
+            emotion_data = EmotionResult.parse(result_text)
+            if emotion_data.problems:
+                _emotion_logger.debug("invalid fields dropped: %s", emotion_data.problems)
+            if cache is not None and emotion_data.structured:
+                cache.set(cache_key, emotion_data.to_dict())
+        else:
+            emotion_data = EmotionResult.from_dict(result_dict)
+        conversation_memory.update_user_profile(emotion_data=emotion_data)
+        return emotion_data
     except Exception as e:
-        print("ERROR in detect_emotion:", e)
-        print(f"Full error details: {str(e)}")  # More detailed error
-        return {"error": str(e)}
+        _emotion_logger.error("detect_emotion failed: %s", e)
+        return EmotionResult(error=str(e))
+
+def detect_emotion(user_input, conversation_memory, emotion_detection_prompt, cache=None, prompt_context=None, classifier=None):
+    """Detects the user's emotional state from the input text using OpenAI API (blocking wrapper around adetect_emotion)"""
+    return run_sync(adetect_emotion(user_input, conversation_memory, emotion_detection_prompt, cache, prompt_context, classifier))
 
 # 3. Context Management Agent
-def analyze_context(user_input, processed_input, emotion_data, conversation_memory, context_management_prompt):
+async def aanalyze_context(user_input, processed_input, emotion_data, conversation_memory, context_management_prompt, prompt_context=None):
     """Analyzes conversation context to provide deeper understanding."""
-    user_profile = conversation_memory.user_profile
-    recent_emotions = user_profile["detected_emotions"]
-    recurring_topics = user_profile["recurring_topics"]
-    emotion_history = "None"
-    if recent_emotions:
-        emotion_history = ", ".join([f"{e['emotion']} (intensity: {e['intensity']})" for e in recent_emotions])
-    formatted_history = conversation_memory.get_formatted_history(5)
-    conv_history = "\n".join([f"{msg['role']}: {msg['content']}" for msg in formatted_history])
+    prompt_context = prompt_context or TurnPromptContext(conversation_memory)
+    recurring_topics = conversation_memory.user_profile["recurring_topics"]
+    emotion_history = prompt_context.emotion_history()
+    conv_history = prompt_context.history_text("context_analysis", empty="")
+    emotion_data = EmotionResult.coerce(emotion_data)
     try:
-        response = client.chat.completions.create(
+        response = await _acreate_completion(
+            "context_analysis",
             model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": context_management_prompt},
-                {"role": "user", "content": f"""
-User message: {user_input}
-
-Current emotion: {emotion_data.get('emotion', 'Unknown')} (Intensity: {emotion_data.get('intensity_score', 'Unknown')})
-Sarcasm detected: {emotion_data.get('sarcasm_detected', 'Unknown')}
-
-Recent emotion history: {emotion_history}
-
-Recurring topics: {', '.join(recurring_topics) if recurring_topics else 'None detected yet'}
-
-Conversation history:
-{conv_history}
-"""}
-            ],
-            temperature=0.5
+            messages=agent_template("context_analysis", context_management_prompt).messages(
+                summary=prompt_context.summary_text("context_analysis"),
+                recurring_topics=", ".join(recurring_topics) if recurring_topics else "None detected yet",
+                emotion_history=emotion_history,
+                history=conv_history,
+                emotion=emotion_data.emotion or "Unknown",
+                intensity=emotion_data.intensity_score or "Unknown",
+                sarcasm=emotion_data.sarcasm_detected or "Unknown",
+                user_input=prompt_context.user_input("context_analysis", user_input)
+            ),
+            temperature=0.5,
+            **json_mode_params(context_management_prompt)
         )
         result_text = response.choices[0].message.content
-        print("DEBUG: analyze_context raw response:", result_text)
-        try:
-            context_analysis = json.loads(result_text)
-        except json.JSONDecodeError:
-            context_analysis = {"context_summary": result_text}
-        if context_analysis.get("cultural_context", {}).get("cultural_elements_detected"):
-            conversation_memory.user_profile["cultural_context"] = context_analysis["cultural_context"]["cultural_elements_detected"]
+        _context_logger.debug("raw response: %s", result_text)
+        context_analysis = ContextAnalysis.parse(result_text)
+        _remember_cultural_context(conversation_memory, context_analysis)
         return context_analysis
     except Exception as e:
-        print("ERROR in analyze_context:", e)
-        print(f"Full error details: {str(e)}")  # More detailed error
-        return {"error": str(e)}
+        _context_logger.error("analyze_context failed: %s", e)
+        return ContextAnalysis(error=str(e))
+
+def _remember_cultural_context(conversation_memory, context_analysis):
+    cultural_context = context_analysis.cultural_context
+    if cultural_context is not None and cultural_context.cultural_elements_detected:
+        conversation_memory.user_profile["cultural_context"] = cultural_context.cultural_elements_detected
+
+def analyze_context(user_input, processed_input, emotion_data, conversation_memory, context_management_prompt, prompt_context=None):
+    """Analyzes conversation context to provide deeper understanding (blocking wrapper around aanalyze_context)"""
+    return run_sync(aanalyze_context(user_input, processed_input, emotion_data, conversation_memory, context_management_prompt, prompt_context))
 
 # 4. Response Generation Agent
-def generate_response(user_input, emotion_data, context_analysis, conversation_memory, response_generation_prompt):
-    """Generates an empathetic, friend-like response based on user input, emotional state, and context."""
-    emotion = emotion_data.get("emotion", "Unknown") if isinstance(emotion_data, dict) else "Unknown"
-    intensity = emotion_data.get("intensity_level", "Moderate") if isinstance(emotion_data, dict) else "Moderate"
-    sarcasm = emotion_data.get("sarcasm_detected", "No") if isinstance(emotion_data, dict) else "No"
-    focus_areas = context_analysis.get("response_guidance", {}).get("focus_areas", []) if isinstance(context_analysis, dict) else []
-    approach = context_analysis.get("response_guidance", {}).get("approach_suggestion", "Supportive") if isinstance(context_analysis, dict) else "Supportive"
-    avoid_topics = context_analysis.get("response_guidance", {}).get("avoid_topics", []) if isinstance(context_analysis, dict) else []
+FALLBACK_RESPONSE = "I'm here to listen. Would you like to tell me more about how you're feeling?"
+
+def _build_response_messages(user_input, emotion_data, context_analysis, conversation_memory, response_generation_prompt, prompt_context=None, span=None):
+    prompt_context = prompt_context or TurnPromptContext(conversation_memory)
+    emotion_data = EmotionResult.coerce(emotion_data)
+    guidance = ContextAnalysis.coerce(context_analysis).response_guidance
+    emotion = emotion_data.emotion or "Unknown"
+    intensity = emotion_data.intensity_level or "Moderate"
+    sarcasm = emotion_data.sarcasm_detected or "No"
+    focus_areas = guidance.focus_areas if guidance is not None and guidance.focus_areas else []
+    approach = guidance.approach_suggestion if guidance is not None and guidance.approach_suggestion else "Supportive"
+    avoid_topics = guidance.avoid_topics if guidance is not None and guidance.avoid_topics else []
     cultural_context = conversation_memory.user_profile.get("cultural_context")
     communication_preferences = conversation_memory.user_profile.get("communication_preferences")
+    return agent_template("response_generation", response_generation_prompt).messages(
+        span=span,
+        summary=prompt_context.summary_text("response_generation", empty="Nothing yet"),
+        cultural_context=cultural_context if cultural_context else "None detected",
+        communication_preferences=communication_preferences if communication_preferences else "None specified",
+        emotion=emotion,
+        intensity=intensity,
+        sarcasm=sarcasm,
+        focus_areas=", ".join(focus_areas) if focus_areas else "None specified",
+        approach=approach,
+        avoid_topics=", ".join(avoid_topics) if avoid_topics else "None specified",
+        user_input=prompt_context.user_input("response_generation", user_input)
+    )
+
+def _looks_like_json(text):
+    return text.lstrip().startswith(("{", "```"))
+
+def _unwrap_response_text(response_text):
+    """Pull the reply out of a JSON-wrapped completion, or return the text unchanged"""
+    if not _looks_like_json(response_text):
+        return response_text
+    response_json = extract_json_object(response_text)
+    if response_json is None:
+        return response_text
+    if isinstance(response_json.get("final_response"), str):
+        return response_json["final_response"]
+    return response_json.get("processed_text", response_text)
+
+async def agenerate_response(user_input, emotion_data, context_analysis, conversation_memory, response_generation_prompt, prompt_context=None):
+    """Generates an empathetic, friend-like response based on user input, emotional state, and context."""
     try:
-        response = client.chat.completions.create(
+        response = await _acreate_completion(
+            "response_generation",
             model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": response_generation_prompt},
-                {"role": "user", "content": f"""
-Respond as a supportive friend to this message:
-
-User message: "{user_input}"
-
-IMPORTANT CONTEXT (use this to inform your response but don't reference it directly):
-- User's detected emotion: {emotion} (Intensity: {intensity})
-- Sarcasm detected: {sarcasm}
-- Suggested focus areas: {', '.join(focus_areas) if focus_areas else 'None specified'}
-- Suggested approach: {approach}
-- Topics to avoid: {', '.join(avoid_topics) if avoid_topics else 'None specified'}
-- Cultural context to consider: {cultural_context if cultural_context else 'None detected'}
-- Communication preferences: {communication_preferences if communication_preferences else 'None specified'}
-
-Remember to respond as a supportive friend would, not as a therapist or AI assistant.
-"""}
-            ],
+            messages=_build_response_messages(
+                user_input, emotion_data, context_analysis, conversation_memory, response_generation_prompt, prompt_context
+            ),
             temperature=0.7,
             max_tokens=300
         )
         response_text = response.choices[0].message.content
-        print("DEBUG: generate_response raw response:", response_text)
+        _response_logger.debug("raw response: %s", response_text)
+        return _unwrap_response_text(response_text)
+    except Exception as e:
+        _response_logger.error("generate_response failed: %s", e)
+        return FALLBACK_RESPONSE
+
+async def _iter_until(stream, deadline):
+    """Iterate an async stream, raising TurnBudgetExceeded once deadline (time.monotonic) passes"""
+    iterator = aiter(stream)
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TurnBudgetExceeded("response_generation: turn latency budget exhausted while streaming")
         try:
-            response_json = json.loads(response_text)
-            if "final_response" in response_json:
-                return response_json["final_response"]
-            else:
-                return response_json.get("processed_text", response_text)
-        except json.JSONDecodeError:
-            return response_text
+            chunk = await asyncio.wait_for(anext(iterator), remaining)
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError:
+            # Give the connection back rather than leaving the response half read
+            close = getattr(stream, "aclose", None) or getattr(stream, "close", None)
+            if close is not None:
+                result = close()
+                if inspect.isawaitable(result):
+                    await result
+            raise TurnBudgetExceeded("response_generation: turn latency budget exhausted while streaming") from None
+        yield chunk
+
+async def agenerate_response_stream(user_input, emotion_data, context_analysis, conversation_memory, response_generation_prompt, prompt_context=None, span=None, deadline=None):
+    """Streaming version of agenerate_response that yields the reply text as tokens arrive.
+
+    Call metrics are recorded on span, or on the current span if none is given. deadline
+    (time.monotonic(), None for none) bounds both opening the stream and reading it; a reply
+    cut short keeps the text already sent.
+    """
+    # Plain-text replies are passed through token by token. A reply that starts with "{" is
+    # JSON-wrapped: it is parsed as it streams and final_response is yielded as soon as that
+    # field is complete, otherwise it is unwrapped once complete, like agenerate_response.
+    chunks = []
+    buffering = None
+    parser = IncrementalJSONParser()
+    unwrapped = False
+    started = time.perf_counter()
+    time_to_first_token = None
+    usage = None
+    model = "gpt-3.5-turbo"
+    try:
+        messages = _build_response_messages(
+            user_input, emotion_data, context_analysis, conversation_memory, response_generation_prompt, prompt_context, span
+        )
+        # Retries and the per-attempt timeout cover opening the stream; once tokens flow they are
+        # passed through until the turn deadline
+        with turn_deadline(deadline):
+            stream = await _aopen_completion_stream(
+                "response_generation",
+                model=model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=300,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+        async for chunk in (stream if deadline is None else _iter_until(stream, deadline)):
+            # With include_usage the final chunk carries token counts and no choices
+            usage = getattr(chunk, "usage", None) or usage
+            model = getattr(chunk, "model", None) or model
+            if not chunk.choices:
+                continue
+            token = chunk.choices[0].delta.content
+            if not token:
+                continue
+            if time_to_first_token is None:
+                time_to_first_token = time.perf_counter() - started
+            chunks.append(token)
+            if buffering is None:
+                leading = "".join(chunks).lstrip()
+                if not leading:
+                    continue
+                buffering = _looks_like_json(leading)
+                if not buffering:
+                    yield "".join(chunks)
+                    continue
+                token = "".join(chunks)
+            if not buffering:
+                yield token
+            elif not unwrapped:
+                for key, value in parser.feed(token):
+                    if key == "final_response" and isinstance(value, str):
+                        unwrapped = True
+                        yield value
+        record_llm_call(
+            span or trace.get_current_span(), model, time.perf_counter() - started, usage, time_to_first_token
+        )
+        record_llm_usage("response_generation", usage)
     except Exception as e:
-        print("ERROR in generate_response:", e)
-        print(f"Full error details: {str(e)}")  # More detailed error
-        return "I'm here to listen. Would you like to tell me more about how you're feeling?"
+        _response_logger.error("generate_response failed: %s", e)
+        if buffering is False or unwrapped:
+            return
+        chunks = []
+    response_text = "".join(chunks)
+    _response_logger.debug("raw response: %s", response_text)
+    if unwrapped:
+        return
+    if not response_text.strip():
+        yield FALLBACK_RESPONSE
+    elif buffering:
+        yield _unwrap_response_text(response_text)
+
+def generate_response(user_input, emotion_data, context_analysis, conversation_memory, response_generation_prompt, prompt_context=None):
+    """Generates an empathetic, friend-like response based on user input, emotional state, and context (blocking wrapper around agenerate_response)"""
+    return run_sync(agenerate_response(user_input, emotion_data, context_analysis, conversation_memory, response_generation_prompt, prompt_context))
 
 # 5. Feedback Loop Agent
-def process_feedback(user_input, previous_response, conversation_memory, feedback_loop_prompt):
+async def aprocess_feedback(user_input, previous_response, conversation_memory, feedback_loop_prompt, prompt_context=None):
     """Analyzes user feedback to previous response and suggests improvements."""
+    prompt_context = prompt_context or TurnPromptContext(conversation_memory)
     try:
-        response = client.chat.completions.create(
+        response = await _acreate_completion(
+            "feedback_processing",
             model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": feedback_loop_prompt},
-                {"role": "user", "content": f"""
-Previous system response: "{previous_response}"
+            messages=agent_template("feedback_processing", feedback_loop_prompt).messages(
+                previous_response=prompt_context.fit("feedback_processing", "previous_response", previous_response),
+                user_input=prompt_context.user_input("feedback_processing", user_input)
+            ),
+            temperature=0.5,
+            **json_mode_params(feedback_loop_prompt)
+        )
+        result_text = response.choices[0].message.content
+        _feedback_logger.debug("raw response: %s", result_text)
+        return FeedbackAnalysis.parse(result_text)
+    except Exception as e:
+        _feedback_logger.error("process_feedback failed: %s", e)
+        return FeedbackAnalysis(error=str(e))
 
-User's latest message (potential feedback): "{user_input}"
-"""}
-            ],
-            temperature=0.5
+def process_feedback(user_input, previous_response, conversation_memory, feedback_loop_prompt, prompt_context=None):
+    """Analyzes user feedback to previous response and suggests improvements (blocking wrapper around aprocess_feedback)"""
+    return run_sync(aprocess_feedback(user_input, previous_response, conversation_memory, feedback_loop_prompt, prompt_context))
+
+# 6. Fused Analysis Agent (input processing + emotion detection + context analysis in one call)
+FUSED_ANALYSIS_INSTRUCTIONS = """You are the analysis stage of a supportive chatbot. In a single pass, do the work of
+three agents whose guidelines follow: input processing, emotion detection and context analysis.
+
+Return ONLY a JSON object with exactly these top-level keys:
+{
+    "processed_input": {"processed_text": "...", "main_intent": "...", "main_topic": "...", "keywords": ["..."]},
+    "emotion": {
+        "emotion": "Happiness/Sadness/Fear/Anxiety/Anger/Frustration",
+        "intensity_level": "Mild/Moderate/Severe",
+        "intensity_score": 1-5,
+        "confidence_score_emotion": 0-1,
+        "sarcasm_detected": "Yes/No",
+        "confidence_score_sarcasm": 0-1,
+        "identified_keywords": ["..."]
+    },
+    "context": {
+        "context_summary": "...",
+        "response_guidance": {"focus_areas": ["..."], "approach_suggestion": "...", "avoid_topics": ["..."]},
+        "cultural_context": {"cultural_elements_detected": null}
+    }
+}"""
+
+def build_fused_analysis_prompt(prompts):
+    """Combine the three analysis prompts into the system prompt used by fused analysis"""
+    if prompts.get("fused_analysis_prompt"):
+        return prompts["fused_analysis_prompt"]
+    return "\n\n".join([
+        FUSED_ANALYSIS_INSTRUCTIONS,
+        "## Input processing guidelines\n" + prompts["user_input_prompt"],
+        "## Emotion detection guidelines\n" + prompts["emotion_detection_prompt"],
+        "## Context analysis guidelines\n" + prompts["context_management_prompt"],
+    ])
+
+def validate_fused_analysis(result):
+    """Check a fused analysis result has the fields downstream agents read; returns a list of problems.
+
+    Fields are checked after validation, so a required field with an unusable value counts as missing.
+    """
+    if not isinstance(result, Mapping):
+        return ["result is not a JSON object"]
+    result = FusedAnalysis.coerce(result)
+    problems = []
+    for section in ("processed_input", "emotion", "context"):
+        if getattr(result, section) is None:
+            problems.append(f"missing object '{section}'")
+    if problems:
+        return problems
+    for key in ("emotion", "intensity_score", "sarcasm_detected"):
+        if key not in result.emotion:
+            problems.append(f"emotion.{key} missing")
+    context = result.context
+    if context.response_guidance is None:
+        problems.append("context.response_guidance missing")
+    if any(problem.startswith("cultural_context:") for problem in context.problems):
+        problems.append("context.cultural_context is not an object")
+    return problems
+
+async def afused_analysis(user_input, conversation_memory, fused_analysis_prompt, prompt_context=None):
+    """Produces processed input, emotion and context analysis from a single structured-output call."""
+    prompt_context = prompt_context or TurnPromptContext(conversation_memory)
+    recurring_topics = conversation_memory.user_profile["recurring_topics"]
+    emotion_history = prompt_context.emotion_history()
+    conv_history = prompt_context.history_text("fused_analysis")
+    try:
+        response = await _acreate_completion(
+            "fused_analysis",
+            model="gpt-3.5-turbo",
+            messages=agent_template("fused_analysis", fused_analysis_prompt).messages(
+                summary=prompt_context.summary_text("fused_analysis"),
+                recurring_topics=", ".join(recurring_topics) if recurring_topics else "None detected yet",
+                emotion_history=emotion_history,
+                history=conv_history,
+                user_input=prompt_context.user_input("fused_analysis", user_input)
+            ),
+            temperature=0.3,
+            response_format={"type": "json_object"}
         )
         result_text = response.choices[0].message.content
-        print("DEBUG: process_feedback raw response:", result_text)
-        try:
-            feedback_analysis = json.loads(result_text)
-        except json.JSONDecodeError:
-            feedback_analysis = {"feedback": result_text}
-        return feedback_analysis
+        _fused_logger.debug("raw response: %s", result_text)
+        data = extract_json_object(result_text)
+        if data is None:
+            return FusedAnalysis(error="invalid JSON: no object in reply")
+        result = FusedAnalysis.from_dict(data)
+        problems = validate_fused_analysis(result)
+        if problems:
+            return FusedAnalysis(error="; ".join(problems))
+        processed_input = result.processed_input
+        processed_input.timestamp = datetime.now().isoformat()
+        processed_input.raw_input = user_input
+        # Same profile updates the three separate agents make
+        if processed_input.main_topic:
+            conversation_memory.update_user_profile(topic=processed_input.main_topic)
+        conversation_memory.update_user_profile(emotion_data=result.emotion)
+        _remember_cultural_context(conversation_memory, result.context)
+        return result
+    except Exception as e:
+        _fused_logger.error("fused_analysis failed: %s", e)
+        return FusedAnalysis(error=str(e))
+
+def fused_analysis(user_input, conversation_memory, fused_analysis_prompt, prompt_context=None):
+    """Produces processed input, emotion and context analysis from a single structured-output call (blocking wrapper around afused_analysis)"""
+    return run_sync(afused_analysis(user_input, conversation_memory, fused_analysis_prompt, prompt_context))
+
+# 7. Conversation Summary Agent
+CONVERSATION_SUMMARY_PROMPT = """You keep a running summary of a conversation between a user and Yaar.AI, their
+supportive AI friend. Merge the previous summary and the new messages into one updated summary of at most
+120 words. Keep the user's main concerns and recurring topics, how their mood has shifted, personal details a
+friend would remember (people, events, plans) and what kind of support helped. Drop small talk.
+Write plain third-person prose and return only the summary."""
+
+async def asummarize_conversation(previous_summary, new_messages, conversation_summary_prompt=CONVERSATION_SUMMARY_PROMPT,
+                                  token_budgets=None):
+    """Folds older messages into the running conversation summary; returns None on failure."""
+    transcript = "\n".join([f"{msg['role']}: {msg['content']}" for msg in new_messages])
+    budgets = token_budgets or DEFAULT_TOKEN_BUDGETS
+    transcript = default_token_counter.truncate(
+        transcript, budgets.get("conversation_summary", {}).get("transcript"), keep="end"
+    )
+    try:
+        response = await _acreate_completion(
+            "conversation_summary",
+            model="gpt-3.5-turbo",
+            messages=agent_template("conversation_summary", conversation_summary_prompt).messages(
+                previous_summary=previous_summary or "None",
+                transcript=transcript
+            ),
+            temperature=0.3,
+            max_tokens=200
+        )
+        summary = (response.choices[0].message.content or "").strip()
+        _summary_logger.debug("raw response: %s", summary)
+        return summary or None
     except Exception as e:
-        print("ERROR in process_feedback:", e)
-        print(f"Full error details: {str(e)}")  # More detailed error
-        return {"error": str(e)}
+        _summary_logger.error("summarize_conversation failed: %s", e)
+        return None
+
+def summarize_conversation(previous_summary, new_messages, conversation_summary_prompt=CONVERSATION_SUMMARY_PROMPT,
+                           token_budgets=None):
+    """Folds older messages into the running conversation summary (blocking wrapper around asummarize_conversation)"""
+    return run_sync(asummarize_conversation(previous_summary, new_messages, conversation_summary_prompt, token_budgets))
+
+def agent_system_prompts(prompts):
+    """System prompt of every agent, keyed by agent name"""
+    return {
+        "user_input_processing": prompts["user_input_prompt"],
+        "emotion_detection": prompts["emotion_detection_prompt"],
+        "context_analysis": prompts["context_management_prompt"],
+        "response_generation": prompts["response_generation_prompt"],
+        "feedback_processing": prompts["feedback_loop_prompt"],
+        "fused_analysis": build_fused_analysis_prompt(prompts),
+        "conversation_summary": prompts.get("conversation_summary_prompt", CONVERSATION_SUMMARY_PROMPT),
+    }
+
+# Agent Graph Executor
+class AgentGraph:
+    """Runs agents as a dependency graph, starting each one as soon as its inputs are ready"""
+    def __init__(self):
+        self.nodes = {}
+
+    def add(self, name, func, depends_on=()):
+        """Register an agent. func receives the results of its dependencies as keyword arguments."""
+        for dependency in depends_on:
+            if dependency not in self.nodes:
+                raise ValueError(f"Agent '{name}' depends on unknown agent '{dependency}'")
+        self.nodes[name] = (func, tuple(depends_on))
+
+    async def arun(self):
+        """Execute a graph of coroutine functions on the running event loop"""
+        # Tasks copy the current context, so agent spans nest under the caller's span
+        tasks = {}
+
+        async def run_node(func, depends_on):
+            if depends_on:
+                await asyncio.gather(*(tasks[dependency] for dependency in depends_on))
+            return await func(**{dependency: tasks[dependency].result() for dependency in depends_on})
+
+        # add() only accepts known dependencies, so insertion order is already a valid topological order
+        for name, (func, depends_on) in self.nodes.items():
+            tasks[name] = asyncio.ensure_future(run_node(func, depends_on))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+        return {name: task.result() for name, task in tasks.items()}
+
+def _pick_result(name):
+    async def pick(fused_analysis):
+        return fused_analysis[name]
+    return pick
+
+def _record_response_run(seconds, response):
+    # agenerate_response reports failures by returning the canned reply
+    if response == FALLBACK_RESPONSE:
+        record_agent_run("response_generation", seconds, "fallback", "canned_reply")
+    else:
+        record_agent_run("response_generation", seconds)
 
 # Main Chatbot Class
+ANALYSIS_MODES = ("pipeline", "fused")
+
 class EmotionalSupportChatbot:
-    def __init__(self, prompts):
+    def __init__(self, prompts, sessions=None, feedback_queue=None, analysis_mode="pipeline", cache=None,
+                 turn_budget_seconds=30.0, summarize_every=4, summary_queue=None,
+                 local_emotion_threshold=DEFAULT_CONFIDENCE_THRESHOLD, risk_screen=None, token_budgets=None):
         """Initialize the chatbot with the provided prompts."""
         self.prompts = prompts
-        self.conversation_memory = ConversationMemory()
-        self.previous_response = None
+        # Compiled (and validated) here so a broken prompt fails at startup rather than mid-conversation
+        self.prompt_templates = compile_prompt_templates(agent_system_prompts(prompts))
+        # Checked before any API call: a high-risk message goes straight to the escalation response
+        self.risk_screen = risk_screen if risk_screen is not None else default_risk_screen
+        # Unambiguous messages are classified by the local emotion lexicon when its confidence
+        # reaches local_emotion_threshold, skipping the emotion API call (None always asks the API)
+        self.emotion_classifier = (
+            LexiconEmotionClassifier(threshold=local_emotion_threshold) if local_emotion_threshold is not None else None
+        )
+        # Upper bound on the time all LLM calls of one turn may take, retries included
+        self.turn_budget_seconds = turn_budget_seconds
+        # Per-agent token budgets for the variable prompt parts (None uses DEFAULT_TOKEN_BUDGETS)
+        self.token_budgets = token_budgets
+        # Optional AgentCache for input processing and emotion detection results
+        self.cache = cache
+        if cache is not None:
+            observe_cache(cache)
+        self.set_analysis_mode(analysis_mode)
+        # Prompts and the API client are shared; conversation state is kept per session
+        self.sessions = sessions if sessions is not None else SessionRegistry(ConversationMemory)
+        observe_sessions(self.sessions)
+        # Feedback analysis is off the critical path: it runs after the reply is returned. The
+        # gateway schedules it below user-facing calls, so there are as many workers as LLM
+        # calls it may run at once
+        self.feedback_queue = feedback_queue if feedback_queue is not None else BackgroundQueue(
+            maxsize=1000, workers=_llm_gateway.max_concurrency, name="feedback"
+        )
+        # Every summarize_every turns, older messages are folded into the session summary in the
+        # background (None disables summarization)
+        self.summarize_every = summarize_every
+        # Sized like the feedback queue: one worker serves every session of the process
+        self.summary_queue = summary_queue if summary_queue is not None else BackgroundQueue(
+            maxsize=1000, workers=_llm_gateway.max_concurrency, name="summary"
+        )
+        self.default_session_id = str(uuid.uuid4())
         self.debug_mode = False
-    
+
+    def set_analysis_mode(self, mode):
+        """Choose "pipeline" (three analysis agents) or "fused" (one combined analysis call)"""
+        if mode not in ANALYSIS_MODES:
+            raise ValueError(f"Unknown analysis mode '{mode}', expected one of {', '.join(ANALYSIS_MODES)}")
+        self.analysis_mode = mode
+        self._fused_analysis_prompt = build_fused_analysis_prompt(self.prompts) if mode == "fused" else None
+
+    @property
+    def conversation_memory(self):
+        """Conversation memory of the default session (used when no session id is given)"""
+        return self.sessions.get(self.default_session_id)
+
+    def get_memory(self, session_id=None):
+        """Return the conversation memory for a session"""
+        return self.sessions.get(session_id or self.default_session_id)
+
+    def session_info(self, session_id=None):
+        """JSON-ready view of a session: retained messages and the detected user profile"""
+        memory = self.get_memory(session_id)
+        return {
+            "session_id": memory.session_id,
+            "conversation_length": len(memory.messages),
+            "messages": [{"role": msg.role, "content": msg.content} for msg in memory.messages],
+            "detected_emotions": [
+                {**emotion, "timestamp": emotion["timestamp"].isoformat()}
+                for emotion in memory.user_profile["detected_emotions"]
+            ],
+            "recurring_topics": list(memory.user_profile["recurring_topics"]),
+        }
+
+    def prompt_report(self):
+        """Per-agent token counts: the static (cacheable) system prefix and the mean per-call part"""
+        return {agent: template.stats() for agent, template in self.prompt_templates.items()}
+
     def set_debug_mode(self, enabled=True):
-        """Enable or disable debug mode to see agent outputs"""
+        """Enable or disable debug mode to see agent outputs (logged at INFO on "yaarai.chatbot")"""
         self.debug_mode = enabled
     
-    def process_message(self, user_input):
-        """Process a user message through all agents and generate a response."""
-        print("DEBUG: Available prompts keys:", self.prompts.keys())  # ✅ Check the dictionary keys
-    
+    def process_message(self, user_input, session_id=None, stream=False):
+        """Process a user message through all agents and generate a response.
+
+        With stream=True a generator is returned that yields the response text as it is
+        generated (suitable for st.write_stream).
+        """
+        if stream:
+            return self._stream_message(user_input, session_id)
+        return run_sync(self.aprocess_message(user_input, session_id))
+
+    async def aprocess_message(self, user_input, session_id=None):
+        """Async version of process_message for serving many conversations on one event loop."""
+        session_id = session_id or self.default_session_id
+        _record_turn(session_id, user_input)
+        started = time.perf_counter()
+        outcome = "error"
+        # Turns within one session run one at a time so they never interleave history updates
+        async with await self.sessions.alock(session_id):
+            try:
+                with turn_budget(self.turn_budget_seconds):
+                    response = await self._aprocess_turn(user_input, self.sessions.get(session_id))
+                outcome = "ok"
+                return response
+            finally:
+                self.sessions.touch(session_id)
+                record_turn(time.perf_counter() - started, self.analysis_mode, outcome=outcome)
+
+    async def aprocess_message_stream(self, user_input, session_id=None):
+        """Async generator version of process_message(stream=True)."""
+        session_id = session_id or self.default_session_id
+        _record_turn(session_id, user_input)
+        started = time.perf_counter()
+        time_to_first_chunk = None
+        outcome = "error"
+        async with await self.sessions.alock(session_id):
+            try:
+                async for chunk in self._aprocess_turn_stream(user_input, self.sessions.get(session_id)):
+                    if time_to_first_chunk is None:
+                        time_to_first_chunk = time.perf_counter() - started
+                    yield chunk
+                outcome = "ok"
+            finally:
+                self.sessions.touch(session_id)
+                record_turn(
+                    time.perf_counter() - started, self.analysis_mode, stream=True, outcome=outcome,
+                    time_to_first_chunk=time_to_first_chunk
+                )
+
+    def _stream_message(self, user_input, session_id):
+        stream = self.aprocess_message_stream(user_input, session_id)
+
+        async def next_chunk():
+            return await stream.__anext__()
+
+        try:
+            while True:
+                try:
+                    yield run_sync(next_chunk())
+                except StopAsyncIteration:
+                    return
+        finally:
+            run_sync(stream.aclose())
+
+    def _build_analysis_graph(self, tracer, memory, prompt_context, user_input, mode=None):
+        graph = AgentGraph()
+        if (mode or self.analysis_mode) == "fused":
+            graph.add("fused_analysis", lambda: self._arun_fused_analysis(tracer, memory, prompt_context, user_input))
+            for name in ("processed_input", "emotion_data", "context_analysis"):
+                graph.add(name, _pick_result(name), depends_on=("fused_analysis",))
+            return graph
+        # Input processing and emotion detection are independent;
+        # context analysis waits only for the results it uses
+        graph.add("processed_input", lambda: self._arun_user_input_processing(tracer, memory, prompt_context, user_input))
+        graph.add("emotion_data", lambda: self._arun_emotion_detection(tracer, memory, prompt_context, user_input))
+        graph.add(
+            "context_analysis",
+            lambda processed_input, emotion_data: self._arun_context_analysis(
+                tracer, memory, prompt_context, user_input, processed_input, emotion_data
+            ),
+            depends_on=("processed_input", "emotion_data"),
+        )
+        return graph
+
+    async def _submit_feedback(self, tracer, memory, prompt_context, user_input, previous_response, conversation_span):
+        if not previous_response:
+            return
+        parent_context = trace.set_span_in_context(conversation_span)
+        queued = await self.feedback_queue.submit(
+            lambda: self._arun_feedback_processing(tracer, memory, prompt_context, user_input, previous_response, parent_context)
+        )
+        if not queued:
+            conversation_span.add_event("feedback_dropped", {"queue_size": len(self.feedback_queue)})
+
+    async def _schedule_summary(self, tracer, memory, prompt_context, conversation_span):
+        memory.turns_since_summary += 1
+        if not self.summarize_every or memory.turns_since_summary < self.summarize_every:
+            return
+        keep_recent = prompt_context.history_count
+        pending, until = memory.messages_to_summarize(keep_recent=keep_recent)
+        if not pending:
+            return
+        # The job checks this state is still current before using pending
+        base = (memory.summary, memory.summarized_until)
+        parent_context = trace.set_span_in_context(conversation_span)
+        queued = await self.summary_queue.submit(
+            lambda: self._arun_conversation_summary(tracer, memory, pending, until, parent_context, base, keep_recent)
+        )
+        if queued:
+            memory.turns_since_summary = 0
+        else:
+            # Left counting, so the next turn tries again with everything still pending
+            conversation_span.add_event("summary_dropped", {"queue_size": len(self.summary_queue)})
+
+    def _escalate(self, memory, risk_matches, conversation_span):
+        """Answer a message flagged by the risk pre-screen without running any agent"""
+        conversation_span.add_event("high_risk_prescreen", {
+            "risk.matched_phrases": risk_matches,
+            "risk.match_count": len(risk_matches),
+        })
+        conversation_span.set_attribute("risk.escalated", True)
+        record_escalation()
+        _chatbot_logger.warning("session %s: high-risk message routed to the escalation response", memory.session_id)
+        response = self.prompts.get("escalation_response") or ESCALATION_RESPONSE
+        memory.add_message("assistant", response)
+        memory.previous_response = response
+        record_text(conversation_span, "final_response", response)
+        return response
+
+    async def _aprocess_turn(self, user_input, memory):
         tracer = trace.get_tracer("emotional_support_chatbot")
         with tracer.start_as_current_span("conversation_turn") as conversation_span:
-            conversation_span.set_attribute("user_input", user_input)
-            self.conversation_memory.add_message("user", user_input)
-            with tracer.start_as_current_span("user_input_processing") as span:
-                processed_input = process_user_input(
-                    user_input, 
-                    self.conversation_memory,
-                    self.prompts["user_input_prompt"]
-                )
-                span.set_attribute("processed_input", str(processed_input))
-                if self.debug_mode:
-                    print("\n--- USER INPUT PROCESSING RESULT ---")
-                    print(json.dumps(processed_input, indent=2))
-            with tracer.start_as_current_span("emotion_detection") as span:
-                emotion_data = detect_emotion(
-                    user_input, 
-                    self.conversation_memory,
-                    self.prompts["emotion_detection_prompt"]
-                )
-                span.set_attribute("emotion", emotion_data.get("emotion", "Unknown"))
-                span.set_attribute("intensity", emotion_data.get("intensity_level", "Unknown"))
-                if self.debug_mode:
-                    print("\n--- EMOTION DETECTION RESULT ---")
-                    print(json.dumps(emotion_data, indent=2))
-            with tracer.start_as_current_span("context_analysis") as span:
-                context_analysis = analyze_context(
+            record_text(conversation_span, "user_input", user_input)
+            conversation_span.set_attribute("session_id", memory.session_id)
+            memory.add_message("user", user_input)
+            risk_matches = self.risk_screen.screen(user_input)
+            if risk_matches:
+                return self._escalate(memory, risk_matches, conversation_span)
+            # Shared by every agent of this turn so history is rendered only once
+            prompt_context = TurnPromptContext(memory, budgets=self.token_budgets)
+            previous_response = memory.previous_response
+            graph = self._build_analysis_graph(tracer, memory, prompt_context, user_input)
+            graph.add(
+                "response",
+                lambda emotion_data, context_analysis: self._arun_response_generation(
+                    tracer, memory, prompt_context, user_input, emotion_data, context_analysis
+                ),
+                depends_on=("emotion_data", "context_analysis"),
+            )
+            results = await graph.arun()
+            response = results["response"]
+            memory.previous_response = response
+            record_text(conversation_span, "final_response", response)
+            await self._submit_feedback(tracer, memory, prompt_context, user_input, previous_response, conversation_span)
+            await self._schedule_summary(tracer, memory, prompt_context, conversation_span)
+            return response
+
+    async def _aprocess_turn_stream(self, user_input, memory):
+        tracer = trace.get_tracer("emotional_support_chatbot")
+        # The generator may resume in a different task, so spans are parented explicitly instead
+        # of being attached as the current context across yields
+        conversation_span = tracer.start_span("conversation_turn")
+        try:
+            with trace.use_span(conversation_span):
+                record_text(conversation_span, "user_input", user_input)
+                conversation_span.set_attribute("session_id", memory.session_id)
+                memory.add_message("user", user_input)
+                risk_matches = self.risk_screen.screen(user_input)
+                if not risk_matches:
+                    prompt_context = TurnPromptContext(memory, budgets=self.token_budgets)
+                    previous_response = memory.previous_response
+                    graph = self._build_analysis_graph(tracer, memory, prompt_context, user_input)
+                    # One deadline covers the analysis graph and the streamed reply
+                    deadline = (
+                        time.monotonic() + self.turn_budget_seconds if self.turn_budget_seconds is not None else None
+                    )
+                    with turn_deadline(deadline):
+                        results = await graph.arun()
+            if risk_matches:
+                yield self._escalate(memory, risk_matches, conversation_span)
+                return
+            emotion_data = results["emotion_data"]
+            span = tracer.start_span("response_generation", context=trace.set_span_in_context(conversation_span))
+            started = time.perf_counter()
+            try:
+                chunks = []
+                async for chunk in agenerate_response_stream(
                     user_input,
-                    processed_input,
                     emotion_data,
-                    self.conversation_memory,
-                    self.prompts["context_management_prompt"]
-                )
-                span.set_attribute("context_analysis", str(context_analysis))
+                    results["context_analysis"],
+                    memory,
+                    self.prompts["response_generation_prompt"],
+                    prompt_context=prompt_context,
+                    span=span,
+                    deadline=deadline
+                ):
+                    chunks.append(chunk)
+                    yield chunk
+                response = "".join(chunks)
+                record_text(span, "response", response)
+                _record_response_run(time.perf_counter() - started, response)
+            finally:
+                span.end()
+            memory.add_message("assistant", response, emotion_data)
+            memory.previous_response = response
+            record_text(conversation_span, "final_response", response)
+            await self._submit_feedback(tracer, memory, prompt_context, user_input, previous_response, conversation_span)
+            await self._schedule_summary(tracer, memory, prompt_context, conversation_span)
+        finally:
+            conversation_span.end()
+
+    async def _arun_fused_analysis(self, tracer, memory, prompt_context, user_input):
+        with tracer.start_as_current_span("fused_analysis") as span:
+            started = time.perf_counter()
+            result = await afused_analysis(user_input, memory, self._fused_analysis_prompt, prompt_context)
+            if "error" not in result:
+                record_agent_result("fused_analysis", time.perf_counter() - started, result)
+                analysis = {
+                    "processed_input": result["processed_input"],
+                    "emotion_data": result["emotion"],
+                    "context_analysis": result["context"],
+                }
+                span.set_attribute("emotion", analysis["emotion_data"].get("emotion", "Unknown"))
+                span.set_attribute("intensity", analysis["emotion_data"].get("intensity_level", "Unknown"))
+                record_agent_output(span, "processed_input", analysis["processed_input"])
+                record_agent_output(span, "emotion_data", analysis["emotion_data"])
+                record_agent_output(span, "context_analysis", analysis["context_analysis"])
                 if self.debug_mode:
-                    print("\n--- CONTEXT ANALYSIS RESULT ---")
-                    print(json.dumps(context_analysis, indent=2))
-            with tracer.start_as_current_span("response_generation") as span:
-                response = generate_response(
-                    user_input,
-                    emotion_data,
-                    context_analysis,
-                    self.conversation_memory,
-                    self.prompts["response_generation_prompt"]
-                )
-                span.set_attribute("response", response)
-            self.conversation_memory.add_message("assistant", response, emotion_data)
-            if self.previous_response:
-                with tracer.start_as_current_span("feedback_processing") as span:
-                    feedback_analysis = process_feedback(
-                        user_input,
-                        self.previous_response,
-                        self.conversation_memory,
-                        self.prompts["feedback_loop_prompt"]
-                    )
-                    span.set_attribute("feedback_analysis", str(feedback_analysis))
-                    if self.debug_mode:
-                        print("\n--- FEEDBACK ANALYSIS RESULT ---")
-                        print(json.dumps(feedback_analysis, indent=2))
-            self.previous_response = response
-            conversation_span.set_attribute("final_response", response)
-            return response
+                    _chatbot_logger.info("--- FUSED ANALYSIS RESULT ---\n%s", json.dumps(result.to_dict(), indent=2))
+                return analysis
+            # Fall back to the separate agents so a malformed fused result never reaches the reply
+            record_text(span, "fallback", result["error"])
+            record_agent_run("fused_analysis", time.perf_counter() - started, "fallback", "pipeline")
+        return await self._build_analysis_graph(tracer, memory, prompt_context, user_input, mode="pipeline").arun()
+
+    async def _arun_user_input_processing(self, tracer, memory, prompt_context, user_input):
+        with tracer.start_as_current_span("user_input_processing") as span:
+            started = time.perf_counter()
+            processed_input = await aprocess_user_input(
+                user_input, 
+                memory,
+                self.prompts["user_input_prompt"],
+                cache=self.cache,
+                prompt_context=prompt_context
+            )
+            record_agent_result("user_input_processing", time.perf_counter() - started, processed_input)
+            record_agent_output(span, "processed_input", processed_input)
+            if self.debug_mode:
+                _chatbot_logger.info("--- USER INPUT PROCESSING RESULT ---\n%s", json.dumps(processed_input.to_dict(), indent=2))
+            return processed_input
+
+    async def _arun_emotion_detection(self, tracer, memory, prompt_context, user_input):
+        with tracer.start_as_current_span("emotion_detection") as span:
+            started = time.perf_counter()
+            emotion_data = await adetect_emotion(
+                user_input, 
+                memory,
+                self.prompts["emotion_detection_prompt"],
+                cache=self.cache,
+                prompt_context=prompt_context,
+                classifier=self.emotion_classifier
+            )
+            record_agent_result(
+                "emotion_detection", time.perf_counter() - started, emotion_data, source=emotion_data.get("source", "llm")
+            )
+            span.set_attribute("emotion.source", emotion_data.get("source", "llm"))
+            span.set_attribute("emotion", emotion_data.get("emotion", "Unknown"))
+            span.set_attribute("intensity", emotion_data.get("intensity_level", "Unknown"))
+            record_agent_output(span, "emotion_data", emotion_data)
+            if self.debug_mode:
+                _chatbot_logger.info("--- EMOTION DETECTION RESULT ---\n%s", json.dumps(emotion_data.to_dict(), indent=2))
+            return emotion_data
+
+    async def _arun_context_analysis(self, tracer, memory, prompt_context, user_input, processed_input, emotion_data):
+        with tracer.start_as_current_span("context_analysis") as span:
+            started = time.perf_counter()
+            context_analysis = await aanalyze_context(
+                user_input,
+                processed_input,
+                emotion_data,
+                memory,
+                self.prompts["context_management_prompt"],
+                prompt_context=prompt_context
+            )
+            record_agent_result("context_analysis", time.perf_counter() - started, context_analysis)
+            record_agent_output(span, "context_analysis", context_analysis)
+            if self.debug_mode:
+                _chatbot_logger.info("--- CONTEXT ANALYSIS RESULT ---\n%s", json.dumps(context_analysis.to_dict(), indent=2))
+            return context_analysis
+
+    async def _arun_response_generation(self, tracer, memory, prompt_context, user_input, emotion_data, context_analysis):
+        with tracer.start_as_current_span("response_generation") as span:
+            started = time.perf_counter()
+            response = await agenerate_response(
+                user_input,
+                emotion_data,
+                context_analysis,
+                memory,
+                self.prompts["response_generation_prompt"],
+                prompt_context=prompt_context
+            )
+            record_text(span, "response", response)
+            _record_response_run(time.perf_counter() - started, response)
+        memory.add_message("assistant", response, emotion_data)
+        return response
+
+    async def _arun_feedback_processing(self, tracer, memory, prompt_context, user_input, previous_response, parent_context=None):
+        with tracer.start_as_current_span("feedback_processing", context=parent_context) as span:
+            started = time.perf_counter()
+            feedback_analysis = await aprocess_feedback(
+                user_input,
+                previous_response,
+                memory,
+                self.prompts["feedback_loop_prompt"],
+                prompt_context=prompt_context
+            )
+            record_agent_result("feedback_processing", time.perf_counter() - started, feedback_analysis)
+            record_agent_output(span, "feedback_analysis", feedback_analysis)
+            memory.add_feedback(feedback_analysis)
+            self.sessions.save(memory)
+            if self.debug_mode:
+                _chatbot_logger.info("--- FEEDBACK ANALYSIS RESULT ---\n%s", json.dumps(feedback_analysis.to_dict(), indent=2))
+            return feedback_analysis
 
+    async def _arun_conversation_summary(self, tracer, memory, pending, until, parent_context=None, base=None,
+                                         keep_recent=5):
+        with tracer.start_as_current_span("conversation_summary", context=parent_context) as span:
+            previous_summary = memory.summary
+            if base is not None and base != (previous_summary, memory.summarized_until):
+                # Another summary landed while this job was queued: pending may already be
+                # covered, so fold in only what is still outstanding
+                pending, until = memory.messages_to_summarize(keep_recent=keep_recent)
+                span.set_attribute("summary.recomputed", True)
+                if not pending:
+                    span.set_attribute("summary.applied", False)
+                    return None
+            span.set_attribute("summary.messages_folded", len(pending))
+            summarized_until = memory.summarized_until
+            started = time.perf_counter()
+            summary = await asummarize_conversation(
+                previous_summary,
+                pending,
+                self.prompts.get("conversation_summary_prompt", CONVERSATION_SUMMARY_PROMPT),
+                self.token_budgets
+            )
+            record_agent_result("conversation_summary", time.perf_counter() - started, summary)
+            # Skip the update if another summary landed meanwhile or the call failed
+            if summary is None or memory.summary is not previous_summary or memory.summarized_until != summarized_until:
+                span.set_attribute("summary.applied", False)
+                return None
+            memory.apply_summary(summary, until)
+            self.sessions.save(memory)
+            span.set_attribute("summary.applied", True)
+            record_text(span, "summary", summary)
+            if self.debug_mode:
+                _chatbot_logger.info("--- CONVERSATION SUMMARY ---\n%s", summary)
+            return summary
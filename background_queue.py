@@ -0,0 +1,129 @@
+import asyncio
+import contextvars
+import weakref
+
+from agent_metrics import record_background_job
+from log_config import get_logger
+
+_logger = get_logger("background")
+
+# Started queues, so they can all be closed before the event loop stops
+_started_queues = weakref.WeakSet()
+
+
+# Background Work Queue
+class BackgroundQueue:
+    """Bounded asyncio work queue drained by a fixed number of worker tasks.
+
+    Jobs are zero-argument callables returning a coroutine. When the queue is full, submit()
+    waits up to put_timeout for space (backpressure) and then drops the job rather than
+    holding up the caller. Dropped jobs are logged and counted (stats() and the
+    yaarai.background.jobs metric), so lost work is visible.
+    """
+    def __init__(self, maxsize=100, workers=2, put_timeout=0.05, name="background"):
+        self.maxsize = maxsize
+        self.workers = workers
+        self.put_timeout = put_timeout
+        self.name = name
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.closed = False
+        self._queue = None
+        self._loop = None
+        self._tasks = []
+
+    def __len__(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, job):
+        """Queue a job; returns False if it was dropped because the queue stayed full or is closed"""
+        if self.closed:
+            return False
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self._queue.put(job), self.put_timeout)
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                record_background_job(self.name, "dropped")
+                _logger.warning(
+                    "%s queue full (%d jobs); dropped a job, %d dropped so far", self.name, self.maxsize, self.dropped
+                )
+                return False
+        self.submitted += 1
+        return True
+
+    def stats(self):
+        """Job counters and current backlog"""
+        return {
+            "workers": self.workers,
+            "queued": len(self),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+    async def join(self):
+        """Wait until every queued job has finished"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def close(self, drain_timeout=0.0):
+        """Stop accepting jobs, give queued ones up to drain_timeout seconds to finish, then
+        cancel the workers (and the jobs they are running) and wait for them to exit"""
+        self.closed = True
+        if not self._tasks or self._loop is not asyncio.get_running_loop():
+            return
+        if drain_timeout:
+            try:
+                await asyncio.wait_for(self._queue.join(), drain_timeout)
+            except asyncio.TimeoutError:
+                pass
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._queue.qsize():
+            _logger.info("%s queue closed with %d jobs not run", self.name, self._queue.qsize())
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        # Queues and worker tasks belong to one event loop; (re)create them on first use there
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        _started_queues.add(self)
+        # Workers start from an empty context so they don't inherit per-turn state (spans,
+        # latency budgets) from whichever request happened to submit the first job
+        self._tasks = [
+            loop.create_task(self._worker(), name=f"{self.name}-worker-{index}", context=contextvars.Context())
+            for index in range(self.workers)
+        ]
+
+    async def _worker(self):
+        queue = self._queue
+        while True:
+            job = await queue.get()
+            try:
+                await job()
+                self.completed += 1
+                record_background_job(self.name, "completed")
+            except Exception as e:
+                self.failed += 1
+                record_background_job(self.name, "failed")
+                _logger.error("%s worker job failed: %s", self.name, e)
+            finally:
+                queue.task_done()
+
+
+async def close_all(drain_timeout=0.0):
+    """Close every queue started on the running event loop (see BackgroundQueue.close)"""
+    loop = asyncio.get_running_loop()
+    queues = [queue for queue in list(_started_queues) if queue._loop is loop]
+    await asyncio.gather(*(queue.close(drain_timeout) for queue in queues))
@@ -0,0 +1,390 @@
+"""Offline benchmark of the chatbot pipeline.
+
+Swaps the module-level OpenAI client for FakeAsyncOpenAI, which answers every agent with
+canned JSON after a simulated latency, then drives many concurrent synthetic conversations
+and reports turn latency percentiles, throughput, per-agent time and memory per session.
+With --replay, the conversations of a CallRecorder recording are rerun instead, answered
+from the recording with their recorded latencies.
+
+    python benchmark.py --conversations 200 --turns 6 --latency-ms 300 --error-rate 0.02
+    python benchmark.py --replay recorded_calls.jsonl
+    python benchmark.py --metrics > metrics.prom
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+import tracemalloc
+import types
+from collections import defaultdict
+
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor, SpanExporter, SpanExportResult
+
+import agentic_framework
+from agent_metrics import init_metrics
+from agent_prompts import prompts
+from agentic_framework import ConversationMemory, EmotionalSupportChatbot, agent_system_prompts
+from call_recorder import CallRecorder
+from llm_gateway import LLMGateway
+from log_config import configure_logging
+from prompt_templates import agent_template
+from session_store import SessionRegistry
+
+# Spans whose durations are reported per agent
+AGENT_SPANS = (
+    "user_input_processing",
+    "emotion_detection",
+    "context_analysis",
+    "fused_analysis",
+    "response_generation",
+    "feedback_processing",
+    "conversation_summary",
+)
+
+SAMPLE_MESSAGES = [
+    "I had a really rough day at work, my manager yelled at me in front of everyone",
+    "Honestly I'm fine, totally fine, everything is just great",
+    "My exams are next week and I can't focus on anything",
+    "I miss my family, I haven't been home in two years",
+    "I finally got the internship I applied for!",
+    "I don't know, I just feel kind of empty lately",
+    "My best friend stopped replying to my messages",
+    "Can't sleep again. It's 3am and my mind won't stop",
+]
+
+CANNED_RESPONSES = {
+    "user_input_processing": {
+        "processed_text": "user shares a difficult experience",
+        "main_intent": "venting",
+        "main_topic": "work",
+        "keywords": ["work", "stress"],
+    },
+    "emotion_detection": {
+        "emotion": "Sadness",
+        "intensity_level": "Moderate",
+        "intensity_score": 3,
+        "sarcasm_detected": "No",
+    },
+    "context_analysis": {
+        "response_guidance": {"focus_areas": ["work"], "approach_suggestion": "Gentle", "avoid_topics": []},
+        "cultural_context": {"cultural_elements_detected": None},
+    },
+    "response_generation": {"final_response": "That sounds really hard. I'm here with you, want to tell me more?"},
+    "feedback_processing": {"feedback_score": 4, "improvement_suggestions": []},
+}
+CANNED_RESPONSES["fused_analysis"] = {
+    "processed_input": CANNED_RESPONSES["user_input_processing"],
+    "emotion": CANNED_RESPONSES["emotion_detection"],
+    "context": CANNED_RESPONSES["context_analysis"],
+}
+CANNED_SUMMARY = "The user has been stressed about work and is looking for someone to listen."
+
+
+# Fake OpenAI Client
+class FakeAsyncOpenAI:
+    """Stand-in for openai.AsyncOpenAI that answers chat completions with canned agent output.
+
+    Latency is log-normal around latency_ms (spread set by latency_sigma). error_rate is the
+    share of calls that time out (a retryable error) and malformed_rate the share that
+    return text that isn't JSON.
+    """
+    def __init__(self, agent_prompts, latency_ms=300.0, latency_sigma=0.35, error_rate=0.0,
+                 malformed_rate=0.0, tokens_per_chunk=4, seed=None):
+        # System prompt text -> agent name, used to pick the canned reply
+        self.agent_prompts = agent_prompts
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.tokens_per_chunk = tokens_per_chunk
+        self.rng = random.Random(seed)
+        self.calls = defaultdict(int)
+        self.errors = 0
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self._create))
+
+    async def _create(self, model, messages, stream=False, **params):
+        agent = self.agent_prompts.get(messages[0]["content"], "unknown")
+        self.calls[agent] += 1
+        await asyncio.sleep(self._latency())
+        if self.rng.random() < self.error_rate:
+            self.errors += 1
+            raise asyncio.TimeoutError(f"simulated timeout for {agent}")
+        content = self._content(agent)
+        usage = types.SimpleNamespace(
+            prompt_tokens=sum(len(message["content"]) for message in messages) // 4,
+            completion_tokens=len(content) // 4,
+            total_tokens=0,
+        )
+        usage.total_tokens = usage.prompt_tokens + usage.completion_tokens
+        if stream:
+            return self._stream(content, model, usage)
+        message = types.SimpleNamespace(content=content)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=usage, model=model)
+
+    def _latency(self):
+        if self.latency_ms <= 0:
+            return 0.0
+        return self.rng.lognormvariate(0.0, self.latency_sigma) * self.latency_ms / 1000
+
+    def _content(self, agent):
+        if self.rng.random() < self.malformed_rate:
+            return "Sorry, I can't answer in JSON right now."
+        if agent == "conversation_summary":
+            return CANNED_SUMMARY
+        return json.dumps(CANNED_RESPONSES.get(agent, {}))
+
+    async def _stream(self, content, model, usage):
+        step = self.tokens_per_chunk * 4
+        for start in range(0, len(content), step):
+            # Tokens arrive spread over a small fraction of the call latency
+            await asyncio.sleep(self._latency() / 50)
+            delta = types.SimpleNamespace(content=content[start:start + step])
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)], usage=None, model=model)
+        yield types.SimpleNamespace(choices=[], usage=usage, model=model)
+
+
+def agent_prompt_map(chatbot_prompts):
+    """System message text -> agent name for the prompts the chatbot sends"""
+    return {
+        agent_template(agent, system_prompt).system: agent
+        for agent, system_prompt in agent_system_prompts(chatbot_prompts).items()
+    }
+
+
+# Span Collection
+class AgentTimingExporter(SpanExporter):
+    """Keeps the duration of every agent span instead of exporting it"""
+    def __init__(self):
+        self.durations = defaultdict(list)
+
+    def export(self, spans):
+        for span in spans:
+            if span.name in AGENT_SPANS:
+                self.durations[span.name].append((span.end_time - span.start_time) / 1e9)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+# Benchmark Run
+async def run_conversation(chatbot, session_id, messages, stream, latencies, failures):
+    for message in messages:
+        started = time.perf_counter()
+        try:
+            if stream:
+                async for _chunk in chatbot.aprocess_message_stream(message, session_id):
+                    pass
+            else:
+                await chatbot.aprocess_message(message, session_id)
+        except Exception:
+            failures.append(session_id)
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+async def run_benchmark(args, exporter):
+    fake_client = FakeAsyncOpenAI(
+        agent_prompt_map(prompts),
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        malformed_rate=args.malformed_rate,
+        seed=args.seed,
+    )
+    agentic_framework.async_client = fake_client
+    gateway = LLMGateway(
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        max_concurrency=args.concurrency,
+    )
+    agentic_framework.set_llm_gateway(gateway)
+    recorder = None
+    if args.replay:
+        # Rerun recorded conversations with their recorded LLM answers and timings
+        recorder = CallRecorder(args.replay, mode="replay", simulate_latency=True)
+        agentic_framework.set_call_recorder(recorder)
+        conversations = defaultdict(list)
+        for session_id, user_input in recorder.turns():
+            conversations[session_id].append(user_input)
+    else:
+        rng = random.Random(args.seed)
+        conversations = {}
+        for index in range(args.conversations):
+            conversation_rng = random.Random(rng.random())
+            conversations[f"bench-{index}"] = [conversation_rng.choice(SAMPLE_MESSAGES) for _ in range(args.turns)]
+    sessions = SessionRegistry(ConversationMemory, max_sessions=max(1000, len(conversations)))
+    chatbot = EmotionalSupportChatbot(prompts, sessions=sessions, analysis_mode=args.mode)
+    latencies = []
+    failures = []
+    if args.tracemalloc:
+        tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0] if args.tracemalloc else 0
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        run_conversation(chatbot, session_id, messages, args.stream, latencies, failures)
+        for session_id, messages in conversations.items()
+    ])
+    elapsed = time.perf_counter() - started
+    # Let background feedback and summary jobs finish so their spans are counted
+    await chatbot.feedback_queue.join()
+    await chatbot.summary_queue.join()
+    traced = tracemalloc.get_traced_memory()[0] - baseline if args.tracemalloc else None
+    if args.tracemalloc:
+        tracemalloc.stop()
+    if recorder is not None:
+        agentic_framework.set_call_recorder(None)
+        recorder.close()
+    return {
+        "config": vars(args),
+        "turns": len(latencies),
+        "failed_turns": len(failures),
+        "elapsed_seconds": elapsed,
+        "latencies": sorted(latencies),
+        "agent_durations": {name: sorted(values) for name, values in exporter.durations.items()},
+        "llm_calls": dict(fake_client.calls),
+        "replayed_calls": recorder.replayed if recorder is not None else None,
+        "replay_misses": recorder.misses if recorder is not None else None,
+        "injected_errors": fake_client.errors,
+        "gateway": gateway.stats(),
+        "background": {"feedback": chatbot.feedback_queue.stats(), "summary": chatbot.summary_queue.stats()},
+        "prompt_tokens": {agent: stats for agent, stats in chatbot.prompt_report().items() if stats["calls"]},
+        "sessions": len(sessions),
+        "estimated_bytes_per_session": sessions.memory_usage / max(1, len(sessions)),
+        "traced_bytes_per_session": traced / max(1, len(sessions)) if traced is not None else None,
+    }
+
+
+def summarize(result):
+    """Flat, JSON-ready numbers for one run"""
+    latencies = result["latencies"]
+    summary = {
+        "turns": result["turns"],
+        "failed_turns": result["failed_turns"],
+        "throughput_turns_per_second": result["turns"] / result["elapsed_seconds"] if result["elapsed_seconds"] else 0.0,
+        "turn_latency_ms": {
+            "p50": percentile(latencies, 0.50) * 1000,
+            "p95": percentile(latencies, 0.95) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "mean": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        },
+        "agents": {
+            name: {
+                "count": len(values),
+                "mean_ms": statistics.fmean(values) * 1000,
+                "p95_ms": percentile(values, 0.95) * 1000,
+                "total_s": sum(values),
+            }
+            for name, values in sorted(result["agent_durations"].items())
+        },
+        "llm_calls": result["llm_calls"],
+        "injected_errors": result["injected_errors"],
+        "gateway": result["gateway"],
+        "background": result["background"],
+        "prompt_tokens": result["prompt_tokens"],
+        "replayed_calls": result["replayed_calls"],
+        "replay_misses": result["replay_misses"],
+        "sessions": result["sessions"],
+        "estimated_bytes_per_session": result["estimated_bytes_per_session"],
+        "traced_bytes_per_session": result["traced_bytes_per_session"],
+    }
+    return summary
+
+
+def format_report(summary, config):
+    if config["replay"]:
+        header = [
+            f"YaarAI pipeline benchmark: replaying {config['replay']}, mode={config['mode']}, stream={config['stream']}",
+            f"replayed calls {summary['replayed_calls']} ({summary['replay_misses']} not in the recording)",
+        ]
+    else:
+        header = [
+            f"YaarAI pipeline benchmark: {config['conversations']} conversations x {config['turns']} turns, "
+            f"mode={config['mode']}, stream={config['stream']}",
+            f"fake latency {config['latency_ms']:.0f}ms (sigma {config['latency_sigma']}), "
+            f"error rate {config['error_rate']:.1%}, malformed rate {config['malformed_rate']:.1%}",
+        ]
+    lines = header + [
+        "",
+        f"turns completed     {summary['turns']} ({summary['failed_turns']} failed)",
+        f"throughput          {summary['throughput_turns_per_second']:.1f} turns/s",
+        "turn latency (ms)   p50 {p50:.1f}   p95 {p95:.1f}   p99 {p99:.1f}   mean {mean:.1f}".format(**summary["turn_latency_ms"]),
+        "",
+        f"{'agent':<24}{'spans':>8}{'mean ms':>10}{'p95 ms':>10}{'total s':>10}",
+    ]
+    for name, stats in summary["agents"].items():
+        lines.append(f"{name:<24}{stats['count']:>8}{stats['mean_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['total_s']:>10.2f}")
+    lines += [
+        "",
+        f"llm calls           {sum(summary['llm_calls'].values())} ({summary['injected_errors']} injected errors)",
+        "gateway             {admitted} admitted, {coalesced} coalesced, {rate_limited} rate limited, {queue_timeouts} queue timeouts".format(**summary["gateway"]),
+        *(
+            f"{name + ' jobs':<20}{stats['completed']} completed, {stats['failed']} failed, {stats['dropped']} dropped"
+            for name, stats in summary["background"].items()
+        ),
+        f"memory per session  {summary['estimated_bytes_per_session'] / 1024:.1f} KiB estimated",
+    ]
+    if summary["traced_bytes_per_session"] is not None:
+        lines[-1] += f", {summary['traced_bytes_per_session'] / 1024:.1f} KiB traced"
+    lines += ["", f"{'prompt tokens':<24}{'static':>8}{'dynamic':>10}{'static %':>10}"]
+    for name, stats in sorted(summary["prompt_tokens"].items()):
+        lines.append(
+            f"{name:<24}{stats['static_tokens']:>8}{stats['mean_dynamic_tokens']:>10.0f}{stats['static_share']:>10.0%}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the chatbot pipeline against a fake OpenAI client")
+    parser.add_argument("--conversations", type=int, default=100, help="concurrent synthetic conversations")
+    parser.add_argument("--turns", type=int, default=5, help="turns per conversation")
+    parser.add_argument("--mode", choices=agentic_framework.ANALYSIS_MODES, default="pipeline")
+    parser.add_argument("--stream", action="store_true", help="use the streaming response path")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="median simulated LLM latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.35, help="log-normal spread of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of LLM calls that time out")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="share of LLM calls returning non-JSON")
+    parser.add_argument("--rpm", type=float, default=1_000_000, help="gateway requests-per-minute limit")
+    parser.add_argument("--tpm", type=float, default=1_000_000_000, help="gateway tokens-per-minute limit")
+    parser.add_argument("--concurrency", type=int, default=256, help="gateway limit on concurrent LLM calls")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--replay", help="rerun the conversations of a CallRecorder recording instead of synthetic ones")
+    parser.add_argument("--tracemalloc", action="store_true", help="also measure allocated bytes per session (slower)")
+    parser.add_argument("--json", dest="json_path", help="write the summary as JSON to this file")
+    parser.add_argument("--log-level", default="CRITICAL", help="level of the chatbot's own logs during the run")
+    parser.add_argument("--metrics", action="store_true", help="also print the run's metrics in the Prometheus text format")
+    args = parser.parse_args(argv)
+    configure_logging(args.log_level)
+    metrics = init_metrics("prometheus") if args.metrics else None
+
+    exporter = AgentTimingExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+    result = asyncio.run(run_benchmark(args, exporter))
+    summary = summarize(result)
+    print(format_report(summary, result["config"]))
+    if metrics is not None:
+        print()
+        print(metrics.render(), end="")
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"config": result["config"], **summary}, f, indent=2)
+    return summary
+
+
+if __name__ == "__main__":
+    main()
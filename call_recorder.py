@@ -0,0 +1,224 @@
+import asyncio
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+import types
+
+from log_config import get_logger
+
+_logger = get_logger("call_recorder")
+
+RECORDER_MODES = ("record", "replay")
+# Transport options that don't change what the model is asked, so they stay out of the key
+# (a call recorded while streaming can be replayed without streaming and the other way round)
+_UNKEYED_PARAMS = ("stream", "stream_options")
+
+
+class ReplayMissError(KeyError):
+    """Raised in replay mode for a request that was never recorded"""
+
+
+def request_key(agent, params):
+    """Stable hash of an agent call: the agent name plus every parameter sent to the API"""
+    keyed = {name: value for name, value in params.items() if name not in _UNKEYED_PARAMS}
+    payload = json.dumps([agent, keyed], sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _usage_dict(usage):
+    if usage is None:
+        return None
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+        "total_tokens": getattr(usage, "total_tokens", None),
+    }
+
+
+# Call Recorder
+class CallRecorder:
+    """Records agent LLM calls to a JSON-lines file, or replays them from one.
+
+    Each call line holds its request key, agent, parameters, raw response content, model,
+    token usage and timing; turn lines hold the user messages that started each turn. An index of request key -> byte offsets is kept next to
+    the file (path + ".idx"), so replay seeks straight to a recorded line instead of scanning
+    the whole recording. A request recorded several times is replayed in recorded order,
+    repeating the last recording once they are used up. With simulate_latency=True replayed
+    calls take as long as the recorded ones did.
+    """
+    def __init__(self, path, mode="replay", simulate_latency=False):
+        if mode not in RECORDER_MODES:
+            raise ValueError(f"Unknown recorder mode '{mode}', expected one of {', '.join(RECORDER_MODES)}")
+        self.path = path
+        self.mode = mode
+        self.simulate_latency = simulate_latency
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index = {}
+        self._served = {}
+        self._file = None
+        if mode == "record":
+            # Recording into an existing file appends to it
+            if os.path.exists(path) and os.path.getsize(path):
+                self._index = self._load_index()
+            self._file = open(path, "ab")
+        else:
+            self._index = self._load_index()
+            self._file = open(path, "rb")
+        atexit.register(self.close)
+
+    @property
+    def replaying(self):
+        return self.mode == "replay"
+
+    def __len__(self):
+        return sum(len(offsets) for offsets in self._index.values())
+
+    def record(self, agent, params, content, model=None, usage=None, latency=None, time_to_first_token=None):
+        """Append one completed call to the recording"""
+        entry = {
+            "type": "call",
+            "key": request_key(agent, params),
+            "agent": agent,
+            "params": params,
+            "content": content,
+            "model": model,
+            "usage": _usage_dict(usage),
+            "latency": latency,
+            "time_to_first_token": time_to_first_token,
+            "stream": bool(params.get("stream")),
+            "recorded_at": time.time(),
+        }
+        offset = self._append(entry)
+        with self._lock:
+            self._index.setdefault(entry["key"], []).append(offset)
+            self.recorded += 1
+
+    def record_turn(self, session_id, user_input):
+        """Append the user message that starts a turn, so whole conversations can be rerun"""
+        self._append({"type": "turn", "session_id": session_id, "user_input": user_input, "recorded_at": time.time()})
+
+    def turns(self):
+        """(session_id, user_input) for every recorded turn, in recorded order"""
+        with open(self.path, "rb") as f:
+            for line in f:
+                if b'"type":"turn"' in line:
+                    entry = json.loads(line)
+                    yield entry["session_id"], entry["user_input"]
+
+    def record_response(self, agent, params, response, latency):
+        """Record a non-streaming chat completion response"""
+        self.record(
+            agent, params, response.choices[0].message.content,
+            model=getattr(response, "model", None), usage=getattr(response, "usage", None), latency=latency
+        )
+
+    async def record_stream(self, agent, params, stream, started):
+        """Pass a streaming response through unchanged, recording it once it is complete"""
+        parts = []
+        model = None
+        usage = None
+        first_token = None
+        async for chunk in stream:
+            usage = getattr(chunk, "usage", None) or usage
+            model = getattr(chunk, "model", None) or model
+            if chunk.choices and chunk.choices[0].delta.content:
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                parts.append(chunk.choices[0].delta.content)
+            yield chunk
+        self.record(agent, params, "".join(parts), model, usage, time.perf_counter() - started, first_token)
+
+    def lookup(self, agent, params):
+        """The recorded entry for a request, or None"""
+        key = request_key(agent, params)
+        with self._lock:
+            offsets = self._index.get(key)
+            if not offsets:
+                return None
+            served = self._served.get(key, 0)
+            self._served[key] = served + 1
+            self._file.seek(offsets[min(served, len(offsets) - 1)])
+            return json.loads(self._file.readline())
+
+    async def replay(self, agent, params):
+        """A chat completion response (or stream, when params ask for one) rebuilt from the recording"""
+        entry = self.lookup(agent, params)
+        if entry is None:
+            self.misses += 1
+            raise ReplayMissError(f"{agent}: no recorded call for request {request_key(agent, params)[:12]}")
+        self.replayed += 1
+        usage = types.SimpleNamespace(**entry["usage"]) if entry["usage"] else None
+        if params.get("stream"):
+            return self._replay_stream(entry, usage)
+        if self.simulate_latency and entry["latency"]:
+            await asyncio.sleep(entry["latency"])
+        message = types.SimpleNamespace(content=entry["content"])
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=usage, model=entry["model"])
+
+    async def _replay_stream(self, entry, usage):
+        content = entry["content"] or ""
+        if self.simulate_latency and entry["latency"]:
+            await asyncio.sleep(entry["time_to_first_token"] or entry["latency"])
+        # Replayed as a single content chunk followed by the usage chunk
+        delta = types.SimpleNamespace(content=content)
+        yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)], usage=None, model=entry["model"])
+        yield types.SimpleNamespace(choices=[], usage=usage, model=entry["model"])
+
+    def reset(self):
+        """Replay every request from its first recording again"""
+        with self._lock:
+            self._served.clear()
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.close()
+            self._file = None
+            if self.mode == "record":
+                self._save_index()
+
+    def _append(self, entry):
+        line = json.dumps(entry, separators=(",", ":"), ensure_ascii=False, default=str).encode() + b"\n"
+        with self._lock:
+            offset = self._file.seek(0, os.SEEK_END)
+            self._file.write(line)
+            self._file.flush()
+        return offset
+
+    def _index_path(self):
+        return self.path + ".idx"
+
+    def _save_index(self):
+        with open(self._index_path(), "w") as f:
+            json.dump({"size": os.path.getsize(self.path), "offsets": self._index}, f, separators=(",", ":"))
+
+    def _load_index(self):
+        size = os.path.getsize(self.path)
+        try:
+            with open(self._index_path()) as f:
+                saved = json.load(f)
+            if saved.get("size") == size:
+                return saved["offsets"]
+        except (OSError, ValueError):
+            pass
+        # Missing or stale index (the recording grew since): rebuild it with one pass
+        _logger.info("indexing recording %s", self.path)
+        index = {}
+        with open(self.path, "rb") as f:
+            offset = 0
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    if entry.get("type") == "call":
+                        index.setdefault(entry["key"], []).append(offset)
+                offset += len(line)
+        self._index = index
+        self._save_index()
+        return index
@@ -0,0 +1,52 @@
+import json
+import urllib.parse
+import urllib.request
+
+
+# API Server Client
+class ChatbotClient:
+    """Talks to the API server (server.py) with the same calls the UI makes on a local chatbot"""
+    def __init__(self, base_url, timeout=60.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def process_message(self, user_input, session_id, stream=False):
+        """The reply text, or with stream=True a generator of reply chunks"""
+        if stream:
+            return self._stream_message(user_input, session_id)
+        return self._post(session_id, {"message": user_input})["response"]
+
+    def session_info(self, session_id):
+        with urllib.request.urlopen(self._session_url(session_id), timeout=self.timeout) as response:
+            return json.load(response)
+
+    def set_debug_mode(self, enabled=True):
+        """Agent debug output is configured on the server (YAARAI_LOG_LEVEL)"""
+
+    def _stream_message(self, user_input, session_id):
+        request = self._request(session_id, {"message": user_input, "stream": True})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            # One JSON event per line: {"type": "chunk", "text": ...} ... {"type": "done", ...}
+            for line in response:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if event["type"] == "chunk":
+                    yield event["text"]
+                elif event["type"] == "error":
+                    raise RuntimeError(event["error"])
+
+    def _post(self, session_id, body):
+        with urllib.request.urlopen(self._request(session_id, body), timeout=self.timeout) as response:
+            return json.load(response)
+
+    def _request(self, session_id, body):
+        return urllib.request.Request(
+            self._session_url(session_id) + "/messages",
+            data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+
+    def _session_url(self, session_id):
+        return f"{self.base_url}/v1/sessions/{urllib.parse.quote(session_id, safe='')}"
@@ -0,0 +1,92 @@
+import os
+
+from agent_cache import AgentCache
+from agent_prompts import prompts
+from agentic_framework import (
+    ConversationMemory, EmotionalSupportChatbot, init_telemetry, set_call_recorder, set_llm_gateway
+)
+from background_queue import BackgroundQueue
+from llm_gateway import LLMGateway
+from log_config import configure_logging
+from session_store import SessionRegistry
+
+
+def create_chatbot_from_env(worker_index=0, worker_count=1):
+    """Build a chatbot configured from YAARAI_* environment variables.
+
+    YAARAI_LOG_LEVEL        log level of the "yaarai" loggers (default INFO)
+    YAARAI_ANALYSIS_MODE    "pipeline" (default) or "fused" to run input, emotion and context
+                            analysis as one call
+    YAARAI_CACHE_PATH       keeps cached agent results in SQLite across restarts
+    YAARAI_CACHE_MAX_ROWS   rows kept in the SQLite cache (default 100000)
+    YAARAI_SESSION_DB       persists conversations so they survive restarts and can move
+                            between workers
+    YAARAI_RECORD_PATH      records every agent LLM call to this JSON-lines file
+    YAARAI_REPLAY_PATH      answers agent LLM calls from a recording instead of the API
+    YAARAI_LLM_RPM          requests per minute allowed by the OpenAI account (default 3500)
+    YAARAI_LLM_TPM          tokens per minute allowed by the OpenAI account (default 90000);
+                            both are account-wide, so each of worker_count processes gets an
+                            equal share
+    YAARAI_LLM_CONCURRENCY  maximum concurrent LLM calls per process (default 64)
+    YAARAI_FEEDBACK_WORKERS concurrent feedback analyses (default: YAARAI_LLM_CONCURRENCY)
+    YAARAI_FEEDBACK_QUEUE   feedback jobs waiting before new ones are dropped (default 1000)
+    YAARAI_SUMMARY_WORKERS  concurrent conversation summaries (default: YAARAI_LLM_CONCURRENCY)
+    YAARAI_SUMMARY_QUEUE    summary jobs waiting before new ones are dropped (default 1000)
+    YAARAI_TRACES_ENDPOINT  exports traces to this OTLP/HTTP endpoint (e.g. Phoenix)
+    YAARAI_TELEMETRY_MODE   "batch" (default) or "simple" span export
+    YAARAI_METRICS          "prometheus" serves latency, token and fallback metrics on
+                            /metrics, "console" prints them periodically
+    YAARAI_METRICS_PORT     port of the /metrics endpoint (default 9464); server worker n
+                            (worker_index) uses the port plus n
+
+    Optional subsystems are imported only when their variable is set, to keep cold starts fast.
+    """
+    configure_logging(os.environ.get("YAARAI_LOG_LEVEL", "INFO"))
+    if os.environ.get("YAARAI_TRACES_ENDPOINT"):
+        init_telemetry(os.environ["YAARAI_TRACES_ENDPOINT"], mode=os.environ.get("YAARAI_TELEMETRY_MODE", "batch"))
+    if os.environ.get("YAARAI_METRICS"):
+        from agent_metrics import init_metrics
+        port = int(os.environ.get("YAARAI_METRICS_PORT", 9464)) + worker_index
+        init_metrics(os.environ["YAARAI_METRICS"], port=port)
+    if os.environ.get("YAARAI_REPLAY_PATH") or os.environ.get("YAARAI_RECORD_PATH"):
+        from call_recorder import CallRecorder
+        if os.environ.get("YAARAI_REPLAY_PATH"):
+            set_call_recorder(CallRecorder(os.environ["YAARAI_REPLAY_PATH"], mode="replay"))
+        else:
+            set_call_recorder(CallRecorder(os.environ["YAARAI_RECORD_PATH"], mode="record"))
+    concurrency = int(os.environ.get("YAARAI_LLM_CONCURRENCY", 64))
+    set_llm_gateway(LLMGateway(
+        requests_per_minute=float(os.environ.get("YAARAI_LLM_RPM", 3500)) / worker_count,
+        tokens_per_minute=float(os.environ.get("YAARAI_LLM_TPM", 90000)) / worker_count,
+        max_concurrency=concurrency
+    ))
+    feedback_queue = BackgroundQueue(
+        maxsize=int(os.environ.get("YAARAI_FEEDBACK_QUEUE", 1000)),
+        workers=int(os.environ.get("YAARAI_FEEDBACK_WORKERS", concurrency)),
+        name="feedback"
+    )
+    summary_queue = BackgroundQueue(
+        maxsize=int(os.environ.get("YAARAI_SUMMARY_QUEUE", 1000)),
+        workers=int(os.environ.get("YAARAI_SUMMARY_WORKERS", concurrency)),
+        name="summary"
+    )
+    cache_path = os.environ.get("YAARAI_CACHE_PATH")
+    backend = None
+    if cache_path:
+        from agent_cache import SQLiteCacheBackend
+        backend = SQLiteCacheBackend(cache_path, max_rows=int(os.environ.get("YAARAI_CACHE_MAX_ROWS", 100_000)))
+    cache = AgentCache(backend=backend)
+    session_db = os.environ.get("YAARAI_SESSION_DB")
+    sessions = None
+    if session_db:
+        from session_persistence import SQLiteSessionBackend, WriteBehindSessionStore
+        store = WriteBehindSessionStore(SQLiteSessionBackend(session_db), ConversationMemory.from_dict)
+        sessions = SessionRegistry(ConversationMemory, store=store)
+    return EmotionalSupportChatbot(
+        prompts,
+        sessions=sessions,
+        feedback_queue=feedback_queue,
+        analysis_mode=os.environ.get("YAARAI_ANALYSIS_MODE", "pipeline"),
+        cache=cache,
+        summary_queue=summary_queue
+    )
@@ -0,0 +1,121 @@
+import re
+
+# Keyword weights per category, seeded from the examples in the emotion detection prompt.
+# Phrases are matched as a whole; single words on word boundaries.
+EMOTION_LEXICON = {
+    "Happiness": {
+        "happy": 2.0, "excited": 2.0, "great": 1.0, "glad": 2.0, "joy": 2.0, "joyful": 2.0,
+        "thrilled": 2.5, "delighted": 2.5, "grateful": 2.0, "thankful": 1.5, "proud": 1.5,
+        "amazing": 1.0, "awesome": 1.0, "wonderful": 1.5, "relieved": 1.5, "yay": 2.0,
+        "love it": 1.5, "can't wait": 1.5, "over the moon": 3.0, "so good": 1.5,
+    },
+    "Sadness": {
+        "sad": 2.0, "down": 1.0, "alone": 2.0, "lonely": 2.5, "depressed": 2.5, "unhappy": 2.0,
+        "miserable": 2.5, "heartbroken": 3.0, "hopeless": 2.5, "empty": 1.5, "crying": 2.0,
+        "cried": 2.0, "grief": 2.5, "grieving": 2.5, "miss": 1.0, "hurt": 1.5, "lost": 1.0,
+        "feel low": 2.0, "feeling low": 2.0, "broke up": 1.5, "passed away": 2.5,
+    },
+    "Fear/Anxiety": {
+        "worried": 2.0, "anxious": 2.5, "nervous": 2.0, "scared": 2.5, "afraid": 2.5,
+        "fear": 2.0, "panic": 2.5, "panicking": 2.5, "stressed": 2.0, "stress": 1.5,
+        "overwhelmed": 2.0, "terrified": 3.0, "worry": 2.0, "worrying": 2.0, "tense": 1.5,
+        "can't sleep": 1.5, "freaking out": 2.5, "what if": 1.0,
+    },
+    "Anger/Frustration": {
+        "angry": 2.5, "frustrated": 2.5, "upset": 1.5, "annoyed": 2.0, "furious": 3.0,
+        "mad": 2.0, "irritated": 2.0, "hate": 2.0, "pissed": 2.5, "fed up": 2.5, "rage": 3.0,
+        "unfair": 1.5, "sick of": 2.0, "tired of": 1.5, "so done": 2.0, "yelled": 1.5,
+    },
+}
+
+INTENSIFIERS = frozenset({"very", "so", "really", "extremely", "super", "incredibly", "totally", "completely", "too"})
+NEGATORS = frozenset({"not", "no", "never", "hardly", "barely", "isn't", "wasn't", "don't", "dont", "didn't", "aren't", "ain't", "nothing"})
+# Phrases that often signal sarcasm or irony; the lexicon can't read those, so the LLM decides
+SARCASM_CUES = ("yeah right", "totally fine", "just great", "oh great", "great, just", "sure, because", "/s", "lol fine")
+NEGATION_WINDOW = 3
+# Confidence prior: with no competing signal, one 2.0-weight keyword scores 2 / (2 + 1) = 0.67
+CONFIDENCE_PRIOR = 1.0
+DEFAULT_CONFIDENCE_THRESHOLD = 0.75
+
+_WORD = re.compile(r"[a-z']+")
+_CLAUSE_BREAK = re.compile(r"[.,;:!?]|\bbut\b")
+
+
+def _intensity_level(score):
+    if score <= 2:
+        return "Mild"
+    if score <= 4:
+        return "Moderate"
+    return "Severe"
+
+
+# Local Emotion Classifier
+class LexiconEmotionClassifier:
+    """CPU-only first pass over the four emotion categories of the emotion detection prompt.
+
+    classify() returns a result in the emotion agent's JSON shape when keyword evidence is
+    clear (confidence_score_emotion >= threshold), otherwise None so the LLM is asked.
+    Negated keywords ("not happy") and sarcasm cues count as ambiguity, not evidence.
+    """
+    def __init__(self, lexicon=None, threshold=DEFAULT_CONFIDENCE_THRESHOLD):
+        self.lexicon = lexicon or EMOTION_LEXICON
+        self.threshold = threshold
+        self._terms = {}
+        for category, terms in self.lexicon.items():
+            for term, weight in terms.items():
+                self._terms[term.lower()] = (category, weight)
+        # One alternation for every term, longest first so phrases win over their words
+        alternation = "|".join(re.escape(term) for term in sorted(self._terms, key=len, reverse=True))
+        self._pattern = re.compile(rf"(?<![a-z'])(?:{alternation})(?![a-z'])")
+
+    def scores(self, text):
+        """(score per category, matched keywords, weight of negated matches)"""
+        lowered = text.lower()
+        scores = dict.fromkeys(self.lexicon, 0.0)
+        keywords = []
+        negated = 0.0
+        for match in self._pattern.finditer(lowered):
+            category, weight = self._terms[match.group(0)]
+            # Negation only reaches back within the same clause
+            clause = _CLAUSE_BREAK.split(lowered[:match.start()])[-1]
+            preceding = _WORD.findall(clause)[-NEGATION_WINDOW:]
+            if any(word in NEGATORS or word.endswith("n't") for word in preceding):
+                negated += weight
+                continue
+            if preceding and preceding[-1] in INTENSIFIERS:
+                weight *= 1.5
+            scores[category] += weight
+            keywords.append(match.group(0))
+        return scores, keywords, negated
+
+    def classify(self, text):
+        """Emotion result for text, or None when the LLM should decide"""
+        if not text:
+            return None
+        lowered = text.lower()
+        if any(cue in lowered for cue in SARCASM_CUES):
+            return None
+        scores, keywords, negated = self.scores(text)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        (emotion, top), (_, second) = ranked[0], ranked[1]
+        if top <= 0:
+            return None
+        confidence = (top - second) / (top + second + negated + CONFIDENCE_PRIOR)
+        if self.threshold is None or confidence < self.threshold:
+            return None
+        intensifiers = sum(1 for word in _WORD.findall(lowered) if word in INTENSIFIERS)
+        intensity = 1 + round(top / 3) + min(intensifiers, 2) + (1 if "!" in text else 0)
+        intensity = max(1, min(5, intensity))
+        return {
+            "emotion": emotion,
+            "intensity_level": _intensity_level(intensity),
+            "intensity_score": intensity,
+            "confidence_score_emotion": round(confidence, 2),
+            "sarcasm_detected": "No",
+            "confidence_score_sarcasm": round(confidence, 2),
+            "identified_keywords": keywords,
+            "context_notes": "Classified locally from emotion keywords",
+            "fallback_action_taken": "None",
+            "source": "lexicon",
+        }
+
@@ -0,0 +1,345 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+
+from call_recorder import request_key
+from log_config import get_logger
+from resilience import remaining_budget
+
+_logger = get_logger("llm_gateway")
+
+# Priority lanes, lowest number first: the user-facing reply is never queued behind
+# background work, and the analysis the reply depends on comes next
+LANE_INTERACTIVE = 0
+LANE_ANALYSIS = 1
+LANE_BACKGROUND = 2
+
+AGENT_LANES = {
+    "response_generation": LANE_INTERACTIVE,
+    "user_input_processing": LANE_ANALYSIS,
+    "emotion_detection": LANE_ANALYSIS,
+    "fused_analysis": LANE_ANALYSIS,
+    "context_analysis": LANE_ANALYSIS,
+    "feedback_processing": LANE_BACKGROUND,
+    "conversation_summary": LANE_BACKGROUND,
+}
+
+# Small classification calls whose identical concurrent requests share one API call
+COALESCE_AGENTS = frozenset({"user_input_processing", "emotion_detection"})
+
+# Completion tokens assumed for a call that doesn't set max_tokens
+DEFAULT_COMPLETION_TOKENS = 256
+
+
+class AdmissionTimeout(Exception):
+    """Raised when a call waited longer than allowed for admission.
+
+    It reflects local queueing rather than a provider failure, so it is neither retried nor
+    counted by the circuit breaker.
+    """
+
+
+def create_http_client(max_connections=100, max_keepalive_connections=50, keepalive_expiry=30.0,
+                       connect_timeout=5.0, timeout=60.0):
+    """Pooled HTTP client for the OpenAI SDK, sized for many concurrent sessions.
+
+    Keep-alive connections are reused across agents and sessions, so a burst of calls
+    doesn't pay for new TLS handshakes. Returns None (the SDK's default client) when
+    httpx can't be imported.
+    """
+    import openai
+    try:
+        import httpx
+    except ImportError:
+        _logger.info("httpx unavailable; using the OpenAI SDK's default connection pool")
+        return None
+    client_class = getattr(openai, "DefaultAsyncHttpxClient", httpx.AsyncClient)
+    return client_class(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(timeout, connect=connect_timeout),
+    )
+
+
+def estimate_tokens(params):
+    """Cheap upper estimate of the tokens a call consumes (~4 characters per prompt token)"""
+    prompt_chars = sum(len(message.get("content") or "") for message in params.get("messages", ()))
+    return prompt_chars // 4 + (params.get("max_tokens") or DEFAULT_COMPLETION_TOKENS)
+
+
+def _is_rate_limit_error(error):
+    # Only reached once a call has failed, by which point the client has loaded openai
+    import openai
+    return isinstance(error, openai.RateLimitError)
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+# Token Bucket
+class TokenBucket:
+    """Refills at rate units per second up to capacity. May go negative when actual usage
+    exceeds what was reserved, which delays later admissions until the debt is repaid."""
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self._updated = clock()
+
+    def refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available(self, amount):
+        return self.tokens >= min(amount, self.capacity)
+
+    def take(self, amount):
+        self.tokens -= amount
+
+    def wait_time(self, amount):
+        """Seconds until amount (capped at capacity) is available"""
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate) if self.rate > 0 else float("inf")
+
+
+class _Waiter:
+    __slots__ = ("loop", "future", "tokens", "granted", "cancelled")
+
+    def __init__(self, loop, future, tokens):
+        self.loop = loop
+        self.future = future
+        self.tokens = tokens
+        self.granted = False
+        self.cancelled = False
+
+
+# LLM Gateway
+class LLMGateway:
+    """Single admission point for every agent LLM call in the process.
+
+    Calls wait in priority lanes (AGENT_LANES) and are admitted, highest lane first and FIFO
+    within a lane, while a concurrency slot, a request token and enough prompt+completion
+    tokens are available. A 429 from the provider pauses all admissions for its Retry-After,
+    so retries don't pile onto an already saturated limit. Identical concurrent requests
+    from COALESCE_AGENTS share a single API call.
+    """
+    def __init__(self, requests_per_minute=3500, tokens_per_minute=90000, max_concurrency=64,
+                 burst_seconds=2.0, agent_lanes=None, coalesce_agents=COALESCE_AGENTS,
+                 rate_limit_pause=1.0, max_queue_seconds=30.0, clock=time.monotonic):
+        self.max_concurrency = max_concurrency
+        # Longest a call waits for admission; the turn budget, when shorter, takes precedence
+        self.max_queue_seconds = max_queue_seconds
+        self.agent_lanes = agent_lanes or AGENT_LANES
+        self.coalesce_agents = coalesce_agents
+        self.rate_limit_pause = rate_limit_pause
+        self.clock = clock
+        self.requests = TokenBucket(requests_per_minute / 60, max(1.0, requests_per_minute / 60 * burst_seconds), clock)
+        self.tokens = TokenBucket(tokens_per_minute / 60, max(1.0, tokens_per_minute / 60 * burst_seconds), clock)
+        self.admitted = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+        self.queue_timeouts = 0
+        self.active = 0
+        self._paused_until = 0.0
+        self._waiters = []  # heap of (lane, sequence, _Waiter)
+        self._sequence = itertools.count()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._timer_due = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": self.active,
+                "queued": sum(1 for *_, waiter in self._waiters if not waiter.cancelled),
+                "admitted": self.admitted,
+                "coalesced": self.coalesced,
+                "rate_limited": self.rate_limited,
+                "queue_timeouts": self.queue_timeouts,
+            }
+
+    def cancel_waiting(self):
+        """Cancel every call still waiting for admission (used at shutdown); they raise CancelledError"""
+        with self._lock:
+            waiters = [waiter for *_, waiter in self._waiters if not waiter.cancelled]
+            for waiter in waiters:
+                waiter.cancelled = True
+            self._waiters.clear()
+        for waiter in waiters:
+            if not waiter.loop.is_closed():
+                waiter.loop.call_soon_threadsafe(waiter.future.cancel)
+        return len(waiters)
+
+    async def call(self, agent, params, call, timeout=None, return_shared=False):
+        """Run call() (a zero-argument coroutine function making the API request) once admitted.
+
+        timeout bounds the request itself; time spent queued for admission is not counted
+        against it but is capped by max_queue_seconds and the turn budget (AdmissionTimeout).
+        Streaming calls give their concurrency slot back as soon as the stream is open.
+        With return_shared, returns (result, shared) where shared is True when the result came
+        from another caller's coalesced request, whose usage that caller already accounts for.
+        """
+        if agent in self.coalesce_agents and not params.get("stream"):
+            result, shared = await self._coalesced_call(agent, params, call, timeout)
+        else:
+            result, shared = await self._admitted_call(agent, params, call, timeout), False
+        return (result, shared) if return_shared else result
+
+    async def _coalesced_call(self, agent, params, call, timeout):
+        key = request_key(agent, params)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            shared = self._inflight.get(key)
+            if shared is not None and shared.get_loop() is loop:
+                self.coalesced += 1
+            else:
+                shared = None
+                leader = loop.create_future()
+                self._inflight[key] = leader
+        if shared is not None:
+            return await asyncio.shield(shared), True
+        try:
+            result = await self._admitted_call(agent, params, call, timeout)
+        except BaseException as e:
+            # Followers see a cancelled leader (e.g. its deadline passed) as a retryable timeout
+            leader.set_exception(asyncio.TimeoutError(f"{agent}: shared request was cancelled")
+                                 if isinstance(e, asyncio.CancelledError) else e)
+            leader.exception()  # retrieved here so an unshared failure isn't reported as unhandled
+            raise
+        else:
+            leader.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is leader:
+                    del self._inflight[key]
+
+    async def _admitted_call(self, agent, params, call, timeout=None):
+        reserved = estimate_tokens(params)
+        await self._acquire(self.agent_lanes.get(agent, LANE_BACKGROUND), reserved, agent)
+        try:
+            result = await (asyncio.wait_for(call(), timeout) if timeout is not None else call())
+        except Exception as e:
+            if _is_rate_limit_error(e):
+                self._pause(_retry_after(e) or self.rate_limit_pause)
+            raise
+        finally:
+            self._release()
+        usage = getattr(result, "usage", None)
+        if usage is not None and getattr(usage, "total_tokens", None) is not None:
+            # Settle the reservation against what the call really used
+            with self._lock:
+                self.tokens.take(usage.total_tokens - reserved)
+        return result
+
+    async def _acquire(self, lane, tokens, agent=None):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._waiters and self._admissible(tokens):
+                self._admit(tokens)
+                return
+            waiter = _Waiter(loop, loop.create_future(), tokens)
+            heapq.heappush(self._waiters, (lane, next(self._sequence), waiter))
+            self._dispatch()
+        wait_seconds = self.max_queue_seconds
+        remaining = remaining_budget()
+        if remaining is not None:
+            wait_seconds = min(wait_seconds, max(0.0, remaining)) if wait_seconds is not None else max(0.0, remaining)
+        try:
+            # shield: on a timeout the future is settled below, under the lock
+            await asyncio.wait_for(asyncio.shield(waiter.future), wait_seconds)
+        except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+            with self._lock:
+                if waiter.granted:
+                    if not isinstance(e, asyncio.CancelledError):
+                        # Admitted just as the wait timed out: keep the slot
+                        return
+                    # Admitted just as the caller gave up (e.g. its deadline passed)
+                    self.active -= 1
+                    self._dispatch()
+                else:
+                    waiter.cancelled = True
+                    waiter.future.cancel()
+                    if not isinstance(e, asyncio.CancelledError):
+                        self.queue_timeouts += 1
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise AdmissionTimeout(f"{agent or 'call'}: not admitted within {wait_seconds:.1f}s") from None
+
+    def _release(self):
+        with self._lock:
+            self.active -= 1
+            self._dispatch()
+
+    def _pause(self, seconds):
+        with self._lock:
+            self.rate_limited += 1
+            self._paused_until = max(self._paused_until, self.clock() + seconds)
+            _logger.warning("provider rate limit hit; pausing LLM calls for %.2fs", seconds)
+
+    def _admissible(self, tokens):
+        if self.active >= self.max_concurrency or self.clock() < self._paused_until:
+            return False
+        self.requests.refill()
+        self.tokens.refill()
+        return self.requests.available(1) and self.tokens.available(tokens)
+
+    def _admit(self, tokens):
+        self.active += 1
+        self.admitted += 1
+        self.requests.take(1)
+        self.tokens.take(tokens)
+
+    def _dispatch(self):
+        # Called with the lock held: admit waiters in lane order while capacity lasts
+        while self._waiters:
+            _, _, waiter = self._waiters[0]
+            if waiter.cancelled:
+                heapq.heappop(self._waiters)
+                continue
+            if not self._admissible(waiter.tokens):
+                self._arm_timer(waiter)
+                return
+            heapq.heappop(self._waiters)
+            self._admit(waiter.tokens)
+            waiter.granted = True
+            waiter.loop.call_soon_threadsafe(_resolve, waiter.future)
+
+    def _arm_timer(self, waiter):
+        # A waiter blocked only on concurrency is woken by the next release; otherwise
+        # re-check once the buckets have refilled or the rate-limit pause is over
+        now = self.clock()
+        # A timer that is well overdue belonged to a loop that has stopped; arm a new one
+        if self.active >= self.max_concurrency or (self._timer_due is not None and now < self._timer_due + 1.0):
+            return
+        delay = max(
+            self._paused_until - now,
+            self.requests.wait_time(1),
+            self.tokens.wait_time(waiter.tokens),
+            0.001,
+        )
+        self._timer_due = now + delay
+        waiter.loop.call_soon_threadsafe(waiter.loop.call_later, delay, self._on_timer)
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer_due = None
+            self._dispatch()
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,69 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+
+ROOT_LOGGER_NAME = "yaarai"
+DEFAULT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+_listener = None
+
+
+def get_logger(name):
+    """Logger under the "yaarai" namespace, e.g. get_logger("chatbot")"""
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+
+def get_agent_logger(agent):
+    """Per-agent logger, e.g. "yaarai.agents.emotion_detection", so agents can be gated individually"""
+    return get_logger(f"agents.{agent}")
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when its bounded queue is full"""
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(level=logging.INFO, stream=None, fmt=DEFAULT_FORMAT, max_queue_size=10000, agent_levels=None):
+    """Route "yaarai" logs through a queue to a background writer thread.
+
+    The request path only enqueues records; formatting and stdout writes happen on the
+    listener thread. Records below the level are rejected before any formatting, so
+    disabled DEBUG calls cost almost nothing. agent_levels overrides the level of
+    individual agents, e.g. {"emotion_detection": "DEBUG"}. Calling this again
+    replaces the previous configuration.
+    """
+    global _listener
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    if _listener is not None:
+        _listener.stop()
+        for handler in list(root.handlers):
+            if isinstance(handler, DroppingQueueHandler):
+                root.removeHandler(handler)
+    log_queue = queue.Queue(maxsize=max_queue_size)
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(logging.Formatter(fmt))
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    root.addHandler(DroppingQueueHandler(log_queue))
+    root.setLevel(level)
+    root.propagate = False
+    for agent, agent_level in (agent_levels or {}).items():
+        get_agent_logger(agent).setLevel(agent_level)
+    return _listener
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+atexit.register(_stop_listener)
@@ -1,5 +1,7 @@
 def main():
-    print("Hello from hackathon-15th-march!")
+    # The API server needs the optional "server" dependencies, so import it only when run
+    from server import main as serve
+    serve()
 
 
 if __name__ == "__main__":
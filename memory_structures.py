@@ -0,0 +1,137 @@
+import time
+from datetime import datetime
+
+
+# Message Record
+class MessageRecord:
+    """One conversation message. Supports dict-style reads (msg["role"], msg.get(...))
+    so existing callers keep working without a dict per message."""
+    __slots__ = ("role", "content", "created_at", "emotion_data")
+
+    def __init__(self, role, content, emotion_data=None, created_at=None):
+        self.role = role
+        self.content = content
+        self.emotion_data = emotion_data
+        # A float is much cheaper to keep than a datetime; timestamp converts on access
+        self.created_at = time.time() if created_at is None else created_at
+
+    @property
+    def timestamp(self):
+        return datetime.fromtimestamp(self.created_at)
+
+    def __getitem__(self, key):
+        if key not in _MESSAGE_KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in _MESSAGE_KEYS else default
+
+    def keys(self):
+        return _MESSAGE_KEYS
+
+    def to_dict(self):
+        return {"role": self.role, "content": self.content, "timestamp": self.timestamp, "emotion_data": self.emotion_data}
+
+    def __repr__(self):
+        return f"MessageRecord(role={self.role!r}, content={self.content!r})"
+
+
+_MESSAGE_KEYS = ("role", "content", "timestamp", "emotion_data")
+
+
+# Fixed-capacity Ring Buffer
+class RingBuffer:
+    """Fixed-capacity sequence that overwrites its oldest item instead of re-slicing a list"""
+    __slots__ = ("capacity", "_items", "_start", "_size")
+
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self._items = [None] * capacity
+        self._start = 0
+        self._size = 0
+
+    def append(self, item):
+        """Add an item; returns the item it displaced, or None while there is still room"""
+        if self._size < self.capacity:
+            self._items[(self._start + self._size) % self.capacity] = item
+            self._size += 1
+            return None
+        evicted = self._items[self._start]
+        self._items[self._start] = item
+        self._start = (self._start + 1) % self.capacity
+        return evicted
+
+    def tail(self, count):
+        """The last count items, oldest first"""
+        count = max(0, min(count, self._size))
+        return [self._items[(self._start + index) % self.capacity] for index in range(self._size - count, self._size)]
+
+    def clear(self):
+        self._items = [None] * self.capacity
+        self._start = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for index in range(self._size):
+            yield self._items[(self._start + index) % self.capacity]
+
+    def __reversed__(self):
+        for index in range(self._size - 1, -1, -1):
+            yield self._items[(self._start + index) % self.capacity]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._size))]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("ring buffer index out of range")
+        return self._items[(self._start + index) % self.capacity]
+
+    def __repr__(self):
+        return f"RingBuffer({list(self)!r}, capacity={self.capacity})"
+
+
+# Bounded Ordered Set
+class BoundedOrderedSet:
+    """Insertion-ordered set with O(1) membership that drops its oldest entry beyond maxlen"""
+    __slots__ = ("maxlen", "_items")
+
+    def __init__(self, iterable=(), maxlen=None):
+        self.maxlen = maxlen
+        self._items = {}
+        for item in iterable:
+            self.add(item)
+
+    def add(self, item):
+        """Add item if it is new; existing items keep their position"""
+        if item in self._items:
+            return False
+        self._items[item] = None
+        if self.maxlen is not None and len(self._items) > self.maxlen:
+            del self._items[next(iter(self._items))]
+        return True
+
+    def discard(self, item):
+        self._items.pop(item, None)
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __getitem__(self, index):
+        return list(self._items)[index]
+
+    def __repr__(self):
+        return f"BoundedOrderedSet({list(self._items)!r}, maxlen={self.maxlen})"
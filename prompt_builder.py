@@ -0,0 +1,150 @@
+import math
+
+from log_config import get_logger
+
+_logger = get_logger("prompt_builder")
+
+# Per-agent token budgets for the variable parts of each prompt. The user message and any
+# rendered history are truncated to these sizes so one long message can't inflate every call.
+DEFAULT_TOKEN_BUDGETS = {
+    "user_input_processing": {"user_input": 512},
+    "emotion_detection": {"user_input": 512, "history": 768},
+    "context_analysis": {"user_input": 512, "history": 1024, "summary": 256},
+    "fused_analysis": {"user_input": 512, "history": 1024, "summary": 256},
+    "response_generation": {"user_input": 512, "summary": 256},
+    "feedback_processing": {"user_input": 512, "previous_response": 512},
+    "conversation_summary": {"transcript": 2048},
+}
+
+# A single history message never takes more than this share of the history budget
+MAX_MESSAGE_SHARE = 0.5
+TRUNCATION_MARKER = " […]"
+
+
+# Token Counting
+class TokenCounter:
+    """Counts tokens locally with tiktoken when it is installed, else with a ~4 chars/token estimate"""
+    def __init__(self, encoding_name="cl100k_base"):
+        self.encoding_name = encoding_name
+        self._encoding = None
+        self._loaded = False
+
+    @property
+    def exact(self):
+        """Whether counts come from the real tokenizer rather than the estimate"""
+        return self._get_encoding() is not None
+
+    def count(self, text):
+        if not text:
+            return 0
+        encoding = self._get_encoding()
+        if encoding is None:
+            return math.ceil(len(text) / 4)
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text, max_tokens, keep="start"):
+        """Cut text to at most max_tokens, keeping its start (or its end with keep="end")"""
+        if max_tokens is None or self.count(text) <= max_tokens:
+            return text
+        if max_tokens <= 0:
+            return ""
+        encoding = self._get_encoding()
+        if encoding is None:
+            limit = max_tokens * 4
+            cut = text[:limit] if keep == "start" else text[-limit:]
+        else:
+            tokens = encoding.encode(text, disallowed_special=())
+            cut = encoding.decode(tokens[:max_tokens] if keep == "start" else tokens[-max_tokens:])
+        return cut + TRUNCATION_MARKER if keep == "start" else TRUNCATION_MARKER.lstrip() + " " + cut
+
+    def _get_encoding(self):
+        if not self._loaded:
+            self._loaded = True
+            try:
+                import tiktoken
+                self._encoding = tiktoken.get_encoding(self.encoding_name)
+            except Exception as e:
+                # Not installed, or the encoding file can't be loaded offline: fall back to the estimate
+                _logger.info("tiktoken unavailable (%s); using approximate token counts", e)
+                self._encoding = None
+        return self._encoding
+
+
+default_token_counter = TokenCounter()
+
+
+# Per-turn Prompt Context
+class TurnPromptContext:
+    """Renders the shared, variable parts of agent prompts once per turn, within token budgets.
+
+    Agents of one turn share an instance, so the conversation history and emotion history
+    are formatted a single time however many agents use them.
+    """
+    def __init__(self, conversation_memory, history_count=5, counter=None, budgets=None):
+        self.memory = conversation_memory
+        self.history_count = history_count
+        self.counter = counter or default_token_counter
+        self.budgets = budgets or DEFAULT_TOKEN_BUDGETS
+        self._formatted_history = None
+        self._history_text = {}
+        self._emotion_history = None
+
+    def budget(self, agent, part):
+        return self.budgets.get(agent, {}).get(part)
+
+    @property
+    def formatted_history(self):
+        """[{"role", "content"}, ...] for the recent messages, fetched once per turn"""
+        if self._formatted_history is None:
+            self._formatted_history = self.memory.get_formatted_history(self.history_count)
+        return self._formatted_history
+
+    def user_input(self, agent, text):
+        """The user's message, cut to the agent's user_input budget"""
+        return self.counter.truncate(text, self.budget(agent, "user_input"))
+
+    def fit(self, agent, part, text):
+        """Any other variable text, cut to the agent's budget for that part"""
+        return self.counter.truncate(text, self.budget(agent, part))
+
+    def history_text(self, agent, empty="None"):
+        """"role: content" lines for the recent history, newest kept first when over budget"""
+        budget = self.budget(agent, "history")
+        if budget not in self._history_text:
+            self._history_text[budget] = self._render_history(budget)
+        return self._history_text[budget] or empty
+
+    def summary_text(self, agent, empty="None"):
+        """The session's rolling summary of older messages, cut to the agent's summary budget"""
+        summary = self.memory.summary
+        if not summary:
+            return empty
+        return self.fit(agent, "summary", summary)
+
+    def emotion_history(self):
+        """Comma-separated recent emotions from the user profile"""
+        if self._emotion_history is None:
+            recent_emotions = self.memory.user_profile["detected_emotions"]
+            self._emotion_history = "None"
+            if recent_emotions:
+                self._emotion_history = ", ".join(
+                    [f"{e['emotion']} (intensity: {e['intensity']})" for e in recent_emotions]
+                )
+        return self._emotion_history
+
+    def _render_history(self, budget):
+        if budget is None:
+            return "\n".join([f"{msg['role']}: {msg['content']}" for msg in self.formatted_history])
+        per_message = max(1, int(budget * MAX_MESSAGE_SHARE))
+        lines = []
+        used = 0
+        # Walk back from the newest message and stop once the budget is spent
+        for msg in reversed(self.formatted_history):
+            line = f"{msg['role']}: {self.counter.truncate(msg['content'], per_message)}"
+            cost = self.counter.count(line) + 1
+            if used + cost > budget:
+                break
+            lines.append(line)
+            used += cost
+        lines.reverse()
+        return "\n".join(lines)
@@ -0,0 +1,173 @@
+import re
+import string
+import threading
+from functools import lru_cache
+
+from opentelemetry import trace
+
+from prompt_builder import default_token_counter
+
+# Leftover f-string fields in a static prompt, e.g. "{user_input}" or "{emotion if emotion else ...}"
+_PLACEHOLDER = re.compile(r"\{([A-Za-z_][^{}\n]*)\}")
+
+# Fixed framing of each agent's request. It is appended to the system prompt rather than
+# repeated in every user message, so it is part of the cached prefix.
+REQUEST_INSTRUCTIONS = {
+    "response_generation": """## Each request
+You get context about the user (use it to inform your response but don't reference it directly),
+followed by their latest message. Respond to that message as a supportive friend would, not as a
+therapist or AI assistant.""",
+}
+
+# Per-call user message of each agent. Fields that change least often (per session) come first
+# and the new user message last, so consecutive calls of a session share the longest prefix.
+USER_TEMPLATES = {
+    "user_input_processing": "User message: {user_input}",
+    "emotion_detection": "Conversation history: {history}\n\nUser message: {user_input}",
+    "context_analysis": """Earlier conversation (summary): {summary}
+
+Recurring topics: {recurring_topics}
+
+Recent emotion history: {emotion_history}
+
+Conversation history:
+{history}
+
+Current emotion: {emotion} (Intensity: {intensity})
+Sarcasm detected: {sarcasm}
+
+User message: {user_input}""",
+    "fused_analysis": """Earlier conversation (summary): {summary}
+
+Recurring topics: {recurring_topics}
+
+Recent emotion history: {emotion_history}
+
+Conversation history:
+{history}
+
+User message: {user_input}""",
+    "response_generation": """Context:
+- Earlier in the conversation: {summary}
+- Cultural context to consider: {cultural_context}
+- Communication preferences: {communication_preferences}
+- User's detected emotion: {emotion} (Intensity: {intensity})
+- Sarcasm detected: {sarcasm}
+- Suggested focus areas: {focus_areas}
+- Suggested approach: {approach}
+- Topics to avoid: {avoid_topics}
+
+User message: "{user_input}\"""",
+    "feedback_processing": """Previous system response: "{previous_response}"
+
+User's latest message (potential feedback): "{user_input}\"""",
+    "conversation_summary": "Previous summary: {previous_summary}\n\nNew messages:\n{transcript}",
+}
+
+
+class PromptTemplateError(ValueError):
+    """Raised for a prompt that can't be compiled, or rendered with the values given"""
+
+
+def find_placeholders(prompt):
+    """Placeholder-like fields in a prompt that is meant to be sent verbatim"""
+    return _PLACEHOLDER.findall(prompt or "")
+
+
+def _compile(agent, template):
+    parts = []
+    fields = set()
+    try:
+        parsed = list(string.Formatter().parse(template))
+    except ValueError as e:
+        raise PromptTemplateError(f"{agent}: invalid user template: {e}") from e
+    for literal, field, format_spec, conversion in parsed:
+        if field is not None:
+            if not field.isidentifier() or format_spec or conversion:
+                raise PromptTemplateError(f"{agent}: user template fields must be plain names, got {{{field}}}")
+            fields.add(field)
+        parts.append((literal, field))
+    return tuple(parts), frozenset(fields)
+
+
+# Prompt Templates
+class PromptTemplate:
+    """An agent's messages: a static system message followed by a per-call user message.
+
+    The system message (prompt plus REQUEST_INSTRUCTIONS) is fixed when the template is
+    compiled, so it is byte-identical across calls and sessions and provider-side prompt
+    caching can reuse it. Only the user message is rendered per call. Token counts of both
+    parts are kept for reporting.
+    """
+    def __init__(self, agent, system_prompt, user_template, instructions=None, counter=None):
+        placeholders = find_placeholders(system_prompt)
+        if placeholders:
+            raise PromptTemplateError(
+                f"{agent}: system prompt has unfilled placeholders: "
+                + ", ".join("{" + placeholder + "}" for placeholder in placeholders)
+            )
+        self.agent = agent
+        self.system = system_prompt.rstrip() + ("\n\n" + instructions if instructions else "")
+        self._parts, self.fields = _compile(agent, user_template)
+        self.counter = counter or default_token_counter
+        self.static_tokens = self.counter.count(self.system)
+        self.calls = 0
+        self.dynamic_tokens = 0
+        self._lock = threading.Lock()
+
+    def render(self, values):
+        """The user message for values (a dict holding exactly the template's fields)"""
+        if self.fields.symmetric_difference(values):
+            missing = sorted(self.fields.difference(values))
+            unknown = sorted(set(values).difference(self.fields))
+            raise PromptTemplateError(f"{self.agent}: missing fields {missing}, unknown fields {unknown}")
+        return "".join(literal if field is None else literal + str(values[field]) for literal, field in self._parts)
+
+    def messages(self, span=None, **values):
+        """Chat messages for one call; token counts are recorded on span (default: the current span)"""
+        user_message = self.render(values)
+        dynamic_tokens = self.counter.count(user_message)
+        with self._lock:
+            self.calls += 1
+            self.dynamic_tokens += dynamic_tokens
+        span = span or trace.get_current_span()
+        if span.is_recording():
+            span.set_attributes({"prompt.static_tokens": self.static_tokens, "prompt.dynamic_tokens": dynamic_tokens})
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": user_message},
+        ]
+
+    def stats(self):
+        with self._lock:
+            calls, dynamic_tokens = self.calls, self.dynamic_tokens
+        return {
+            "static_tokens": self.static_tokens,
+            "calls": calls,
+            "mean_dynamic_tokens": dynamic_tokens / calls if calls else 0.0,
+            # Share of the prompt a provider-side prefix cache can serve
+            "static_share": self.static_tokens / (self.static_tokens + dynamic_tokens / calls) if calls else 1.0,
+        }
+
+
+@lru_cache(maxsize=64)
+def agent_template(agent, system_prompt):
+    """Compiled template of an agent for a system prompt; each distinct prompt is compiled once"""
+    return PromptTemplate(agent, system_prompt, USER_TEMPLATES[agent], REQUEST_INSTRUCTIONS.get(agent))
+
+
+def compile_prompt_templates(system_prompts):
+    """Compile {agent: system prompt} up front so a broken prompt fails at startup, not mid-conversation.
+
+    Problems of all agents are reported together in one PromptTemplateError.
+    """
+    templates = {}
+    problems = []
+    for agent, system_prompt in system_prompts.items():
+        try:
+            templates[agent] = agent_template(agent, system_prompt)
+        except PromptTemplateError as e:
+            problems.append(str(e))
+    if problems:
+        raise PromptTemplateError("; ".join(problems))
+    return templates
@@ -0,0 +1,195 @@
+import asyncio
+import contextvars
+import random
+import time
+from contextlib import contextmanager
+
+from log_config import get_logger
+
+_logger = get_logger("resilience")
+
+_retryable_errors = None
+
+
+def retryable_errors():
+    """Errors worth retrying: throttling, timeouts, connection drops and 5xx responses.
+
+    Client errors (bad request, auth) fail immediately and don't count against the breaker.
+    openai is imported here rather than at module load, as it is slow to import.
+    """
+    global _retryable_errors
+    if _retryable_errors is None:
+        import openai
+        _retryable_errors = (
+            openai.RateLimitError,
+            openai.APITimeoutError,
+            openai.APIConnectionError,
+            openai.InternalServerError,
+            asyncio.TimeoutError,
+        )
+    return _retryable_errors
+
+
+def __getattr__(name):
+    if name == "RETRYABLE_ERRORS":
+        return retryable_errors()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a non-essential agent while the provider is degraded"""
+
+
+class TurnBudgetExceeded(asyncio.TimeoutError):
+    """Raised when the conversation turn has no latency budget left for another call"""
+
+
+# Call Policies
+class CallPolicy:
+    """Deadline and retry settings for one agent's LLM calls"""
+    __slots__ = ("timeout", "max_retries", "base_delay", "max_delay", "essential")
+
+    def __init__(self, timeout=10.0, max_retries=2, base_delay=0.25, max_delay=4.0, essential=True):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # Non-essential agents are skipped outright while the circuit breaker is open
+        self.essential = essential
+
+    def backoff(self, attempt, rng=random.random):
+        """Full-jitter exponential backoff delay before retry number attempt (0-based)"""
+        return rng() * min(self.max_delay, self.base_delay * (2 ** attempt))
+
+
+DEFAULT_POLICY = CallPolicy()
+
+POLICIES = {
+    "user_input_processing": CallPolicy(timeout=8.0, max_retries=2),
+    "emotion_detection": CallPolicy(timeout=8.0, max_retries=2),
+    "context_analysis": CallPolicy(timeout=8.0, max_retries=1, essential=False),
+    "fused_analysis": CallPolicy(timeout=12.0, max_retries=1),
+    "response_generation": CallPolicy(timeout=15.0, max_retries=2),
+    "feedback_processing": CallPolicy(timeout=10.0, max_retries=1, essential=False),
+    "conversation_summary": CallPolicy(timeout=15.0, max_retries=1, essential=False),
+}
+
+
+def get_policy(agent):
+    return POLICIES.get(agent, DEFAULT_POLICY)
+
+
+# Circuit Breaker
+class CircuitBreaker:
+    """Opens after consecutive retryable failures and lets one probe call through after reset_timeout"""
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.consecutive_failures = 0
+        self.opened_at = None
+        # When the half-open probe was let through; None while no probe is out
+        self.probe_started = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        """Whether a non-essential call may go through right now.
+
+        While half-open only one probe is allowed until a result is recorded. A probe that ends
+        without one (e.g. a client error) frees the slot again after reset_timeout.
+        """
+        state = self.state
+        if state != "half_open":
+            return state == "closed"
+        now = self.clock()
+        if self.probe_started is not None and now - self.probe_started < self.reset_timeout:
+            return False
+        self.probe_started = now
+        return True
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_started = None
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self.probe_started = None
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                _logger.warning("circuit opened after %d consecutive failures", self.consecutive_failures)
+            self.opened_at = self.clock()
+
+
+default_breaker = CircuitBreaker()
+
+
+# Turn Latency Budget
+_turn_deadline = contextvars.ContextVar("turn_deadline", default=None)
+
+
+@contextmanager
+def turn_budget(seconds):
+    """Bound the total time of every resilient call made inside this block (None = unbounded)"""
+    with turn_deadline(time.monotonic() + seconds if seconds is not None else None):
+        yield
+
+
+@contextmanager
+def turn_deadline(deadline):
+    """turn_budget with an absolute time.monotonic() deadline, for a turn spread over several blocks"""
+    token = _turn_deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _turn_deadline.reset(token)
+
+
+def remaining_budget():
+    """Seconds left in the current turn budget, or None when no budget is set"""
+    deadline = _turn_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+async def call_with_resilience(agent, call, policy=None, breaker=None, sleep=asyncio.sleep, timed=False):
+    """Run call() with the agent's deadline, jittered retries and the circuit breaker.
+
+    call is a zero-argument function returning a fresh awaitable for each attempt. With
+    timed=True it is called with the attempt's timeout instead and applies it itself, so
+    time spent queued before the request starts (e.g. in the LLM gateway) isn't counted.
+    """
+    policy = policy or get_policy(agent)
+    breaker = breaker or default_breaker
+    if not policy.essential and not breaker.allow():
+        raise CircuitOpenError(f"{agent} skipped: provider circuit is open")
+    attempt = 0
+    while True:
+        timeout = policy.timeout
+        remaining = remaining_budget()
+        if remaining is not None:
+            if remaining <= 0:
+                raise TurnBudgetExceeded(f"{agent}: turn latency budget exhausted")
+            timeout = min(timeout, remaining)
+        try:
+            result = await (call(timeout) if timed else asyncio.wait_for(call(), timeout))
+        except retryable_errors() as e:
+            breaker.record_failure()
+            delay = policy.backoff(attempt)
+            remaining = remaining_budget()
+            if attempt >= policy.max_retries or (remaining is not None and remaining <= delay):
+                raise
+            _logger.warning("%s attempt %d failed (%s), retrying in %.2fs", agent, attempt + 1, type(e).__name__, delay)
+            await sleep(delay)
+            attempt += 1
+            continue
+        breaker.record_success()
+        return result
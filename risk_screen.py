@@ -0,0 +1,109 @@
+import re
+from collections import deque
+
+# Phrases that route a message straight to the escalation response. Matching is
+# case-insensitive on whole words, after apostrophes and whitespace are normalized, so
+# inflected forms ("overdosed", "hurting myself") are listed alongside their base phrase.
+DEFAULT_HIGH_RISK_PHRASES = (
+    "kill myself", "killing myself", "killed myself", "end my life", "ending my life",
+    "ended my life", "take my own life", "take my life", "taking my own life", "taking my life",
+    "suicide", "suicides", "suicidal", "want to die", "wanted to die", "wanna die",
+    "wish i was dead", "wish i were dead", "better off dead", "better off without me",
+    "don't want to live", "dont want to live", "don't want to be alive", "no reason to live",
+    "nothing to live for", "end it all", "ending it all", "hurt myself", "hurting myself",
+    "harm myself", "harming myself", "harmed myself", "self harm", "self-harm", "selfharm",
+    "self harming", "self-harming", "cut myself", "cutting myself", "overdose", "overdosed",
+    "overdosing", "overdoses", "jump off a bridge", "jumping off a bridge", "hang myself",
+    "hanging myself", "hanged myself", "can't go on", "cant go on", "not worth living",
+)
+
+ESCALATION_RESPONSE = (
+    "I'm really glad you told me, and I'm so sorry you're carrying this much pain right now. "
+    "You deserve support from someone who can be there with you. If you might act on these "
+    "thoughts or are in danger, please call your local emergency number now. You can also reach "
+    "a crisis line any time: in India call or WhatsApp Tele-MANAS at 14416, in the US call or "
+    "text 988, or find a helpline in your country at findahelpline.com. If you can, reach out "
+    "to someone you trust and let them know how you're feeling. I'm here to keep talking with you."
+)
+
+_APOSTROPHES = str.maketrans({"’": "'", "‘": "'", "`": "'"})
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    return _SPACES.sub(" ", text.lower().translate(_APOSTROPHES))
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == "'"
+
+
+# Multi-pattern Matching
+class AhoCorasick:
+    """Aho–Corasick automaton: finds every occurrence of many phrases in one pass over the text"""
+    def __init__(self, patterns):
+        self.patterns = tuple(dict.fromkeys(patterns))
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+        for pattern in self.patterns:
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                state = next_state
+            self._output[state] += (pattern,)
+        # Breadth-first failure links; each state also reports the matches of its fallback
+        pending = deque(self._goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, next_state in self._goto[state].items():
+                pending.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    def iter_matches(self, text):
+        """(start, end, pattern) for every occurrence in text"""
+        state = 0
+        goto, fail, output = self._goto, self._fail, self._output
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern in output[state]:
+                yield index + 1 - len(pattern), index + 1, pattern
+
+
+# High-risk Pre-screen
+class RiskScreen:
+    """Local pre-screen run before any API call; flags messages containing a high-risk phrase"""
+    def __init__(self, phrases=DEFAULT_HIGH_RISK_PHRASES):
+        self.phrases = tuple(normalize_text(phrase) for phrase in phrases)
+        self._automaton = AhoCorasick(self.phrases)
+
+    def screen(self, text):
+        """Matched high-risk phrases in text, in order of appearance (empty if none)"""
+        if not text or not self.phrases:
+            return []
+        normalized = normalize_text(text)
+        matches = []
+        for start, end, phrase in self._automaton.iter_matches(normalized):
+            # Whole words only, so a phrase inside a longer word doesn't trigger
+            if start > 0 and _is_word_char(normalized[start - 1]):
+                continue
+            if end < len(normalized) and _is_word_char(normalized[end]) and _is_word_char(phrase[-1]):
+                continue
+            if phrase not in matches:
+                matches.append(phrase)
+        return matches
+
+
+default_risk_screen = RiskScreen()
@@ -0,0 +1,296 @@
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import uuid
+import zlib
+from contextlib import asynccontextmanager
+
+try:
+    import uvicorn
+    from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+    from fastapi.responses import StreamingResponse
+    from pydantic import BaseModel
+except ImportError as e:
+    raise ImportError(
+        "The API server needs its optional dependencies: pip install 'hackathon-15th-march[server]'"
+    ) from e
+
+from log_config import configure_logging, get_logger
+
+_logger = get_logger("server")
+
+# Worker poll interval; also how quickly a crashed worker is noticed and restarted
+POLL_INTERVAL = 1.0
+
+
+# Worker Processes
+def _worker_main(index, worker_count, requests, results):
+    """Entry point of one worker process: its own chatbot, sessions and event loop"""
+    from agentic_framework import warm_up
+    from chatbot_config import create_chatbot_from_env
+    chatbot = create_chatbot_from_env(worker_index=index, worker_count=worker_count)
+    get_logger("server").info("worker %d ready (pid %d)", index, os.getpid())
+    # The worker accepts requests right away; the OpenAI client loads in the background
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    asyncio.run(_serve_worker(chatbot, requests, results))
+
+
+async def _serve_worker(chatbot, requests, results):
+    loop = asyncio.get_running_loop()
+    tasks = set()
+    while True:
+        request = await loop.run_in_executor(None, requests.get)
+        if request is None:
+            break
+        # Turns of different sessions run concurrently; the chatbot serializes each session
+        task = loop.create_task(_handle_request(chatbot, request, results))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _handle_request(chatbot, request, results):
+    request_id, kind, session_id, user_input = request
+    try:
+        if kind == "message":
+            results.put((request_id, "done", await chatbot.aprocess_message(user_input, session_id)))
+        elif kind == "stream":
+            chunks = []
+            async for chunk in chatbot.aprocess_message_stream(user_input, session_id):
+                chunks.append(chunk)
+                results.put((request_id, "chunk", chunk))
+            results.put((request_id, "done", "".join(chunks)))
+        elif kind == "session":
+            results.put((request_id, "done", chatbot.session_info(session_id)))
+        else:
+            results.put((request_id, "error", f"unknown request kind {kind!r}"))
+    except Exception as e:
+        _logger.error("%s request for session %s failed: %s", kind, session_id, e)
+        results.put((request_id, "error", str(e)))
+
+
+class WorkerPool:
+    """Runs the agent pipeline in several processes and routes every session to one of them.
+
+    A session id always hashes to the same worker, so its conversation memory and per-session
+    lock live in exactly one process. Replies come back over a result queue per worker and are
+    handed to the waiting request on the server's event loop.
+    """
+    def __init__(self, workers=None, request_timeout=60.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.request_timeout = request_timeout
+        self.restarts = 0
+        self._context = multiprocessing.get_context("spawn")
+        self._processes = []
+        self._request_queues = []
+        self._result_queues = []
+        self._readers = []
+        self._pending = {}
+        self._request_ids = itertools.count()
+        self._loop = None
+        self._closing = False
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        for index in range(self.workers):
+            self._request_queues.append(self._context.Queue())
+            self._result_queues.append(self._context.Queue())
+            self._processes.append(self._spawn(index))
+            reader = threading.Thread(target=self._read_results, args=(index,), name=f"worker-{index}-results", daemon=True)
+            reader.start()
+            self._readers.append(reader)
+
+    def close(self):
+        self._closing = True
+        for request_queue in self._request_queues:
+            request_queue.put(None)
+        for process in self._processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+
+    def worker_for(self, session_id):
+        """Index of the worker that owns a session (stable across server restarts)"""
+        return zlib.crc32(session_id.encode()) % self.workers
+
+    def health(self):
+        return {
+            "workers": self.workers,
+            "alive": sum(process.is_alive() for process in self._processes),
+            "restarts": self.restarts,
+            "pending_requests": len(self._pending),
+        }
+
+    async def call(self, kind, session_id, user_input=None):
+        """Run one request on the session's worker and return its result"""
+        result = None
+        async for event, payload in self._submit(kind, session_id, user_input):
+            if event == "done":
+                result = payload
+        return result
+
+    async def stream(self, session_id, user_input):
+        """Yield the reply to a message chunk by chunk as the worker generates it"""
+        async for event, payload in self._submit("stream", session_id, user_input):
+            if event == "chunk":
+                yield payload
+
+    async def _submit(self, kind, session_id, user_input):
+        request_id = next(self._request_ids)
+        events = asyncio.Queue()
+        self._pending[request_id] = events
+        try:
+            self._request_queues[self.worker_for(session_id)].put((request_id, kind, session_id, user_input))
+            while True:
+                event, payload = await asyncio.wait_for(events.get(), self.request_timeout)
+                if event == "error":
+                    raise RuntimeError(payload)
+                yield event, payload
+                if event == "done":
+                    return
+        finally:
+            self._pending.pop(request_id, None)
+
+    def _spawn(self, index):
+        process = self._context.Process(
+            target=_worker_main,
+            args=(index, self.workers, self._request_queues[index], self._result_queues[index]),
+            name=f"yaarai-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    def _read_results(self, index):
+        result_queue = self._result_queues[index]
+        while not self._closing:
+            try:
+                request_id, event, payload = result_queue.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                if not self._closing and not self._processes[index].is_alive():
+                    # Requests in flight on the dead worker time out; its sessions are
+                    # reloaded from the session store (if any) by the replacement
+                    _logger.error("worker %d exited with code %s, restarting", index, self._processes[index].exitcode)
+                    self.restarts += 1
+                    self._processes[index] = self._spawn(index)
+                continue
+            self._loop.call_soon_threadsafe(self._deliver, request_id, event, payload)
+
+    def _deliver(self, request_id, event, payload):
+        events = self._pending.get(request_id)
+        # Late results of requests that timed out or whose client went away are dropped
+        if events is not None:
+            events.put_nowait((event, payload))
+
+
+# HTTP / WebSocket API
+class MessageRequest(BaseModel):
+    message: str
+    stream: bool = False
+
+
+def create_app(pool):
+    @asynccontextmanager
+    async def lifespan(app):
+        pool.start()
+        try:
+            yield
+        finally:
+            await asyncio.to_thread(pool.close)
+
+    app = FastAPI(title="YaarAI", lifespan=lifespan)
+
+    @app.get("/healthz")
+    async def healthz():
+        return pool.health()
+
+    @app.post("/v1/sessions")
+    async def create_session():
+        return {"session_id": str(uuid.uuid4())}
+
+    @app.get("/v1/sessions/{session_id}")
+    async def get_session(session_id: str):
+        return await _call_or_fail(pool.call("session", session_id))
+
+    @app.post("/v1/sessions/{session_id}/messages")
+    async def post_message(session_id: str, request: MessageRequest):
+        if not request.stream:
+            response = await _call_or_fail(pool.call("message", session_id, request.message))
+            return {"session_id": session_id, "response": response}
+
+        async def events():
+            async for event in _stream_events(pool, session_id, request.message):
+                yield json.dumps(event) + "\n"
+
+        return StreamingResponse(events(), media_type="application/x-ndjson")
+
+    @app.websocket("/v1/sessions/{session_id}/ws")
+    async def session_socket(websocket: WebSocket, session_id: str):
+        # Each text frame ({"message": ...} or plain text) is one turn, answered with
+        # chunk events followed by a done (or error) event
+        await websocket.accept()
+        try:
+            while True:
+                frame = await websocket.receive_text()
+                message = _parse_frame(frame)
+                async for event in _stream_events(pool, session_id, message):
+                    await websocket.send_json(event)
+        except WebSocketDisconnect:
+            pass
+
+    return app
+
+
+async def _call_or_fail(call):
+    try:
+        return await call
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="The chatbot did not answer in time")
+    except RuntimeError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+
+
+async def _stream_events(pool, session_id, message):
+    chunks = []
+    try:
+        async for chunk in pool.stream(session_id, message):
+            chunks.append(chunk)
+            yield {"type": "chunk", "text": chunk}
+    except asyncio.TimeoutError:
+        yield {"type": "error", "error": "The chatbot did not answer in time"}
+        return
+    except RuntimeError as e:
+        yield {"type": "error", "error": str(e)}
+        return
+    yield {"type": "done", "session_id": session_id, "response": "".join(chunks)}
+
+
+def _parse_frame(frame):
+    try:
+        data = json.loads(frame)
+    except ValueError:
+        return frame
+    return data.get("message", "") if isinstance(data, dict) else frame
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the YaarAI chatbot over HTTP and WebSocket")
+    parser.add_argument("--host", default=os.environ.get("YAARAI_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("YAARAI_PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("YAARAI_WORKERS", "0")) or None,
+                        help="agent worker processes (default: one per CPU core)")
+    parser.add_argument("--request-timeout", type=float, default=60.0)
+    args = parser.parse_args(argv)
+    configure_logging(os.environ.get("YAARAI_LOG_LEVEL", "INFO"))
+    # One front-end process keeps the routing table; the agents run in the worker pool
+    app = create_app(WorkerPool(args.workers, args.request_timeout))
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
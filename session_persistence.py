@@ -0,0 +1,186 @@
+import atexit
+import json
+from abc import ABC, abstractmethod
+import sqlite3
+import threading
+import time
+
+from log_config import get_logger
+
+_logger = get_logger("session_persistence")
+
+
+def dumps_session(data):
+    """Encode a session snapshot as one compact JSON line"""
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def loads_session(line):
+    return json.loads(line)
+
+
+# Storage Backends
+class SessionBackend(ABC):
+    """Where serialized sessions live. Implementations store one JSON line per session id."""
+    @abstractmethod
+    def load(self, session_id):
+        """The stored JSON line for a session, or None"""
+
+    @abstractmethod
+    def save_many(self, rows):
+        """Store [(session_id, json_line), ...] in one batch"""
+
+    @abstractmethod
+    def delete(self, session_id):
+        """Remove a stored session"""
+
+    def close(self):
+        pass
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """Reference backend: a local SQLite table of session id -> JSON line"""
+    def __init__(self, path="sessions.sqlite3"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            # WAL lets other worker processes read sessions while this one writes
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def load(self, session_id):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def save_many(self, rows):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sessions (session_id, data, updated_at) VALUES (?, ?, ?)",
+                [(session_id, line, now) for session_id, line in rows],
+            )
+
+    def delete(self, session_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Write-behind Session Store
+class WriteBehindSessionStore:
+    """Persists conversation memories off the request path.
+
+    save() only snapshots the memory (memory.to_dict()) into a pending map keyed by session
+    id, so several turns of one session between flushes cost a single write. A writer
+    thread encodes and writes pending snapshots in batches every flush_interval seconds, or
+    sooner once max_batch sessions are waiting. load() sees pending snapshots first, so a
+    session is never read back older than it was saved.
+    """
+    def __init__(self, backend, memory_loader, flush_interval=1.0, max_batch=200):
+        self.backend = backend
+        # Rebuilds a memory from its snapshot, e.g. ConversationMemory.from_dict
+        self.memory_loader = memory_loader
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.saved = 0
+        self.loaded = 0
+        self.write_errors = 0
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="session-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def save(self, memory):
+        """Queue a snapshot of memory for the next batch write"""
+        snapshot = memory.to_dict()
+        with self._condition:
+            self._pending[memory.session_id] = snapshot
+            if len(self._pending) >= self.max_batch:
+                self._condition.notify()
+
+    def load(self, session_id):
+        """Rebuild a stored session, or None if it was never saved"""
+        with self._condition:
+            snapshot = self._pending.get(session_id)
+        if snapshot is None:
+            try:
+                line = self.backend.load(session_id)
+            except Exception as e:
+                _logger.error("loading session %s failed: %s", session_id, e)
+                return None
+            if line is None:
+                return None
+            try:
+                snapshot = loads_session(line)
+            except ValueError as e:
+                _logger.error("loading session %s failed: %s", session_id, e)
+                return None
+        try:
+            memory = self.memory_loader(snapshot)
+        except Exception as e:
+            # e.g. a snapshot from an incompatible format version: the session starts over
+            _logger.error("restoring session %s failed: %s", session_id, e)
+            return None
+        self.loaded += 1
+        return memory
+
+    def delete(self, session_id):
+        with self._condition:
+            self._pending.pop(session_id, None)
+        with self._write_lock:
+            self.backend.delete(session_id)
+
+    def flush(self):
+        """Write every pending snapshot now"""
+        with self._condition:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+        rows = [(session_id, dumps_session(snapshot)) for session_id, snapshot in batch.items()]
+        try:
+            with self._write_lock:
+                self.backend.save_many(rows)
+        except Exception as e:
+            self.write_errors += 1
+            _logger.error("writing %d sessions failed: %s", len(rows), e)
+            # Put the batch back unless a newer snapshot arrived meanwhile
+            with self._condition:
+                for session_id, snapshot in batch.items():
+                    self._pending.setdefault(session_id, snapshot)
+            return 0
+        self.saved += len(rows)
+        return len(rows)
+
+    def close(self):
+        """Flush what is pending and stop the writer thread"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self.flush()
+        self.backend.close()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._closed and len(self._pending) < self.max_batch:
+                    self._condition.wait(self.flush_interval)
+                if self._closed:
+                    return
+            self.flush()
@@ -0,0 +1,158 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+
+class _SessionEntry:
+    __slots__ = ("memory", "lock", "last_access", "size")
+
+    def __init__(self, memory, now):
+        self.memory = memory
+        self.lock = asyncio.Lock()
+        self.last_access = now
+        self.size = memory.estimated_size()
+
+
+# Session Registry
+class SessionRegistry:
+    """Holds one conversation memory per session id, evicting by LRU order, idle TTL and total size.
+
+    With a store (e.g. WriteBehindSessionStore) sessions outlive eviction and restarts: a
+    session missing from memory is loaded from the store on first access, and its state is
+    saved after every turn.
+    """
+    def __init__(self, memory_factory, max_sessions=1000, ttl_seconds=3600,
+                 max_memory_bytes=64 * 1024 * 1024, clock=time.monotonic, store=None):
+        self.memory_factory = memory_factory
+        self.store = store
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_bytes = max_memory_bytes
+        self.clock = clock
+        self.evictions = 0
+        self._entries = OrderedDict()  # least recently used first
+        self._total_size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, session_id):
+        return session_id in self._entries
+
+    @property
+    def memory_usage(self):
+        """Estimated bytes held by all live sessions"""
+        return self._total_size
+
+    def get(self, session_id):
+        """Return the conversation memory for a session, creating it on first use"""
+        return self._get_entry(session_id).memory
+
+    def lock(self, session_id):
+        """Return the asyncio lock that serializes turns within one session"""
+        return self._get_entry(session_id).lock
+
+    async def alock(self, session_id):
+        """lock() for use on the event loop: a session missing from memory is loaded from the
+        store in a worker thread instead of blocking the loop"""
+        entry = self._cached_entry(session_id)
+        if entry is None:
+            memory = await asyncio.to_thread(self.store.load, session_id) if self.store is not None else None
+            entry = self._add_entry(session_id, memory)
+        return entry.lock
+
+    def touch(self, session_id):
+        """Re-measure a session after a turn, persist it and enforce the size cap"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return
+            self.save(entry.memory)
+            new_size = entry.memory.estimated_size()
+            self._total_size += new_size - entry.size
+            entry.size = new_size
+            entry.last_access = self.clock()
+            self._entries.move_to_end(session_id)
+            self._evict_over_capacity(keep=session_id)
+
+    def save(self, memory):
+        """Persist a memory's current state when a store is configured"""
+        if self.store is not None:
+            self.store.save(memory)
+
+    def remove(self, session_id):
+        """Drop a session and its memory"""
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is not None:
+                self._total_size -= entry.size
+            return entry is not None
+
+    def evict_expired(self):
+        """Drop every session idle for longer than the TTL; returns how many were removed"""
+        with self._lock:
+            return self._evict_expired(self.clock())
+
+    def _get_entry(self, session_id):
+        entry = self._cached_entry(session_id)
+        if entry is None:
+            # Load outside the registry lock so one slow read doesn't stall every other session
+            memory = self.store.load(session_id) if self.store is not None else None
+            entry = self._add_entry(session_id, memory)
+        return entry
+
+    def _cached_entry(self, session_id):
+        with self._lock:
+            now = self.clock()
+            self._evict_expired(now)
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                entry.last_access = now
+                self._entries.move_to_end(session_id)
+            return entry
+
+    def _add_entry(self, session_id, memory):
+        """Insert a session (memory loaded from the store, or None for a new one) unless another
+        caller added it first; returns the entry held by the registry"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                if memory is None:
+                    memory = self.memory_factory(session_id=session_id)
+                entry = _SessionEntry(memory, self.clock())
+                self._entries[session_id] = entry
+                self._total_size += entry.size
+                self._evict_over_capacity(keep=session_id)
+            return entry
+
+    def _evict_expired(self, now):
+        removed = 0
+        if self.ttl_seconds is None:
+            return removed
+        # Entries are kept in access order, so expired sessions are always at the front
+        while self._entries:
+            session_id, entry = next(iter(self._entries.items()))
+            if now - entry.last_access <= self.ttl_seconds:
+                break
+            self._drop(session_id)
+            removed += 1
+        return removed
+
+    def _evict_over_capacity(self, keep):
+        while len(self._entries) > self.max_sessions or self._total_size > self.max_memory_bytes:
+            # Least recently used first, skipping sessions with a turn in flight
+            victim = next(
+                (session_id for session_id, entry in self._entries.items()
+                 if session_id != keep and not entry.lock.locked()),
+                None,
+            )
+            if victim is None:
+                break
+            self._drop(victim)
+
+    def _drop(self, session_id):
+        entry = self._entries.pop(session_id)
+        self._total_size -= entry.size
+        self.evictions += 1
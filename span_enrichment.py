@@ -0,0 +1,96 @@
+from collections.abc import Mapping
+
+from opentelemetry.trace import Status, StatusCode
+
+# Caps keep per-span payloads small no matter how much text an agent returns
+MAX_STRING_LENGTH = 256
+MAX_SEQUENCE_ITEMS = 16
+MAX_DEPTH = 3
+MAX_ATTRIBUTES = 64
+
+_SCALAR_TYPES = (bool, int, float, str)
+
+
+def truncate(text, max_length=MAX_STRING_LENGTH):
+    """Cap a string at max_length characters, marking the cut with an ellipsis"""
+    if len(text) <= max_length:
+        return text
+    return text[:max_length - 1] + "…"
+
+
+def record_text(span, key, text, max_length=MAX_STRING_LENGTH):
+    """Record a possibly long string as a capped attribute plus its full length"""
+    if not span.is_recording() or text is None:
+        return
+    text = str(text)
+    span.set_attribute(key, truncate(text, max_length))
+    span.set_attribute(f"{key}.length", len(text))
+
+
+def record_agent_output(span, prefix, data, max_length=MAX_STRING_LENGTH):
+    """Record an agent result (a dict or typed agent output) as flattened, typed, size-capped attributes.
+
+    Nested dicts become dotted keys ("context_analysis.response_guidance.approach_suggestion"),
+    scalars keep their type, homogeneous lists of scalars become sequence attributes, and
+    anything else is stored as a truncated string. Error results are also recorded as an
+    "agent_error" event and mark the span status as an error.
+    """
+    if not span.is_recording():
+        return
+    if not isinstance(data, Mapping):
+        record_text(span, prefix, data, max_length)
+        return
+    attributes = {}
+    _flatten(prefix, data, attributes, max_length, depth=0)
+    span.set_attributes(attributes)
+    if "error" in data:
+        message = truncate(str(data["error"]), max_length)
+        span.add_event("agent_error", {"error": message})
+        span.set_status(Status(StatusCode.ERROR, message))
+
+
+def record_llm_call(span, model, latency_seconds, usage=None, time_to_first_token=None):
+    """Record model name, latency and token usage of one LLM call as numeric attributes"""
+    if not span.is_recording():
+        return
+    attributes = {"gen_ai.request.model": model, "llm.latency_ms": latency_seconds * 1000}
+    if time_to_first_token is not None:
+        attributes["llm.time_to_first_token_ms"] = time_to_first_token * 1000
+    if usage is not None:
+        for attribute, field in (
+            ("gen_ai.usage.input_tokens", "prompt_tokens"),
+            ("gen_ai.usage.output_tokens", "completion_tokens"),
+            ("llm.usage.total_tokens", "total_tokens"),
+        ):
+            value = getattr(usage, field, None)
+            if value is not None:
+                attributes[attribute] = value
+    span.set_attributes(attributes)
+
+
+def _flatten(prefix, data, attributes, max_length, depth):
+    for key, value in data.items():
+        if len(attributes) >= MAX_ATTRIBUTES:
+            attributes[f"{prefix}._truncated"] = True
+            return
+        name = f"{prefix}.{key}"
+        if value is None:
+            continue
+        if isinstance(value, _SCALAR_TYPES):
+            attributes[name] = truncate(value, max_length) if isinstance(value, str) else value
+        elif isinstance(value, Mapping) and depth < MAX_DEPTH:
+            _flatten(name, value, attributes, max_length, depth + 1)
+        elif isinstance(value, (list, tuple)) and _is_homogeneous_scalars(value):
+            items = value[:MAX_SEQUENCE_ITEMS]
+            if items and isinstance(items[0], str):
+                items = [truncate(item, max_length) for item in items]
+            attributes[name] = list(items)
+        else:
+            attributes[name] = truncate(str(value), max_length)
+
+
+def _is_homogeneous_scalars(values):
+    if not values:
+        return True
+    first_type = type(values[0])
+    return first_type in _SCALAR_TYPES and all(type(value) is first_type for value in values)
@@ -0,0 +1,124 @@
+"""Cold-start benchmark.
+
+Runs each startup scenario in a fresh interpreter several times and reports how long it
+takes, together with the wall time of the whole process (interpreter startup included)
+and which slow-to-import packages it loaded. Use --max-import-ms in CI to keep importing
+the framework cheap as workers are added by autoscaling.
+
+    python startup_benchmark.py --repeat 10
+    python startup_benchmark.py --max-import-ms 300
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Packages that dominate import time; a scenario should only load the ones it needs
+HEAVY_MODULES = (
+    "openai",
+    "httpx",
+    "opentelemetry.sdk.trace",
+    "opentelemetry.sdk.metrics",
+    "opentelemetry.exporter.otlp.proto.http.trace_exporter",
+    "sqlite3",
+)
+
+SCENARIOS = {
+    "import": "import agentic_framework",
+    "create_chatbot": "from chatbot_config import create_chatbot_from_env\ncreate_chatbot_from_env()",
+    "first_client": (
+        "from chatbot_config import create_chatbot_from_env\ncreate_chatbot_from_env()\n"
+        "import agentic_framework\nagentic_framework.warm_up()"
+    ),
+    "web_client": "import chatbot_client",
+}
+
+_CHILD = """
+import json, sys, time
+started = time.perf_counter()
+exec(compile({code!r}, "<scenario>", "exec"))
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "modules": [name for name in {modules!r} if name in sys.modules]}}))
+"""
+
+
+def run_scenario(code, repeat):
+    """Run code in repeat fresh interpreters; returns per-run scenario and process times"""
+    env = dict(os.environ, YAARAI_LOG_LEVEL="CRITICAL")
+    child = _CHILD.format(code=code, modules=HEAVY_MODULES)
+    seconds, wall, modules = [], [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", child],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        wall.append(time.perf_counter() - started)
+        result = json.loads(output.strip().splitlines()[-1])
+        seconds.append(result["seconds"])
+        modules = result["modules"]
+    return {"seconds": seconds, "wall_seconds": wall, "heavy_modules": modules}
+
+
+def summarize(runs):
+    def stats(values):
+        ordered = sorted(values)
+        return {
+            "median_ms": statistics.median(ordered) * 1000,
+            "max_ms": ordered[-1] * 1000,
+        }
+    return {
+        name: {
+            "scenario": stats(run["seconds"]),
+            "process": stats(run["wall_seconds"]),
+            "heavy_modules": run["heavy_modules"],
+        }
+        for name, run in runs.items()
+    }
+
+
+def format_report(summary, repeat):
+    lines = [
+        f"YaarAI cold start: {repeat} fresh interpreters per scenario",
+        "",
+        f"{'scenario':<16}{'median ms':>11}{'max ms':>10}{'process ms':>12}  heavy modules loaded",
+    ]
+    for name, stats in summary.items():
+        lines.append(
+            f"{name:<16}{stats['scenario']['median_ms']:>11.1f}{stats['scenario']['max_ms']:>10.1f}"
+            f"{stats['process']['median_ms']:>12.1f}  {', '.join(stats['heavy_modules']) or '-'}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start time of the chatbot in fresh interpreters")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per scenario")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="run only these scenarios")
+    parser.add_argument("--max-import-ms", type=float, help="exit with status 1 if importing the framework takes longer (median)")
+    parser.add_argument("--json", dest="json_path", help="write the summary as JSON to this file")
+    args = parser.parse_args(argv)
+
+    names = args.scenario or list(SCENARIOS)
+    summary = summarize({name: run_scenario(SCENARIOS[name], args.repeat) for name in names})
+    print(format_report(summary, args.repeat))
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"repeat": args.repeat, **summary}, f, indent=2)
+    if args.max_import_ms is not None and "import" in summary:
+        median = summary["import"]["scenario"]["median_ms"]
+        if median > args.max_import_ms:
+            print(f"\nimport took {median:.1f}ms, over the {args.max_import_ms:.0f}ms budget", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from agent_outputs import EmotionResult, IncrementalJSONParser, extract_json_object
+
+DOCUMENT = (
+    '{"context": {"summary": "said \\"hi\\" {not a brace}", "nested": [1, {"deep": "]}"}]},'
+    ' "path": "C:\\\\temp\\\\", "final_response": "Take care \\u2764 {friend}", "empty": {}}'
+)
+
+
+def feed_in_chunks(text, size):
+    parser = IncrementalJSONParser()
+    completed = []
+    for start in range(0, len(text), size):
+        completed.extend(parser.feed(text[start:start + size]))
+    return parser, completed
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 16, len(DOCUMENT)])
+def test_fields_match_json_loads_for_any_chunking(size):
+    parser, completed = feed_in_chunks(DOCUMENT, size)
+    expected = json.loads(DOCUMENT)
+    assert parser.done
+    assert parser.fields == expected
+    # Each top-level field is reported once, in document order
+    assert [key for key, _ in completed] == list(expected)
+
+
+def test_escape_split_across_chunks():
+    parser = IncrementalJSONParser()
+    # The backslash ends one chunk and the escaped quote starts the next
+    assert parser.feed('{"a": "x\\') == []
+    assert parser.feed('"}", ') == [("a", 'x"}')]
+    assert parser.feed('"b": 1}') == [("b", 1)]
+    assert parser.done
+
+
+def test_field_is_reported_before_the_object_closes():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"final_response": "Hello {there}"') == []
+    assert parser.feed(', "notes": {"a": [') == [("final_response", "Hello {there}")]
+    assert not parser.done
+
+
+def test_prose_and_fence_before_the_object_are_skipped():
+    parser, completed = feed_in_chunks('Sure! ```json\n{"emotion": "Joy"}\n```', 4)
+    assert completed == [("emotion", "Joy")]
+
+
+def test_text_after_the_object_is_ignored():
+    parser = IncrementalJSONParser()
+    parser.feed('{"a": 1} {"b": 2}')
+    assert parser.fields == {"a": 1}
+    assert parser.feed('{"c": 3}') == []
+
+
+def test_extract_json_object_skips_braces_in_prose():
+    assert extract_json_object('Result {see below}: {"emotion": "Sadness"}') == {"emotion": "Sadness"}
+    assert extract_json_object("no json here") is None
+
+
+def test_invalid_fields_are_dropped_and_noted():
+    result = EmotionResult.parse('{"Emotion": "Anger", "intensity_score": "4/5", "intensity_level": "extreme"}')
+    assert result["emotion"] == "Anger"
+    assert result["intensity_score"] == 4
+    assert "intensity_level" not in result
+    assert result.problems and result.problems[0].startswith("intensity_level")
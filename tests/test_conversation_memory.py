@@ -0,0 +1,121 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from opentelemetry import trace
+
+import agentic_framework
+from agent_prompts import prompts
+from agentic_framework import ConversationMemory, EmotionalSupportChatbot
+
+
+def _memory(count, max_history=20):
+    memory = ConversationMemory(max_history=max_history)
+    for index in range(count):
+        memory.add_message("user" if index % 2 == 0 else "assistant", f"m{index}")
+    return memory
+
+
+def _contents(pending):
+    return [message["content"] for message in pending]
+
+
+def test_messages_to_summarize_leaves_the_recent_window_out():
+    memory = _memory(8)
+    pending, until = memory.messages_to_summarize(keep_recent=3)
+    assert _contents(pending) == ["m0", "m1", "m2", "m3", "m4"]
+    assert until == 5
+
+
+def test_messages_to_summarize_starts_after_the_summary():
+    memory = _memory(8)
+    memory.apply_summary("first five", 5)
+    pending, until = memory.messages_to_summarize(keep_recent=1)
+    assert _contents(pending) == ["m5", "m6"]
+    assert until == 7
+    assert memory.messages_to_summarize(keep_recent=3) == ([], 5)
+
+
+def test_evicted_messages_are_summarized_until_covered():
+    memory = _memory(10, max_history=4)
+    assert [entry[0] for entry in memory.unsummarized_evictions] == [0, 1, 2, 3, 4, 5]
+    pending, until = memory.messages_to_summarize(keep_recent=2)
+    assert _contents(pending) == [f"m{index}" for index in range(8)]
+    memory.apply_summary("summary", until)
+    assert memory.summary == "summary"
+    assert memory.summarized_until == 8
+    assert memory.unsummarized_evictions == []
+
+
+def test_apply_summary_keeps_evictions_past_the_summary():
+    memory = _memory(10, max_history=4)
+    memory.apply_summary("summary", 3)
+    assert [entry[0] for entry in memory.unsummarized_evictions] == [3, 4, 5]
+    # Messages evicted after the summary covers them are not kept
+    memory.apply_summary("summary", 8)
+    memory.add_message("user", "m10")
+    assert memory.unsummarized_evictions == []
+
+
+@pytest.fixture
+def summarizer(monkeypatch):
+    """Replaces the summary LLM call; records the messages each call folded"""
+    calls = []
+
+    async def fake_summarize(previous_summary, new_messages, *args, **kwargs):
+        calls.append(_contents(new_messages))
+        return f"{previous_summary} + {len(new_messages)}"
+
+    monkeypatch.setattr(agentic_framework, "asummarize_conversation", fake_summarize)
+    return calls
+
+
+def _run_summary(chatbot, memory, keep_recent):
+    pending, until = memory.messages_to_summarize(keep_recent=keep_recent)
+    base = (memory.summary, memory.summarized_until)
+    return pending, until, lambda: chatbot._arun_conversation_summary(
+        trace.get_tracer(__name__), memory, pending, until, None, base, keep_recent
+    )
+
+
+def test_stale_summary_job_only_folds_what_is_still_pending(summarizer):
+    chatbot = EmotionalSupportChatbot(prompts)
+    memory = _memory(8)
+    *_, first = _run_summary(chatbot, memory, keep_recent=3)
+    memory.add_message("user", "m8")
+    memory.add_message("assistant", "m9")
+    *_, second = _run_summary(chatbot, memory, keep_recent=3)
+    # Both jobs were queued before either ran
+    asyncio.run(first())
+    asyncio.run(second())
+    assert summarizer == [["m0", "m1", "m2", "m3", "m4"], ["m5", "m6"]]
+    assert memory.summarized_until == 7
+
+
+def test_stale_summary_job_with_nothing_left_is_skipped(summarizer):
+    chatbot = EmotionalSupportChatbot(prompts)
+    memory = _memory(8)
+    *_, first = _run_summary(chatbot, memory, keep_recent=3)
+    *_, duplicate = _run_summary(chatbot, memory, keep_recent=3)
+    asyncio.run(first())
+    assert asyncio.run(duplicate()) is None
+    assert summarizer == [["m0", "m1", "m2", "m3", "m4"]]
+    assert memory.summary == "None + 5"
+
+
+def test_summary_transcript_uses_the_chatbot_token_budgets(monkeypatch):
+    prompts_sent = []
+
+    async def fake_completion(agent, **params):
+        prompts_sent.append(params["messages"][-1]["content"])
+        message = SimpleNamespace(content="summary")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    monkeypatch.setattr(agentic_framework, "_acreate_completion", fake_completion)
+    chatbot = EmotionalSupportChatbot(prompts, token_budgets={"conversation_summary": {"transcript": 4}})
+    memory = _memory(8)
+    memory.add_message("user", "a long message " * 20)
+    *_, job = _run_summary(chatbot, memory, keep_recent=0)
+    asyncio.run(job())
+    assert "m0" not in prompts_sent[0]
+    assert memory.summary == "summary"
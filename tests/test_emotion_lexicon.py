@@ -0,0 +1,55 @@
+import pytest
+
+from emotion_lexicon import LexiconEmotionClassifier
+
+
+@pytest.fixture
+def classifier():
+    return LexiconEmotionClassifier()
+
+
+def test_clear_keywords_are_classified_locally(classifier):
+    result = classifier.classify("I am so happy and excited today")
+    assert result["emotion"] == "Happiness"
+    assert result["identified_keywords"] == ["happy", "excited"]
+    assert result["confidence_score_emotion"] >= classifier.threshold
+    assert result["source"] == "lexicon"
+
+
+def test_negated_keyword_is_not_evidence(classifier):
+    scores, keywords, negated = classifier.scores("I'm not happy")
+    assert keywords == []
+    assert negated == 2.0
+    assert classifier.classify("I'm not happy") is None
+
+
+def test_negation_lowers_confidence(classifier):
+    # sad and lonely alone would be classified; the negated "happy" makes it ambiguous
+    assert classifier.classify("I feel sad and lonely")["emotion"] == "Sadness"
+    assert classifier.classify("not happy, just sad and lonely") is None
+
+
+def test_negation_stops_at_the_clause(classifier):
+    scores, keywords, negated = classifier.scores("I'm not sure why, but I'm happy")
+    assert keywords == ["happy"]
+    assert negated == 0.0
+
+
+@pytest.mark.parametrize("message", [
+    "Oh great, I'm so happy and excited",
+    "yeah right, I'm so happy and excited",
+    "I'm so happy and excited /s",
+])
+def test_sarcasm_cues_defer_to_the_llm(classifier, message):
+    assert classifier.classify(message) is None
+
+
+def test_confidence_threshold(classifier):
+    # One 2.0 keyword scores 2 / (2 + 1) = 0.67, below the default threshold
+    assert classifier.classify("I feel happy") is None
+    assert LexiconEmotionClassifier(threshold=0.6).classify("I feel happy")["emotion"] == "Happiness"
+    assert LexiconEmotionClassifier(threshold=None).classify("I am so happy and excited today") is None
+
+
+def test_competing_categories_are_left_to_the_llm(classifier):
+    assert classifier.classify("I'm happy but also really anxious") is None
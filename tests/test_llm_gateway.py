@@ -0,0 +1,170 @@
+import asyncio
+
+import pytest
+
+from llm_gateway import AGENT_LANES, LANE_ANALYSIS, LANE_BACKGROUND, AdmissionTimeout, LLMGateway
+from resilience import CallPolicy, CircuitBreaker, call_with_resilience
+
+PARAMS = {"messages": [{"role": "user", "content": "hi"}], "max_tokens": 10}
+
+
+async def _hold_slot(gateway, release):
+    """Occupy one concurrency slot until release is set"""
+    async def call():
+        await release.wait()
+        return "held"
+    return await gateway.call("response_generation", PARAMS, call)
+
+
+def test_context_analysis_is_not_queued_with_background_work():
+    assert AGENT_LANES["context_analysis"] == LANE_ANALYSIS
+    assert AGENT_LANES["feedback_processing"] == LANE_BACKGROUND
+    assert AGENT_LANES["conversation_summary"] == LANE_BACKGROUND
+
+
+def test_waiters_are_admitted_by_lane_then_fifo():
+    async def scenario():
+        gateway = LLMGateway(max_concurrency=1, coalesce_agents=frozenset())
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold_slot(gateway, release))
+        await asyncio.sleep(0)
+        order = []
+
+        def recording(name):
+            async def call():
+                order.append(name)
+                return name
+            return call
+
+        # Queued lowest priority first; same-lane calls keep their arrival order
+        agents = [
+            ("feedback_processing", "feedback"),
+            ("conversation_summary", "summary"),
+            ("context_analysis", "context"),
+            ("emotion_detection", "emotion"),
+            ("response_generation", "response"),
+        ]
+        tasks = []
+        for agent, name in agents:
+            tasks.append(asyncio.create_task(gateway.call(agent, PARAMS, recording(name))))
+            await asyncio.sleep(0)
+        assert gateway.stats()["queued"] == len(agents)
+        release.set()
+        await asyncio.gather(holder, *tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["response", "context", "emotion", "feedback", "summary"]
+
+
+def test_admission_timeout_is_raised_and_frees_the_queue_entry():
+    async def scenario():
+        gateway = LLMGateway(max_concurrency=1, max_queue_seconds=0.05)
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold_slot(gateway, release))
+        await asyncio.sleep(0)
+
+        async def call():
+            return "late"
+
+        with pytest.raises(AdmissionTimeout):
+            await gateway.call("feedback_processing", PARAMS, call)
+        stats = gateway.stats()
+        release.set()
+        await holder
+        # The slot freed by the holder is usable again
+        result = await gateway.call("feedback_processing", PARAMS, call)
+        return stats, result, gateway.stats()
+
+    stats, result, after = asyncio.run(scenario())
+    assert stats["queue_timeouts"] == 1
+    assert stats["queued"] == 0
+    assert result == "late"
+    assert after["active"] == 0
+
+
+def test_queueing_is_not_counted_against_the_attempt_deadline():
+    async def scenario():
+        gateway = LLMGateway(max_concurrency=1)
+        breaker = CircuitBreaker()
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold_slot(gateway, release))
+        await asyncio.sleep(0)
+        asyncio.get_running_loop().call_later(0.2, release.set)
+
+        async def call():
+            return "ok"
+
+        # Queued for 0.2s, four times the attempt timeout, yet the request itself is quick
+        result = await call_with_resilience(
+            "context_analysis",
+            lambda timeout: gateway.call("context_analysis", PARAMS, call, timeout),
+            policy=CallPolicy(timeout=0.05, max_retries=0),
+            breaker=breaker,
+            timed=True,
+        )
+        await holder
+        return result, breaker.consecutive_failures
+
+    assert asyncio.run(scenario()) == ("ok", 0)
+
+
+def test_admission_timeout_is_neither_retried_nor_a_breaker_failure():
+    async def scenario():
+        gateway = LLMGateway(max_concurrency=1, max_queue_seconds=0.05)
+        breaker = CircuitBreaker()
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold_slot(gateway, release))
+        await asyncio.sleep(0)
+        attempts = []
+
+        async def call():
+            return "ok"
+
+        def attempt(timeout):
+            attempts.append(timeout)
+            return gateway.call("context_analysis", PARAMS, call, timeout)
+
+        with pytest.raises(AdmissionTimeout):
+            await call_with_resilience(
+                "context_analysis", attempt, policy=CallPolicy(timeout=1.0, max_retries=3), breaker=breaker, timed=True
+            )
+        release.set()
+        await holder
+        return len(attempts), breaker.consecutive_failures
+
+    assert asyncio.run(scenario()) == (1, 0)
+
+
+def test_request_timeout_still_applies_once_admitted():
+    async def scenario():
+        gateway = LLMGateway()
+
+        async def slow():
+            await asyncio.sleep(1)
+
+        with pytest.raises(asyncio.TimeoutError):
+            await gateway.call("response_generation", PARAMS, slow, timeout=0.05)
+        return gateway.stats()["active"]
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_coalesced_followers_are_marked_as_shared():
+    async def scenario():
+        gateway = LLMGateway()
+        release = asyncio.Event()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await release.wait()
+            return "analysis"
+
+        leader = asyncio.create_task(gateway.call("emotion_detection", PARAMS, call, return_shared=True))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(gateway.call("emotion_detection", PARAMS, call, return_shared=True))
+        await asyncio.sleep(0)
+        release.set()
+        return await leader, await follower, len(calls)
+
+    assert asyncio.run(scenario()) == (("analysis", False), ("analysis", True), 1)
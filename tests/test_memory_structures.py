@@ -0,0 +1,58 @@
+import pytest
+
+from memory_structures import BoundedOrderedSet, RingBuffer
+
+
+def test_append_returns_the_evicted_item_once_full():
+    buffer = RingBuffer(3)
+    assert [buffer.append(item) for item in "abc"] == [None, None, None]
+    assert buffer.append("d") == "a"
+    assert buffer.append("e") == "b"
+    assert list(buffer) == ["c", "d", "e"]
+    assert len(buffer) == 3
+
+
+def test_order_and_indexing_after_wrapping():
+    buffer = RingBuffer(4)
+    for item in range(10):
+        buffer.append(item)
+    assert list(buffer) == [6, 7, 8, 9]
+    assert list(reversed(buffer)) == [9, 8, 7, 6]
+    assert buffer[0] == 6
+    assert buffer[-1] == 9
+    assert buffer[1:3] == [7, 8]
+    with pytest.raises(IndexError):
+        buffer[4]
+
+
+@pytest.mark.parametrize("count, expected", [(0, []), (2, [8, 9]), (4, [6, 7, 8, 9]), (10, [6, 7, 8, 9])])
+def test_tail(count, expected):
+    buffer = RingBuffer(4)
+    for item in range(10):
+        buffer.append(item)
+    assert buffer.tail(count) == expected
+
+
+def test_capacity_one_and_clear():
+    buffer = RingBuffer(1)
+    assert buffer.append("a") is None
+    assert buffer.append("b") == "a"
+    assert list(buffer) == ["b"]
+    buffer.clear()
+    assert len(buffer) == 0
+    assert buffer.append("c") is None
+
+
+def test_capacity_must_be_positive():
+    with pytest.raises(ValueError):
+        RingBuffer(0)
+
+
+def test_bounded_ordered_set_drops_the_oldest_entry():
+    items = BoundedOrderedSet(maxlen=2)
+    assert items.add("work")
+    assert items.add("family")
+    assert not items.add("work")  # already present: keeps its position
+    assert items.add("health")
+    assert list(items) == ["family", "health"]
+    assert "work" not in items
@@ -0,0 +1,88 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import agentic_framework
+from agent_prompts import prompts
+from agentic_framework import ConversationMemory, agenerate_response_stream
+from resilience import CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _open_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10.0, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+
+def test_half_open_breaker_allows_a_single_probe():
+    clock = FakeClock()
+    breaker = _open_breaker(clock)
+    assert not breaker.allow()
+    clock.now = 10.0
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_reopens_the_breaker():
+    clock = FakeClock()
+    breaker = _open_breaker(clock)
+    clock.now = 10.0
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    clock.now = 20.0
+    assert breaker.allow()
+
+
+def test_probe_without_a_result_frees_the_slot_after_reset_timeout():
+    clock = FakeClock()
+    breaker = _open_breaker(clock)
+    clock.now = 10.0
+    assert breaker.allow()
+    clock.now = 19.0
+    assert not breaker.allow()
+    clock.now = 20.0
+    assert breaker.allow()
+
+
+def _chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], usage=None, model=None)
+
+
+def test_streamed_reply_is_cut_off_at_the_turn_deadline(monkeypatch):
+    async def slow_stream():
+        yield _chunk("Hello")
+        await asyncio.sleep(5)
+        yield _chunk(" there")
+
+    async def open_stream(agent, **params):
+        return slow_stream()
+
+    monkeypatch.setattr(agentic_framework, "_aopen_completion_stream", open_stream)
+
+    async def scenario():
+        started = time.monotonic()
+        chunks = [chunk async for chunk in agenerate_response_stream(
+            "hi", {}, {}, ConversationMemory(), prompts["response_generation_prompt"],
+            deadline=started + 0.1
+        )]
+        return chunks, time.monotonic() - started
+
+    chunks, elapsed = asyncio.run(scenario())
+    # The text already sent is kept; the rest of the turn is not waited for
+    assert chunks == ["Hello"]
+    assert elapsed < 1
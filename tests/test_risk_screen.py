@@ -0,0 +1,57 @@
+import pytest
+
+from risk_screen import AhoCorasick, RiskScreen, default_risk_screen
+
+
+def test_automaton_reports_overlapping_and_nested_matches():
+    automaton = AhoCorasick(["he", "she", "his", "hers"])
+    assert sorted(automaton.iter_matches("ushers")) == [(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")]
+
+
+def test_automaton_matches_patterns_sharing_a_suffix():
+    automaton = AhoCorasick(["end my life", "my life", "life"])
+    assert sorted(automaton.iter_matches("end my life")) == [
+        (0, 11, "end my life"), (4, 11, "my life"), (7, 11, "life")
+    ]
+
+
+def test_overlapping_phrases_are_all_reported_in_order():
+    screen = RiskScreen(["self harm", "harm myself", "hurt myself"])
+    assert screen.screen("I keep thinking about self harm myself") == ["self harm", "harm myself"]
+
+
+def test_each_phrase_is_reported_once():
+    assert default_risk_screen.screen("suicide... suicide") == ["suicide"]
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("I just want to DIE", ["want to die"]),
+    ("I can’t go on like this", ["can't go on"]),
+    ("everyone would be better off   without me", ["better off without me"]),
+    ("I think about self-harm", ["self-harm"]),
+])
+def test_matching_is_case_apostrophe_and_space_insensitive(message, expected):
+    assert default_risk_screen.screen(message) == expected
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("I overdosed last night", ["overdosed"]),
+    ("I overdosed on coffee this morning", ["overdosed"]),  # escalated: the screen errs on the side of caution
+    ("I keep hurting myself", ["hurting myself"]),
+    ("thinking about self-harming again", ["self-harming"]),
+])
+def test_inflected_phrases_match(message, expected):
+    assert default_risk_screen.screen(message) == expected
+
+
+@pytest.mark.parametrize("message", [
+    "the killjoy said I should end it",  # no full phrase
+    "that exam was suicidally hard",
+    "",
+])
+def test_phrases_inside_longer_words_do_not_match(message):
+    assert default_risk_screen.screen(message) == []
+
+
+def test_phrase_at_a_word_boundary_with_punctuation_matches():
+    assert default_risk_screen.screen("I want to end it all.") == ["end it all"]
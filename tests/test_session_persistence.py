@@ -0,0 +1,66 @@
+import asyncio
+import threading
+
+import pytest
+
+from agentic_framework import ConversationMemory
+from session_persistence import SessionBackend, SQLiteSessionBackend, WriteBehindSessionStore, dumps_session
+from session_store import SessionRegistry
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = WriteBehindSessionStore(SQLiteSessionBackend(str(tmp_path / "sessions.sqlite3")), ConversationMemory.from_dict)
+    yield store
+    store.close()
+
+
+def test_session_backend_requires_its_storage_methods():
+    with pytest.raises(TypeError):
+        SessionBackend()
+
+
+def test_saved_session_is_loaded_back(store):
+    memory = ConversationMemory(session_id="s1")
+    memory.add_message("user", "hello")
+    store.save(memory)
+    store.flush()
+    loaded = store.load("s1")
+    assert [message.content for message in loaded.messages] == ["hello"]
+    assert store.load("missing") is None
+
+
+def test_incompatible_snapshot_starts_a_new_session(store):
+    snapshot = ConversationMemory(session_id="old").to_dict()
+    snapshot["version"] = -1
+    store.backend.save_many([("old", dumps_session(snapshot))])
+    assert store.load("old") is None
+    registry = SessionRegistry(ConversationMemory, store=store)
+    assert len(registry.get("old").messages) == 0
+
+
+def test_alock_loads_the_session_off_the_event_loop(store):
+    memory = ConversationMemory(session_id="s1")
+    memory.add_message("user", "hello")
+    store.save(memory)
+    store.flush()
+    registry = SessionRegistry(ConversationMemory, store=store)
+    loading_threads = []
+    load = store.load
+
+    def recording_load(session_id):
+        loading_threads.append(threading.current_thread())
+        return load(session_id)
+
+    store.load = recording_load
+
+    async def scenario():
+        lock = await registry.alock("s1")
+        # A session already in memory is not loaded again
+        assert await registry.alock("s1") is lock
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(scenario())
+    assert len(loading_threads) == 1
+    assert loading_threads[0] is not loop_thread
+    assert [message.content for message in registry.get("s1").messages] == ["hello"]